@@ -0,0 +1,174 @@
+"""Bulk evaluation of many PDFs, streamed back as each one finishes.
+
+A bulk upload is any mix of PDFs and zip archives of PDFs. `read_uploads`
+reads the uploaded files up to the size limit, `collect` flattens them into
+documents, `evaluate_all` evaluates every distinct document
+(by SHA-256) once, at most `concurrency` at a time, and yields one result
+line per uploaded document in completion order; duplicates get the result
+of their first copy and point at it with `duplicate_of`.
+"""
+
+import asyncio
+import hashlib
+import io
+import zipfile
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Protocol, Tuple
+
+
+# Evaluates a PDF's bytes: returns (result, cache hit or None), or raises
+# an exception with `status_code` and `detail` (HTTPException).
+Evaluate = Callable[[bytes], Awaitable[Tuple[Dict[str, Any], Optional[bool]]]]
+
+# Bytes of an uploaded file read at a time.
+READ_CHUNK = 1024 * 1024
+
+
+class Upload(Protocol):
+    """An uploaded file, like FastAPI's UploadFile."""
+
+    filename: Optional[str]
+
+    async def read(self, size: int = -1) -> bytes: ...
+
+
+class BulkError(Exception):
+    """The upload as a whole cannot be processed (too many files, too large, bad zip)."""
+
+    def __init__(self, detail: str, status_code: int = 400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+@dataclass
+class Document:
+    index: int
+    filename: str
+    pdf: bytes = b""
+    # Set instead of `pdf` for members that cannot be evaluated.
+    error: Optional[str] = None
+    sha256: str = field(init=False, default="")
+
+    def __post_init__(self):
+        if self.error is None:
+            self.sha256 = hashlib.sha256(self.pdf).hexdigest()
+
+
+async def read_uploads(files: List[Upload], max_bytes: int) -> List[Tuple[str, bytes]]:
+    """(filename, bytes) of each uploaded file, read in chunks.
+
+    Raises `BulkError` (413) as soon as the files read so far exceed
+    `max_bytes`, without reading the rest into memory.
+    """
+    uploads: List[Tuple[str, bytes]] = []
+    total = 0
+    for file in files:
+        chunks: List[bytes] = []
+        while True:
+            chunk = await file.read(READ_CHUNK)
+            if not chunk:
+                break
+            total += len(chunk)
+            if total > max_bytes:
+                raise BulkError(f"Upload exceeds {max_bytes} bytes.", 413)
+            chunks.append(chunk)
+        uploads.append((file.filename or "", b"".join(chunks)))
+    return uploads
+
+
+def collect(uploads: List[Tuple[str, bytes]], max_files: int, max_bytes: int) -> List[Document]:
+    """Documents of uploaded PDFs and zip archives, in upload order."""
+    documents: List[Document] = []
+    total = 0
+
+    def add(filename: str, data: bytes, error: Optional[str] = None) -> None:
+        nonlocal total
+        if len(documents) >= max_files:
+            raise BulkError(f"More than {max_files} documents in one upload.", 413)
+        total += len(data)
+        if total > max_bytes:
+            raise BulkError(f"Upload exceeds {max_bytes} bytes of PDFs.", 413)
+        if error is not None:
+            documents.append(Document(len(documents), filename, error=error))
+        elif not filename.lower().endswith(".pdf"):
+            documents.append(Document(len(documents), filename, error="Only .pdf files are supported."))
+        elif not data:
+            documents.append(Document(len(documents), filename, error="Empty file."))
+        else:
+            documents.append(Document(len(documents), filename, data))
+
+    for filename, data in uploads:
+        if not filename.lower().endswith(".zip"):
+            add(filename, data)
+            continue
+        try:
+            archive = zipfile.ZipFile(io.BytesIO(data))
+        except (zipfile.BadZipFile, ValueError, NotImplementedError, EOFError):
+            raise BulkError(f"{filename} is not a valid zip archive.")
+        with archive:
+            for member in archive.infolist():
+                name = member.filename
+                if member.is_dir() or name.startswith("__MACOSX/") or name.rsplit("/", 1)[-1].startswith("."):
+                    continue
+                # Checked before decompressing, so an archive cannot expand past the limit.
+                if total + member.file_size > max_bytes:
+                    raise BulkError(f"Upload exceeds {max_bytes} bytes of PDFs.", 413)
+                try:
+                    data = archive.read(member)
+                except (zipfile.BadZipFile, zlib.error, RuntimeError, NotImplementedError, EOFError) as e:
+                    # Bad CRC, encrypted member, unsupported compression, truncated data.
+                    add(f"{filename}/{name}", b"", error=f"Cannot read this archive member: {e}")
+                    continue
+                add(f"{filename}/{name}", data)
+    if not documents:
+        raise BulkError("No files uploaded.")
+    return documents
+
+
+def _line(doc: Document, status_code: int, **fields: Any) -> Dict[str, Any]:
+    return {"index": doc.index, "filename": doc.filename, "sha256": doc.sha256 or None, "status_code": status_code, **fields}
+
+
+async def evaluate_all(documents: List[Document], evaluate: Evaluate, concurrency: int) -> AsyncIterator[Dict[str, Any]]:
+    """One result line per document, as soon as its evaluation finishes.
+
+    Closing the generator cancels the evaluations still pending.
+    """
+    first: Dict[str, Document] = {}
+    copies: Dict[str, List[Document]] = {}
+    for doc in documents:
+        if doc.error is not None:
+            yield _line(doc, 400, error=doc.error)
+        elif doc.sha256 in first:
+            copies[doc.sha256].append(doc)
+        else:
+            first[doc.sha256] = doc
+            copies[doc.sha256] = []
+
+    slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(doc: Document) -> Tuple[Document, Dict[str, Any]]:
+        async with slots:
+            try:
+                result, cache_hit = await evaluate(doc.pdf)
+            except Exception as e:
+                status_code = getattr(e, "status_code", 500)
+                detail = getattr(e, "detail", None) or f"Evaluation failed: {str(e)}"
+                return doc, {"status_code": status_code, "error": detail}
+        fields: Dict[str, Any] = {"status_code": 200, "result": result}
+        if cache_hit is not None:
+            fields["cache"] = "hit" if cache_hit else "miss"
+        return doc, fields
+
+    tasks = [asyncio.create_task(run(doc)) for doc in first.values()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            doc, fields = await next_done
+            yield _line(doc, **fields)
+            for copy in copies[doc.sha256]:
+                yield _line(copy, **fields, duplicate_of=doc.index)
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,195 @@
+"""Condense extracted page texts into a prompt that fits a token budget.
+
+Cutting the text at a character count wastes tokens on boilerplate and
+drops the last sections of a long brief. `condense` instead:
+
+1. collapses runs of spaces and blank lines,
+2. drops running headers and footers: lines near the top or bottom of a
+   page that repeat on at least a third of the pages, either verbatim or
+   with the page's own number in them ("Page 3 of 12" on page 3 matches
+   "Page 4 of 12" on page 4), plus bare page numbers. Pages too short to
+   have a body between the top and bottom lines (slides, section covers)
+   are left alone,
+3. when the text still exceeds the budget, gives every page an equal share of
+   it (short pages keep all their text and leave the rest to longer ones)
+   and cuts the pages that exceed their share at a line boundary, so every
+   page keeps its opening lines.
+
+Tokens are counted with tiktoken when it is installed and its encoding can
+be loaded, and estimated from the character count otherwise.
+"""
+
+import logging
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # optional dependency
+    tiktoken = None
+
+
+logger = logging.getLogger(__name__)
+
+# Lines from each end of a page that can be a running header or footer.
+EDGE_LINES = 3
+# A header/footer repeats on at least this share of the pages (and on 3 of them).
+REPEATED_SHARE = 1 / 3
+# Characters per token when tiktoken is not available.
+CHARS_PER_TOKEN = 4
+CUT_MARKER = "[...]"
+
+_SPACES = re.compile(r"[ \t\f\v\u00a0]+")
+_DIGITS = re.compile(r"\d+")
+_PAGE_NUMBER = re.compile(r"^(page\s*)?\d+(\s*(/|of)\s*\d+)?$", re.IGNORECASE)
+
+
+@dataclass
+class Condensed:
+    text: str
+    tokens: int
+    # Tokens of the page texts after whitespace collapsing, before anything was dropped.
+    original_tokens: int
+    boilerplate_lines: int
+    cut_pages: int
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def token_counter(model: str) -> Callable[[str], int]:
+    """Token count function for `model`: tiktoken's encoding when available, else an estimate.
+
+    The encoding is loaded on the first count, not here: tiktoken downloads
+    it unless it is in `TIKTOKEN_CACHE_DIR`, which must not hold up startup.
+    """
+    lock = threading.Lock()
+    loaded: List[Optional[Any]] = []
+
+    def load() -> Optional[Any]:
+        with lock:
+            if not loaded:
+                encoding = None
+                if tiktoken is not None:
+                    try:
+                        try:
+                            encoding = tiktoken.encoding_for_model(model)
+                        except KeyError:
+                            encoding = tiktoken.get_encoding("o200k_base")
+                    except Exception as e:  # e.g. the encoding file cannot be downloaded
+                        logger.warning(f"tiktoken unavailable for {model}, estimating tokens: {repr(e)}")
+                loaded.append(encoding)
+            return loaded[0]
+
+    def count(text: str) -> int:
+        encoding = loaded[0] if loaded else load()
+        if encoding is None:
+            return estimate_tokens(text)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    return count
+
+
+def normalize(text: str) -> List[str]:
+    """Lines of a page with runs of spaces collapsed and at most one blank line in a row."""
+    lines: List[str] = []
+    for line in text.splitlines():
+        line = _SPACES.sub(" ", line).strip()
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    while lines and not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def _shape(line: str) -> str:
+    return _DIGITS.sub("#", line.lower())
+
+
+def _numbered(line: str, page: int) -> bool:
+    return str(page) in _DIGITS.findall(line)
+
+
+def _has_body(lines: List[str]) -> bool:
+    """Whether a page has lines between its top and bottom edges, so its edges can be headers/footers."""
+    return len(lines) > 2 * EDGE_LINES
+
+
+def strip_boilerplate(pages: List[List[str]]) -> int:
+    """Drop repeated headers/footers and page numbers from `pages` in place; returns the lines dropped."""
+    exact: Counter = Counter()
+    shapes: Counter = Counter()
+    for page, lines in enumerate(pages, start=1):
+        if not _has_body(lines):
+            continue
+        edges = {line.lower() for line in lines[:EDGE_LINES] + lines[-EDGE_LINES:] if line}
+        exact.update(edges)
+        shapes.update({_shape(line) for line in edges if _numbered(line, page)})
+    threshold = max(3, len(pages) * REPEATED_SHARE)
+
+    def boilerplate(line: str, page: int) -> bool:
+        if _PAGE_NUMBER.match(line) or exact[line.lower()] >= threshold:
+            return True
+        return _numbered(line, page) and shapes[_shape(line)] >= threshold
+
+    dropped = 0
+    for page, lines in enumerate(pages, start=1):
+        if not _has_body(lines):
+            continue
+        n = len(lines)
+        keep = []
+        for i, line in enumerate(lines):
+            if line and (i < EDGE_LINES or i >= n - EDGE_LINES) and boilerplate(line, page):
+                dropped += 1
+                continue
+            keep.append(line)
+        lines[:] = normalize("\n".join(keep))
+    return dropped
+
+
+def _fit(lines: List[str], line_tokens: List[int], budget: int) -> List[str]:
+    """Leading lines of a page within `budget` tokens, followed by a cut marker."""
+    kept, used = [], 0
+    for line, tokens in zip(lines, line_tokens):
+        if used + tokens > budget:
+            if not kept:
+                # One long line (some PDFs have no line breaks): cut it by characters.
+                kept.append(line[: len(line) * budget // tokens])
+            break
+        kept.append(line)
+        used += tokens
+    return kept + [CUT_MARKER]
+
+
+def condense(page_texts: List[str], token_budget: int, count: Callable[[str], int]) -> Condensed:
+    """Prompt text of `page_texts` (in `--- PDF PAGE n ---` blocks) within about `token_budget` tokens."""
+    pages = [normalize(text) for text in page_texts]
+    original = sum(count("\n".join(lines)) for lines in pages)
+    boilerplate = strip_boilerplate(pages) if len(pages) >= 3 else 0
+
+    headers = [f"--- PDF PAGE {i} ---" for i in range(1, len(pages) + 1)]
+    line_tokens = [[count(line) + 1 for line in lines] for lines in pages]
+    sizes = [sum(tokens) for tokens in line_tokens]
+    overhead = sum(count(header) + 2 for header, lines in zip(headers, pages) if lines)
+    available = max(0, token_budget - overhead)
+
+    cut = 0
+    if sum(sizes) > available:
+        # Equal shares, with what short pages leave over handed to the longer ones.
+        order = sorted((i for i in range(len(pages)) if sizes[i]), key=lambda i: sizes[i])
+        left = available
+        for rank, i in enumerate(order):
+            share = left // (len(order) - rank)
+            if sizes[i] > share:
+                pages[i] = _fit(pages[i], line_tokens[i], share)
+                sizes[i] = share
+                cut += 1
+            left -= sizes[i]
+
+    blocks = [f"{header}\n" + "\n".join(lines) for header, lines in zip(headers, pages) if lines]
+    text = "\n\n".join(blocks)
+    return Condensed(text, count(text), original, boilerplate, cut)
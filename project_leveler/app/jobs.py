@@ -0,0 +1,335 @@
+"""Background evaluation jobs: a bounded in-process queue over a SQLite job table.
+
+`POST /jobs/evaluate-pdf` stores the upload as a queued job and returns at
+once; `JobQueue` workers (asyncio tasks) run the evaluation and record the
+result or error in the table, where `GET /jobs/{id}` reads it. A job may
+carry a callback URL that receives the finished job as JSON.
+
+The PDF is kept in the table until its job finishes, so jobs still queued
+or running when the process stops are queued again at the next start.
+Finished jobs are deleted after `retention` seconds.
+
+Callback URLs are checked when the job is submitted and again before each
+delivery: they must resolve to public addresses only, or name one of
+`callback_allowed_hosts` when that allow-list is set, so a caller cannot make
+the service POST to internal endpoints.
+"""
+
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Collection, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+CALLBACK_ATTEMPTS = 3
+
+# Evaluates a PDF's bytes: returns the result, or raises JobFailed.
+Handler = Callable[[bytes], Awaitable[Dict[str, Any]]]
+
+
+class JobFailed(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class QueueFull(Exception):
+    """The job queue holds `max_queue` jobs already."""
+
+
+class UnsafeCallback(ValueError):
+    """A callback URL the service must not POST to."""
+
+
+def check_callback_url(url: str, allowed_hosts: Collection[str] = ()) -> None:
+    """Raise `UnsafeCallback` unless `url` is http(s) and may be called back.
+
+    With `allowed_hosts`, the host must be one of them (and may then be an
+    internal one); otherwise every address it resolves to must be public,
+    not private, loopback, link-local, multicast or reserved. Resolves the
+    host, so call it off the event loop.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise UnsafeCallback("callback_url must be an http(s) URL.")
+    host = parts.hostname.lower()
+    if allowed_hosts:
+        if host not in allowed_hosts:
+            raise UnsafeCallback(f"callback_url host {host} is not allowed.")
+        return
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (OSError, ValueError):
+        raise UnsafeCallback(f"callback_url host {host} does not resolve.")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if not address.is_global or address.is_multicast:
+            raise UnsafeCallback(f"callback_url host {host} resolves to a non-public address.")
+
+
+class JobStore:
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, status TEXT NOT NULL, filename TEXT, callback_url TEXT,"
+            " pdf BLOB, result TEXT, error TEXT, status_code INTEGER, callback_status TEXT,"
+            " created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def create(self, pdf: bytes, filename: Optional[str], callback_url: Optional[str]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, status, filename, callback_url, pdf, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, filename, callback_url, pdf, time.time()),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, status, filename, callback_url, result, error, status_code, callback_status,"
+                " created_at, started_at, finished_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def pdf(self, job_id: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._db.execute("SELECT pdf FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def start(self, job_id: str) -> None:
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = ?, started_at = ? WHERE id = ?", (RUNNING, time.time(), job_id))
+
+    def finish(
+        self,
+        job_id: str,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+        status_code: Optional[int] = None,
+    ) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, status_code = ?, finished_at = ?, pdf = NULL"
+                " WHERE id = ?",
+                (
+                    FAILED if error is not None else SUCCEEDED,
+                    json.dumps(result) if result is not None else None,
+                    error,
+                    status_code,
+                    time.time(),
+                    job_id,
+                ),
+            )
+
+    def set_callback_status(self, job_id: str, callback_status: str) -> None:
+        with self._lock:
+            self._db.execute("UPDATE jobs SET callback_status = ? WHERE id = ?", (callback_status, job_id))
+
+    def unfinished(self) -> List[str]:
+        """Ids of queued or running jobs, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def purge(self, older_than: float) -> int:
+        """Delete jobs finished before `older_than` (epoch seconds)."""
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?", (SUCCEEDED, FAILED, older_than)
+            )
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class JobQueue:
+    def __init__(
+        self,
+        store: JobStore,
+        handler: Handler,
+        workers: int = 4,
+        max_queue: int = 100,
+        callback_timeout: float = 10.0,
+        retention: float = 7 * 24 * 3600,
+        callback_allowed_hosts: Collection[str] = (),
+    ):
+        self.store = store
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.callback_timeout = callback_timeout
+        self.retention = retention
+        self.callback_allowed_hosts = frozenset(host.lower() for host in callback_allowed_hosts)
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._tasks: List["asyncio.Task[None]"] = []
+        self._http: Optional[httpx.AsyncClient] = None
+        # Jobs being written by `submit`, counted against `max_queue`.
+        self._submitting = 0
+        self.running = 0
+
+    async def start(self) -> None:
+        """Start the workers and queue again the jobs left unfinished by the previous process."""
+        self._http = httpx.AsyncClient(timeout=self.callback_timeout)
+        self._queue = asyncio.Queue()
+        self.store.purge(time.time() - self.retention)
+        recovered = self.store.unfinished()
+        for job_id in recovered:
+            self._queue.put_nowait(job_id)
+        if recovered:
+            logger.info(f"Requeued {len(recovered)} unfinished jobs")
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def submit(self, pdf: bytes, filename: Optional[str], callback_url: Optional[str]) -> str:
+        """Queue a job and return its id, or raise `QueueFull` or `UnsafeCallback`."""
+        queued = self._queue.qsize() + self._submitting
+        if queued >= self.max_queue:
+            raise QueueFull(f"{queued} jobs queued")
+        self._submitting += 1
+        try:
+            if callback_url:
+                await asyncio.to_thread(check_callback_url, callback_url, self.callback_allowed_hosts)
+            job_id = await asyncio.to_thread(self.store.create, pdf, filename, callback_url)
+        finally:
+            self._submitting -= 1
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            self.running += 1
+            try:
+                await self._run(job_id)
+            except Exception as e:  # a broken job must not stop the worker
+                logger.error(f"Job {job_id} crashed: {repr(e)}")
+            finally:
+                self.running -= 1
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        # The store's SQLite calls run in threads, so they never block the event loop.
+        pdf = await asyncio.to_thread(self.store.pdf, job_id)
+        if pdf is None:
+            return
+        await asyncio.to_thread(self.store.start, job_id)
+        try:
+            result = await self.handler(pdf)
+        except JobFailed as e:
+            await asyncio.to_thread(self.store.finish, job_id, error=e.detail, status_code=e.status_code)
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {repr(e)}")
+            await asyncio.to_thread(
+                self.store.finish, job_id, error=f"Evaluation failed: {str(e)}", status_code=500
+            )
+        else:
+            await asyncio.to_thread(self.store.finish, job_id, result=result)
+        await asyncio.to_thread(self.store.purge, time.time() - self.retention)
+
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is not None and job["callback_url"]:
+            await self._callback(job)
+
+    async def _callback(self, job: Dict[str, Any]) -> None:
+        """POST the finished job to its callback URL, retrying failures with backoff."""
+        payload = public({**job, "callback_url": None})
+        status = "failed"
+        for attempt in range(CALLBACK_ATTEMPTS):
+            try:
+                # Checked again: the host may resolve elsewhere than at submission.
+                await asyncio.to_thread(check_callback_url, job["callback_url"], self.callback_allowed_hosts)
+            except UnsafeCallback as e:
+                status = f"rejected: {e}"
+                break
+            try:
+                resp = await self._http.post(job["callback_url"], json=payload)
+                if resp.status_code < 400:
+                    status = "delivered"
+                    break
+                status = f"http {resp.status_code}"
+            except httpx.HTTPError as e:
+                status = f"error: {type(e).__name__}"
+            if attempt + 1 < CALLBACK_ATTEMPTS:
+                await asyncio.sleep(2 ** attempt)
+        if status != "delivered":
+            logger.warning(f"Callback for job {job['id']} to {job['callback_url']} failed: {status}")
+        await asyncio.to_thread(self.store.set_callback_status, job["id"], status)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queued": self._queue.qsize(),
+            "running": self.running,
+        }
+
+
+def public(job: Dict[str, Any]) -> Dict[str, Any]:
+    """A job as returned by the API and sent to callbacks."""
+    out = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "filename": job["filename"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+    if job["status"] == SUCCEEDED:
+        out["result"] = job["result"]
+    elif job["status"] == FAILED:
+        out["error"] = {"status_code": job["status_code"], "detail": job["error"]}
+    if job["callback_url"]:
+        out["callback_status"] = job["callback_status"]
+    return out
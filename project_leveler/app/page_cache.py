@@ -0,0 +1,202 @@
+"""Extracted page texts by page content hash, and the page hashes of past uploads.
+
+A revised brief usually shares most of its pages with the previous version.
+Pages are identified by a hash of what their text is drawn from (see
+`pdf_text.page_hash`), so `PageCache` lets the extractor skip every page it
+has already read in any document, and `previous_version` finds the earlier
+upload sharing the most pages with a new one, for `diff` to summarize what
+changed. Pages found in many documents (blank pages, covers, standard terms)
+say nothing about lineage and are ignored, and an upload only counts as a
+revision when at least `min_shared` of its distinct pages are shared, so
+unrelated documents are not reported as earlier versions.
+
+Both tables are bounded: the least recently used page texts beyond
+`max_pages` and the oldest documents beyond `max_documents` are dropped.
+"""
+
+import difflib
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Hashes per SQL statement (below SQLite's bound parameter limit).
+_BATCH = 500
+
+
+def _batches(items: Sequence[str]) -> Iterable[Sequence[str]]:
+    for start in range(0, len(items), _BATCH):
+        yield items[start:start + _BATCH]
+
+
+class PageCache:
+    def __init__(
+        self,
+        path: str,
+        max_pages: int = 200_000,
+        max_documents: int = 10_000,
+        min_shared: float = 0.5,
+        common_documents: int = 50,
+    ):
+        self.path = path
+        self.max_pages = max_pages
+        self.max_documents = max_documents
+        self.min_shared = min_shared
+        self.common_documents = common_documents
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Losing the last writes after a power cut only costs re-extraction.
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS page_texts ("
+            " hash TEXT PRIMARY KEY, text TEXT NOT NULL, used_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS page_texts_used_at ON page_texts (used_at);"
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " sha256 TEXT PRIMARY KEY, page_hashes TEXT NOT NULL, created_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS documents_created_at ON documents (created_at);"
+            "CREATE TABLE IF NOT EXISTS document_pages ("
+            " page_hash TEXT NOT NULL, sha256 TEXT NOT NULL, PRIMARY KEY (page_hash, sha256));"
+            "CREATE INDEX IF NOT EXISTS document_pages_sha256 ON document_pages (sha256);"
+        )
+
+    def get_many(self, hashes: Sequence[str]) -> Dict[str, str]:
+        """Cached texts of the pages with these hashes."""
+        wanted = list(dict.fromkeys(hashes))
+        found: Dict[str, str] = {}
+        with self._lock:
+            for batch in _batches(wanted):
+                marks = ",".join("?" * len(batch))
+                rows = self._db.execute(f"SELECT hash, text FROM page_texts WHERE hash IN ({marks})", batch)
+                found.update(rows.fetchall())
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE page_texts SET used_at = ? WHERE hash = ?", [(now, h) for h in found])
+            self.hits += len(found)
+            self.misses += len(wanted) - len(found)
+        return found
+
+    def put_many(self, texts: Dict[str, str]) -> None:
+        if not texts:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO page_texts (hash, text, used_at) VALUES (?, ?, ?)",
+                [(h, text, now) for h, text in texts.items()],
+            )
+            excess = self._db.execute("SELECT COUNT(*) FROM page_texts").fetchone()[0] - self.max_pages
+            if excess > 0:
+                self._db.execute(
+                    "DELETE FROM page_texts WHERE hash IN (SELECT hash FROM page_texts ORDER BY used_at LIMIT ?)",
+                    (excess,),
+                )
+
+    def previous_version(self, sha256: str, page_hashes: Sequence[str]) -> Optional[Tuple[str, List[str]]]:
+        """(digest, page hashes) of the known document sharing the most pages with this one, if any.
+
+        Pages in more than `common_documents` known documents are not
+        counted, and the best match must share at least `min_shared` of
+        this document's distinct pages.
+        """
+        distinct = list(dict.fromkeys(page_hashes))
+        shared: Dict[str, int] = {}
+        with self._lock:
+            for batch in _batches(distinct):
+                marks = ",".join("?" * len(batch))
+                rows = self._db.execute(
+                    f"SELECT sha256, COUNT(*) FROM document_pages WHERE page_hash IN ({marks}) AND sha256 != ?"
+                    " AND page_hash NOT IN (SELECT page_hash FROM document_pages"
+                    f" WHERE page_hash IN ({marks}) AND sha256 != ? GROUP BY page_hash HAVING COUNT(*) > ?)"
+                    " GROUP BY sha256",
+                    (*batch, sha256, *batch, sha256, self.common_documents),
+                )
+                for digest, count in rows:
+                    shared[digest] = shared.get(digest, 0) + count
+            if not shared:
+                return None
+            best = max(shared, key=lambda digest: shared[digest])
+            if shared[best] < max(1, math.ceil(self.min_shared * len(distinct))):
+                return None
+            row = self._db.execute("SELECT page_hashes FROM documents WHERE sha256 = ?", (best,)).fetchone()
+        if row is None:
+            return None
+        return best, row[0].split(",") if row[0] else []
+
+    def remember(self, sha256: str, page_hashes: Sequence[str]) -> None:
+        """Record a document's page hashes, for `previous_version` of later uploads."""
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM documents WHERE sha256 = ?", (sha256,)).fetchone():
+                return
+            self._db.execute(
+                "INSERT INTO documents (sha256, page_hashes, created_at) VALUES (?, ?, ?)",
+                (sha256, ",".join(page_hashes), time.time()),
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO document_pages (page_hash, sha256) VALUES (?, ?)",
+                [(h, sha256) for h in set(page_hashes)],
+            )
+            excess = self._db.execute("SELECT COUNT(*) FROM documents").fetchone()[0] - self.max_documents
+            if excess > 0:
+                old = [r[0] for r in self._db.execute(
+                    "SELECT sha256 FROM documents ORDER BY created_at LIMIT ?", (excess,)
+                )]
+                self._db.executemany("DELETE FROM document_pages WHERE sha256 = ?", [(d,) for d in old])
+                self._db.executemany("DELETE FROM documents WHERE sha256 = ?", [(d,) for d in old])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pages = self._db.execute("SELECT COUNT(*) FROM page_texts").fetchone()[0]
+            documents = self._db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        return {
+            "pages": pages,
+            "max_pages": self.max_pages,
+            "documents": documents,
+            "max_documents": self.max_documents,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def diff(previous_sha256: str, previous: Sequence[str], current: Sequence[str]) -> Dict[str, Any]:
+    """Summary of how a document's pages (by hash) differ from a previous version's.
+
+    Page numbers are 1-based; `removed_pages` are numbered as in the previous
+    version, all other lists as in the current one.
+    """
+    changed: List[int] = []
+    added: List[int] = []
+    removed: List[int] = []
+    unchanged = 0
+    matcher = difflib.SequenceMatcher(a=list(previous), b=list(current), autojunk=False)
+    for tag, a0, a1, b0, b1 in matcher.get_opcodes():
+        if tag == "equal":
+            unchanged += b1 - b0
+        elif tag == "replace":
+            common = min(a1 - a0, b1 - b0)
+            changed.extend(range(b0 + 1, b0 + common + 1))
+            added.extend(range(b0 + common + 1, b1 + 1))
+            removed.extend(range(a0 + common + 1, a1 + 1))
+        elif tag == "insert":
+            added.extend(range(b0 + 1, b1 + 1))
+        elif tag == "delete":
+            removed.extend(range(a0 + 1, a1 + 1))
+    return {
+        "previous_sha256": previous_sha256,
+        "previous_pages": len(previous),
+        "unchanged_pages": unchanged,
+        "changed_pages": changed,
+        "added_pages": added,
+        "removed_pages": removed,
+    }
@@ -0,0 +1,473 @@
+"""PDF text extraction on a process pool, stopping once the text budget is met.
+
+pypdf extracts page text in pure Python, so a long document would hold the
+event loop (and the GIL) for seconds. `PdfExtractor` runs it in worker
+processes instead. The document is split into ranges of `pages_per_task`
+pages; up to `workers` ranges are extracted at a time, in page order, and
+`iter_page_texts` streams their pages back in order. `extract` stops reading
+as soon as the text reaches `max_chars`: ranges still queued are cancelled
+and ranges already running stop after their current page, so only the pages
+that fit in the prompt are extracted, while the page count still comes from
+the page tree.
+
+Every worker keeps the last few parsed documents (by digest), so the ranges
+of one document do not each rebuild its page tree.
+
+Every document gets `cpu_budget` seconds of CPU time, shared between its
+ranges by page count. A range that uses up its share stops early, and the
+text then ends at the last page read before the gap. The budget is checked
+between pages, so a single pathological page (a huge content stream) is
+bounded by `task_timeout` instead, counted from when a worker process starts
+the task (each worker records the task it runs and when it started in arrays
+shared with the parent). A task running longer than that is stopped by
+killing the pool's processes (the executor cannot stop one task), and the
+tasks of other documents lost with them are submitted again.
+
+With a `PageCache`, every page is first hashed from what its text is drawn
+from (content streams, fonts, form XObjects, see `page_hash`), and only the
+pages whose hash has no cached text are extracted, so a revised document
+costs the pages that changed.
+"""
+
+import asyncio
+import hashlib
+import io
+import itertools
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from pypdf import PdfReader
+from pypdf.generic import DictionaryObject, IndirectObject, StreamObject
+
+from app.page_cache import PageCache
+
+
+@dataclass
+class ExtractedText:
+    text: str
+    pages: int
+    # Leading pages whose text was extracted.
+    pages_read: int
+    budget_exhausted: bool = False
+    # Stripped text of each page read.
+    page_texts: List[str] = field(default_factory=list)
+    # Content hash of every page (with a page cache only).
+    page_hashes: List[str] = field(default_factory=list)
+    # Pages read from the page cache instead of extracted.
+    pages_cached: int = 0
+
+
+class CpuBudgetExhausted(Exception):
+    """A page range ran out of its share of the document's CPU budget."""
+
+
+class TaskTimeout(Exception):
+    """A pool task ran longer than `task_timeout`; the pool's processes were killed."""
+
+
+# How often a task still waiting for a worker is checked for having started.
+_POLL_SECONDS = 0.25
+
+
+# Worker-process state: this worker's index in its pool's shared arrays (see
+# `_WorkerPool`), which hold the id of the task each worker runs, when it
+# started, and the id of a task asked to stop.
+_SLOT: Optional[int] = None
+_TASK_IDS: Any = None
+_STARTED: Any = None
+_STOP: Any = None
+
+
+def _init_worker(next_slot: Any, task_ids: Any, started: Any, stop: Any) -> None:
+    global _SLOT, _TASK_IDS, _STARTED, _STOP
+    with next_slot.get_lock():
+        _SLOT = next_slot.value % len(task_ids)
+        next_slot.value += 1
+    _TASK_IDS, _STARTED, _STOP = task_ids, started, stop
+
+
+def _run_task(task_id: int, fn: Callable[..., Any], *args: Any) -> Any:
+    # The start time is written first: the parent reads it once it sees the id.
+    _STARTED[_SLOT] = time.monotonic()
+    _TASK_IDS[_SLOT] = task_id
+    return fn(*args)
+
+
+def _stop_requested() -> bool:
+    """Whether the parent no longer needs the task this worker runs."""
+    return _SLOT is not None and _STOP[_SLOT] == _TASK_IDS[_SLOT]
+
+
+class _WorkerPool:
+    """ProcessPoolExecutor whose workers record the task they run and when it started.
+
+    The executor marks a task running as soon as it enters its call queue,
+    before any worker is free, so `Future.running()` cannot time a task.
+    """
+
+    def __init__(self, workers: int):
+        context = multiprocessing.get_context()
+        self.task_ids = context.RawArray("q", workers)
+        self.started = context.RawArray("d", workers)
+        self.stop = context.RawArray("q", workers)
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(context.Value("q", 0), self.task_ids, self.started, self.stop),
+        )
+        self._ids = itertools.count(1)
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Tuple[int, Future]:
+        task_id = next(self._ids)
+        return task_id, self.executor.submit(_run_task, task_id, fn, *args)
+
+    def _slot(self, task_id: int) -> Optional[int]:
+        for slot, running in enumerate(self.task_ids):
+            if running == task_id:
+                return slot
+        return None
+
+    def started_at(self, task_id: int) -> Optional[float]:
+        """`time.monotonic()` when a worker started the task, or None while it waits for one."""
+        slot = self._slot(task_id)
+        return self.started[slot] if slot is not None else None
+
+    def stop_task(self, task_id: int) -> None:
+        """Ask the task, if running, to stop at its next page."""
+        slot = self._slot(task_id)
+        if slot is not None:
+            self.stop[slot] = task_id
+
+    def kill(self) -> None:
+        # ProcessPoolExecutor has no way to stop a running task; its futures
+        # fail with BrokenProcessPool once the processes are gone.
+        for process in list((self.executor._processes or {}).values()):
+            process.kill()
+        self.executor.shutdown(wait=False)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Worker-process state: digest -> parsed reader, most recently used last.
+_READERS: "OrderedDict[str, PdfReader]" = OrderedDict()
+_READERS_KEPT = 4
+
+
+def _reader(digest: str, pdf_bytes: bytes) -> PdfReader:
+    reader = _READERS.get(digest)
+    if reader is None:
+        reader = _READERS[digest] = PdfReader(io.BytesIO(pdf_bytes))
+        while len(_READERS) > _READERS_KEPT:
+            _READERS.popitem(last=False)
+    _READERS.move_to_end(digest)
+    return reader
+
+
+def count_pages(digest: str, pdf_bytes: bytes) -> int:
+    return len(_reader(digest, pdf_bytes).pages)
+
+
+def _resolve(obj):
+    return obj.get_object() if isinstance(obj, IndirectObject) else obj
+
+
+def _digest_object(obj, h, seen: Dict[int, bytes], depth: int = 0) -> None:
+    """Feed `obj` into `h`: stream data and dictionary entries, following references.
+
+    `seen` maps the id of indirect objects already digested (fonts and forms
+    shared by many pages) to their digest.
+    """
+    if isinstance(obj, IndirectObject):
+        ref = id(obj.get_object())
+        if ref not in seen:
+            seen[ref] = b""  # a reference cycle ends here
+            sub = hashlib.sha256()
+            _digest_object(obj.get_object(), sub, seen, depth)
+            seen[ref] = sub.digest()
+        h.update(seen[ref])
+        return
+    if depth > 8:
+        return
+    if isinstance(obj, StreamObject):
+        if obj.get("/Subtype") == "/Image":  # images hold no text
+            return
+        try:
+            h.update(obj.get_data())
+        except Exception:
+            h.update(obj._data or b"")
+    if isinstance(obj, DictionaryObject):
+        for name in sorted(obj):
+            if name not in ("/Parent", "/Length", "/Filter", "/DecodeParms"):
+                h.update(name.encode("utf-8", "replace"))
+                _digest_object(obj[name], h, seen, depth + 1)
+    elif isinstance(obj, list):
+        for item in obj:
+            _digest_object(item, h, seen, depth + 1)
+    else:
+        h.update(repr(obj).encode("utf-8", "replace"))
+
+
+def page_hash(page, seen: Dict[int, bytes]) -> str:
+    """Hash of what a page's text is drawn from: its content streams and the fonts and forms they use."""
+    h = hashlib.sha256()
+    try:
+        contents = page.get_contents()
+        h.update(contents.get_data() if contents is not None else b"")
+        resources = _resolve(page.get("/Resources")) or {}
+        for kind in ("/Font", "/XObject"):
+            _digest_object(resources.get(kind), h, seen)
+        h.update(repr(page.get("/Rotate", 0)).encode())
+    except Exception as e:  # unreadable page: never matches a cached one
+        h.update(f"unreadable {id(page)} {e!r}".encode())
+    return h.hexdigest()
+
+
+def page_hashes(digest: str, pdf_bytes: bytes) -> List[str]:
+    """`page_hash` of every page of a document."""
+    seen: Dict[int, bytes] = {}
+    return [page_hash(page, seen) for page in _reader(digest, pdf_bytes).pages]
+
+
+def extract_pages(
+    digest: str,
+    pdf_bytes: bytes,
+    indices: List[int],
+    cpu_budget: Optional[float],
+    max_chars: int,
+) -> Tuple[List[str], bool]:
+    """Stripped text of the pages at `indices`, and whether `cpu_budget` ran out first.
+
+    Stops after `max_chars` characters as well: later pages of the range
+    could not make it into the prompt anyway.
+    """
+    started = time.process_time()
+    reader = _reader(digest, pdf_bytes)
+    texts: List[str] = []
+    chars = 0
+    for i in indices:
+        if cpu_budget is not None and time.process_time() - started > cpu_budget:
+            return texts, True
+        if _stop_requested():
+            break
+        try:
+            text = reader.pages[i].extract_text() or ""
+        except Exception:
+            text = ""
+        texts.append(text.strip())
+        chars += len(texts[-1])
+        if chars >= max_chars:
+            break
+    return texts, False
+
+
+def join_pages(texts: List[str], max_chars: int, truncated: bool = False) -> str:
+    """Prompt text of pages in order, cut to `max_chars`."""
+    parts = [f"\n--- PDF PAGE {i} ---\n{text}\n" for i, text in enumerate(texts, start=1) if text]
+    full_text = "\n".join(parts).strip()
+    if len(full_text) > max_chars:
+        full_text = full_text[:max_chars]
+        truncated = True
+    if truncated and full_text:
+        full_text += "\n[TRUNCATED]\n"
+    return full_text
+
+
+class PdfExtractor:
+    def __init__(
+        self,
+        workers: int,
+        pages_per_task: int = 16,
+        cpu_budget: Optional[float] = None,
+        page_cache: Optional[PageCache] = None,
+        task_timeout: Optional[float] = None,
+    ):
+        self.workers = max(1, workers)
+        self.pages_per_task = max(1, pages_per_task)
+        self.cpu_budget = cpu_budget
+        self.page_cache = page_cache
+        self.task_timeout = task_timeout
+        self.timeouts = 0
+        self._pool: Optional[_WorkerPool] = None
+
+    @property
+    def pool(self) -> _WorkerPool:
+        if self._pool is None:
+            self._pool = _WorkerPool(self.workers)
+        return self._pool
+
+    async def call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """`fn(*args)` on the pool; raises `TaskTimeout` when it runs longer than `task_timeout`.
+
+        A task lost because the pool broke (killed after another task's
+        timeout, or a crashed worker) is submitted once more on a new pool.
+        """
+        for attempt in range(2):
+            pool = self.pool
+            try:
+                return await self._wait(pool, *pool.submit(fn, *args))
+            except BrokenProcessPool:
+                if self._pool is pool:
+                    self._pool = None
+                if attempt:
+                    raise
+
+    async def _wait(self, pool: _WorkerPool, task_id: int, future: Future) -> Any:
+        wrapped = asyncio.wrap_future(future)
+        try:
+            if self.task_timeout is None:
+                return await wrapped
+            while True:
+                # A queued task's clock starts when a worker picks it up.
+                started = pool.started_at(task_id)
+                deadline = started + self.task_timeout if started is not None else None
+                wait = _POLL_SECONDS if deadline is None else max(0.0, deadline - time.monotonic())
+                done, _ = await asyncio.wait({wrapped}, timeout=wait)
+                if done:
+                    return wrapped.result()
+                if deadline is not None and time.monotonic() >= deadline:
+                    self._kill(pool)
+                    raise TaskTimeout(f"PDF task still running after {self.task_timeout}s")
+        except asyncio.CancelledError:
+            # Drops the task if still queued; a running one stops at its next page.
+            wrapped.cancel()
+            pool.stop_task(task_id)
+            raise
+
+    def _kill(self, pool: _WorkerPool) -> None:
+        """Kill the processes of `pool` and drop it; the next task starts a new pool."""
+        self.timeouts += 1
+        if self._pool is pool:
+            self._pool = None
+        pool.kill()
+
+    async def page_count(self, pdf_bytes: bytes, digest: Optional[str] = None) -> int:
+        digest = digest or hashlib.sha256(pdf_bytes).hexdigest()
+        return await self.call(count_pages, digest, pdf_bytes)
+
+    async def page_hashes(self, pdf_bytes: bytes, digest: Optional[str] = None) -> List[str]:
+        digest = digest or hashlib.sha256(pdf_bytes).hexdigest()
+        return await self.call(page_hashes, digest, pdf_bytes)
+
+    async def _extract_range(
+        self, digest: str, pdf_bytes: bytes, indices: List[int], cpu_budget: Optional[float], max_chars: int
+    ) -> Tuple[List[str], bool]:
+        """`extract_pages` on the pool; a range that times out counts as out of budget with no pages."""
+        try:
+            return await self.call(extract_pages, digest, pdf_bytes, indices, cpu_budget, max_chars)
+        except TaskTimeout:
+            return [], True
+
+    async def iter_page_texts(
+        self,
+        pdf_bytes: bytes,
+        pages: int,
+        max_chars: int,
+        digest: Optional[str] = None,
+        known: Optional[Dict[int, str]] = None,
+    ) -> AsyncIterator[str]:
+        """Stripped text of every page, in order; raises `CpuBudgetExhausted` after the last page read.
+
+        Pages in `known` (index -> text) are not extracted again. Up to
+        `workers` ranges are extracted ahead of the consumer; closing the
+        generator cancels the queued ones and stops the running ones after
+        their current page. A range that exceeds `task_timeout` ends the text
+        like an exhausted CPU budget.
+        """
+        digest = digest or hashlib.sha256(pdf_bytes).hexdigest()
+        known = known or {}
+        ranges = iter(range(0, pages, self.pages_per_task))
+        # (first page, last page + 1, extraction of the unknown pages or None)
+        in_flight: List[Tuple[int, int, Optional["asyncio.Task[Tuple[List[str], bool]]"]]] = []
+        try:
+            while True:
+                running = sum(task is not None for _, _, task in in_flight)
+                for start in itertools.islice(ranges, self.workers - running):
+                    stop = min(start + self.pages_per_task, pages)
+                    missing = [i for i in range(start, stop) if i not in known]
+                    task = asyncio.ensure_future(self._extract_range(
+                        digest, pdf_bytes, missing, self._share(len(missing), pages), max_chars
+                    )) if missing else None
+                    in_flight.append((start, stop, task))
+                if not in_flight:
+                    return
+                start, stop, task = in_flight.pop(0)
+                texts, exhausted = await task if task is not None else ([], False)
+                extracted = iter(texts)
+                for i in range(start, stop):
+                    text = known.get(i)
+                    if text is None:
+                        text = next(extracted, None)
+                        if text is None:  # the range stopped early
+                            break
+                    yield text
+                else:
+                    continue
+                if exhausted:
+                    raise CpuBudgetExhausted()
+                return
+        finally:
+            for _, _, task in in_flight:
+                if task is not None:
+                    task.cancel()
+
+    async def extract(self, pdf_bytes: bytes, max_chars: int, digest: Optional[str] = None) -> ExtractedText:
+        """Text of the leading pages that fit in `max_chars`, and the document's page count.
+
+        With a page cache, pages already extracted (in any document) are
+        taken from it, and the pages extracted now are added to it.
+        """
+        digest = digest or hashlib.sha256(pdf_bytes).hexdigest()
+        hashes: List[str] = []
+        known: Dict[int, str] = {}
+        if self.page_cache is not None:
+            hashes = await self.page_hashes(pdf_bytes, digest)
+            pages = len(hashes)
+            cached = await asyncio.to_thread(self.page_cache.get_many, hashes)
+            known = {i: cached[h] for i, h in enumerate(hashes) if h in cached}
+        else:
+            pages = await self.page_count(pdf_bytes, digest)
+        texts: List[str] = []
+        chars = 0
+        exhausted = False
+        page_texts = self.iter_page_texts(pdf_bytes, pages, max_chars, digest, known)
+        try:
+            async for text in page_texts:
+                texts.append(text)
+                chars += len(text)
+                if chars >= max_chars:
+                    break
+        except CpuBudgetExhausted:
+            exhausted = True
+        finally:
+            await page_texts.aclose()
+        if self.page_cache is not None:
+            await asyncio.to_thread(
+                self.page_cache.put_many, {hashes[i]: text for i, text in enumerate(texts) if i not in known}
+            )
+        truncated = exhausted or len(texts) < pages
+        return ExtractedText(
+            join_pages(texts, max_chars, truncated),
+            pages,
+            len(texts),
+            exhausted,
+            texts,
+            hashes,
+            sum(1 for i in range(len(texts)) if i in known),
+        )
+
+    def _share(self, range_pages: int, pages: int) -> Optional[float]:
+        if self.cpu_budget is None:
+            return None
+        return self.cpu_budget * range_pages / pages
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -0,0 +1,83 @@
+"""Persistent cache of evaluation results, keyed by PDF content.
+
+Businesses upload the same project PDF again and again; an evaluation only
+depends on the file's bytes, the model, the system prompt and the settings
+that shape the prompt, so `key` combines them and `ResultCache` keeps the JSON results in SQLite. When
+the stored results exceed `max_bytes`, the least recently used ones are
+evicted.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+def key(pdf_digest: str, model: str, system_prompt: str, *settings: str) -> str:
+    """Cache key of a PDF (its SHA-256 hex digest) evaluated by `model` with `system_prompt` and `settings`."""
+    prompt_digest = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    parts = ":".join((pdf_digest, model, prompt_digest) + settings)
+    return hashlib.sha256(parts.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # A lost write after a power cut only costs a model call; skip the fsync per insert.
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_used_at ON results (used_at)")
+
+    def get(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM results WHERE key = ?", (cache_key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE results SET used_at = ? WHERE key = ?", (time.time(), cache_key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, cache_key: str, value: Dict[str, Any]) -> None:
+        text = json.dumps(value)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, used_at) VALUES (?, ?, ?, ?)",
+                (cache_key, text, len(text), time.time()),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        for cache_key, size in self._db.execute("SELECT key, size FROM results ORDER BY used_at").fetchall():
+            if total - freed <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM results WHERE key = ?", (cache_key,))
+            freed += size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
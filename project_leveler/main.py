@@ -1,14 +1,23 @@
 import os
 import json
-import io
+import asyncio
+import hashlib
 import logging
-from typing import Any, Dict, Tuple
+from contextlib import aclosing
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
-from openai import OpenAI
-from pypdf import PdfReader
+import httpx
+from openai import APITimeoutError, AsyncOpenAI, DefaultAsyncHttpxClient
+
+from app import bulk, condense, result_cache
+from app.jobs import QUEUED, JobFailed, JobQueue, JobStore, QueueFull, UnsafeCallback, public as public_job
+from app.page_cache import PageCache, diff as diff_pages
+from app.pdf_text import PdfExtractor, TaskTimeout
+from app.result_cache import ResultCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -23,7 +32,23 @@ if not OPENAI_API_KEY:
     logger.error("OPENAI_API_KEY is not set!")
     raise RuntimeError("OPENAI_API_KEY is not set in environment")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+# One async client (and connection pool) for all requests, so a slow completion
+# never blocks the event loop. At most OPENAI_MAX_CONCURRENCY calls are in flight;
+# the others wait for a slot.
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "120"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+client = AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    timeout=OPENAI_TIMEOUT_SECONDS,
+    max_retries=OPENAI_MAX_RETRIES,
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_connections=OPENAI_MAX_CONCURRENCY, max_keepalive_connections=OPENAI_MAX_CONCURRENCY),
+    ),
+)
+model_slots = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+model_calls = {"in_flight": 0, "waiting": 0}
 
 app = FastAPI(
     title="SkillForge PDF Project Difficulty Evaluator",
@@ -114,46 +139,88 @@ Constraints:
 - If the description is ambiguous, choose the more conservative (lower) classification and explain briefly.
 """
 
+# Characters of page text extracted at most; the prompt is then condensed to
+# PROMPT_TOKEN_BUDGET tokens (see app/condense.py), or cut at MAX_CHARS when 0.
 MAX_CHARS = int(os.getenv("MAX_CHARS", "180000"))
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "16000"))
+
+count_tokens = condense.token_counter(OPENAI_MODEL)
+
+
+# PDF text extraction runs on a process pool, off the event loop (see app/pdf_text.py).
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+PDF_CPU_BUDGET_SECONDS = float(os.getenv("PDF_CPU_BUDGET_SECONDS", "30"))
+PDF_TASK_TIMEOUT_SECONDS = float(os.getenv("PDF_TASK_TIMEOUT_SECONDS", "60"))
+
+# Extracted page texts by page content hash, so a revised PDF only has its
+# changed pages extracted (see app/page_cache.py).
+PAGE_CACHE_PATH = os.getenv("PAGE_CACHE_PATH", "cache/pages.sqlite3")
+PAGE_CACHE_MAX_PAGES = int(os.getenv("PAGE_CACHE_MAX_PAGES", "200000"))
+PAGE_CACHE_MAX_DOCUMENTS = int(os.getenv("PAGE_CACHE_MAX_DOCUMENTS", "10000"))
+PAGE_CACHE_REVISION_MIN_SHARED = float(os.getenv("PAGE_CACHE_REVISION_MIN_SHARED", "0.5"))
+PAGE_CACHE_COMMON_PAGE_DOCUMENTS = int(os.getenv("PAGE_CACHE_COMMON_PAGE_DOCUMENTS", "50"))
+
+page_cache = PageCache(
+    PAGE_CACHE_PATH,
+    PAGE_CACHE_MAX_PAGES,
+    PAGE_CACHE_MAX_DOCUMENTS,
+    min_shared=PAGE_CACHE_REVISION_MIN_SHARED,
+    common_documents=PAGE_CACHE_COMMON_PAGE_DOCUMENTS,
+) if PAGE_CACHE_PATH else None
+
+extractor = PdfExtractor(
+    workers=PDF_WORKERS,
+    pages_per_task=PDF_PAGES_PER_TASK,
+    cpu_budget=PDF_CPU_BUDGET_SECONDS if PDF_CPU_BUDGET_SECONDS > 0 else None,
+    page_cache=page_cache,
+    task_timeout=PDF_TASK_TIMEOUT_SECONDS if PDF_TASK_TIMEOUT_SECONDS > 0 else None,
+)
 
+# Results of PDFs already evaluated with this model and prompt (see app/result_cache.py).
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "cache/results.sqlite3")
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
 
-def extract_text_from_pdf_bytes(pdf_bytes: bytes) -> Tuple[str, int]:
-    reader = PdfReader(io.BytesIO(pdf_bytes))
-    pages = len(reader.pages)
-    parts = []
-    for i, page in enumerate(reader.pages, start=1):
-        try:
-            text = page.extract_text() or ""
-        except Exception:
-            text = ""
-        text = text.strip()
-        if text:
-            parts.append(f"\n--- PDF PAGE {i} ---\n{text}\n")
-    full_text = "\n".join(parts).strip()
-    if len(full_text) > MAX_CHARS:
-        full_text = full_text[:MAX_CHARS] + "\n[TRUNCATED]\n"
-    return full_text, pages
-
-
-def call_model(user_content: str) -> Dict[str, Any]:
+cache = ResultCache(RESULT_CACHE_PATH, RESULT_CACHE_MAX_BYTES) if RESULT_CACHE_PATH else None
+
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    extractor.shutdown()
+
+
+async def call_model(user_content: str) -> Dict[str, Any]:
     """Call OpenAI API to analyze the project description."""
     try:
-        # Use chat completions API (more widely available)
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_content},
-            ],
-            response_format={"type": "json_object"},  # Ensure JSON response
-            temperature=0.3,  # Lower temperature for more consistent output
-        )
+        model_calls["waiting"] += 1
+        try:
+            await model_slots.acquire()
+        finally:
+            model_calls["waiting"] -= 1
+        model_calls["in_flight"] += 1
+        try:
+            # Use chat completions API (more widely available)
+            response = await client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": user_content},
+                ],
+                response_format={"type": "json_object"},  # Ensure JSON response
+                temperature=0.3,  # Lower temperature for more consistent output
+            )
+        finally:
+            model_calls["in_flight"] -= 1
+            model_slots.release()
         text = response.choices[0].message.content
         logger.info(f"OpenAI response received, length: {len(text)}")
         return json.loads(text.strip())
     except json.JSONDecodeError as e:
         logger.error(f"Failed to parse OpenAI response as JSON: {e}")
         raise HTTPException(status_code=500, detail="AI returned invalid JSON response")
+    except APITimeoutError:
+        logger.error(f"OpenAI API timed out after {OPENAI_TIMEOUT_SECONDS}s")
+        raise HTTPException(status_code=504, detail="AI service timed out")
     except Exception as e:
         logger.error(f"OpenAI API error: {repr(e)}")
         raise HTTPException(status_code=500, detail=f"AI service error: {str(e)}")
@@ -162,38 +229,103 @@ def call_model(user_content: str) -> Dict[str, Any]:
 @app.get("/health")
 def health():
     """Health check endpoint for container orchestration."""
-    return {"status": "ok", "service": "project_leveler"}
+    return {
+        "status": "ok",
+        "service": "project_leveler",
+        "model_calls": {**model_calls, "max_concurrency": OPENAI_MAX_CONCURRENCY},
+        "result_cache": cache.stats() if cache is not None else None,
+        "page_cache": page_cache.stats() if page_cache is not None else None,
+        "pdf_task_timeouts": extractor.timeouts,
+        "jobs": {**jobs.stats(), "by_status": jobs.store.counts()},
+    }
+
+
+async def read_pdf_upload(file: UploadFile) -> bytes:
+    filename = (file.filename or "").lower()
+    if not filename.endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only .pdf files are supported.")
+
+    raw = await file.read()
+    if not raw:
+        raise HTTPException(status_code=400, detail="Empty file.")
+    return raw
+
+
+# Fields of a result that describe one request rather than the document; they
+# are not stored in the result cache, so cache hits leave them out.
+PER_REQUEST_FIELDS = ("pdf_pages_cached", "revision")
+
+
+def find_revision(store: PageCache, digest: str, page_hashes: List[str]) -> Optional[Dict[str, Any]]:
+    """Changes against the earlier upload sharing the most pages with this one; remembers this one."""
+    revision = None
+    previous = store.previous_version(digest, page_hashes)
+    if previous is not None:
+        revision = diff_pages(previous[0], previous[1], page_hashes)
+        logger.info(
+            f"Revision of {previous[0]}: {len(revision['changed_pages'])} pages changed, "
+            f"{len(revision['added_pages'])} added, {len(revision['removed_pages'])} removed"
+        )
+    store.remember(digest, page_hashes)
+    return revision
 
 
-@app.post("/evaluate-pdf")
-async def evaluate_pdf(file: UploadFile = File(...)):
-    """
-    Analyze a PDF project description and extract classification data.
-    
-    Returns:
-        - domain: backend | frontend | fullstack
-        - required_level: beginner | intermediate | advanced
-        - complexity: low | medium | high
-        - language_or_framework: suggested tech stack
-        - estimates: UI pages, DB tables estimates
-        - reasons: explanations for classifications
-    """
+async def evaluate_document(raw: bytes) -> Tuple[Dict[str, Any], Optional[bool]]:
+    """Evaluation result of a PDF's bytes, and whether it was a result cache hit (None without a cache)."""
     try:
-        filename = (file.filename or "").lower()
-        if not filename.endswith(".pdf"):
-            raise HTTPException(status_code=400, detail="Only .pdf files are supported.")
-
-        raw = await file.read()
-        if not raw:
-            raise HTTPException(status_code=400, detail="Empty file.")
-        
-        logger.info(f"Processing PDF: {file.filename}, size: {len(raw)} bytes")
+        digest = hashlib.sha256(raw).hexdigest()
+        cache_key = result_cache.key(
+            digest, OPENAI_MODEL, SYSTEM_PROMPT, f"max_chars={MAX_CHARS}", f"prompt_tokens={PROMPT_TOKEN_BUDGET}"
+        )
+        if cache is not None:
+            cached = await asyncio.to_thread(cache.get, cache_key)
+            if cached is not None:
+                logger.info(f"Result cache hit for {digest}")
+                # Results stored before these fields were left out of the cache.
+                for name in PER_REQUEST_FIELDS:
+                    cached.pop(name, None)
+                return cached, True
 
-        pdf_text, page_count = extract_text_from_pdf_bytes(raw)
+        try:
+            extracted = await extractor.extract(raw, MAX_CHARS, digest)
+        except TaskTimeout:
+            raise HTTPException(
+                status_code=400, detail=f"PDF could not be parsed within {PDF_TASK_TIMEOUT_SECONDS}s."
+            )
+        pdf_text, page_count = extracted.text, extracted.pages
+        if extracted.budget_exhausted:
+            logger.warning(
+                f"PDF CPU budget ({PDF_CPU_BUDGET_SECONDS}s) or task timeout exhausted after {extracted.pages_read} of {page_count} pages"
+            )
         if not pdf_text.strip():
             raise HTTPException(status_code=400, detail="Could not extract readable text from the PDF.")
 
-        logger.info(f"Extracted {page_count} pages, {len(pdf_text)} characters")
+        logger.info(
+            f"Extracted {extracted.pages_read} of {page_count} pages "
+            f"({extracted.pages_cached} from the page cache), {len(pdf_text)} characters"
+        )
+
+        revision = None
+        if page_cache is not None:
+            revision = await asyncio.to_thread(find_revision, page_cache, digest, extracted.page_hashes)
+
+        prompt_tokens = None
+        if PROMPT_TOKEN_BUDGET > 0:
+            condensed = await asyncio.to_thread(
+                condense.condense, extracted.page_texts, PROMPT_TOKEN_BUDGET, count_tokens
+            )
+            if condensed.text.strip():
+                pdf_text = condensed.text
+                if extracted.pages_read < page_count:
+                    pdf_text += f"\n\n[TRUNCATED: pages {extracted.pages_read + 1}-{page_count} not read]"
+                prompt_tokens = condensed.tokens
+                logger.info(
+                    f"Condensed {condensed.original_tokens} to {condensed.tokens} tokens: "
+                    f"{condensed.boilerplate_lines} boilerplate lines dropped, {condensed.cut_pages} pages cut"
+                )
+            else:
+                # Every line looked like a header or footer; send the text as extracted.
+                logger.warning(f"Condensing {digest} left no text, using the extracted text cut at {MAX_CHARS} characters")
 
         user_content = f"""PDF pages: {page_count}
 
@@ -201,7 +333,7 @@ Project description (text extracted from the PDF):
 {pdf_text}
 """
 
-        data = call_model(user_content)
+        data = await call_model(user_content)
         
         # Inject actual PDF page count
         if "estimates" in data:
@@ -209,10 +341,152 @@ Project description (text extracted from the PDF):
         
         logger.info(f"Analysis complete: domain={data.get('domain')}, level={data.get('required_level')}, complexity={data.get('complexity')}")
         
-        return {"success": True, "data": data}
+        result = {
+            "success": True,
+            "data": data,
+            "pdf_pages_read": extracted.pages_read,
+            "pdf_pages_cached": extracted.pages_cached,
+            "prompt_tokens": prompt_tokens,
+            "revision": revision,
+        }
+        # An extraction cut short by the CPU budget or a task timeout (e.g. a
+        # busy host) is not stored, so the next upload tries the whole text again.
+        if cache is not None and not extracted.budget_exhausted:
+            stored = {name: value for name, value in result.items() if name not in PER_REQUEST_FIELDS}
+            await asyncio.to_thread(cache.put, cache_key, stored)
+        return result, False if cache is not None else None
 
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error during evaluation: {repr(e)}")
         raise HTTPException(status_code=500, detail=f"Evaluation failed: {str(e)}")
+
+
+@app.post("/evaluate-pdf")
+async def evaluate_pdf(response: Response, file: UploadFile = File(...)):
+    """
+    Analyze a PDF project description and extract classification data.
+    
+    Returns:
+        - domain: backend | frontend | fullstack
+        - required_level: beginner | intermediate | advanced
+        - complexity: low | medium | high
+        - language_or_framework: suggested tech stack
+        - estimates: UI pages, DB tables estimates
+        - reasons: explanations for classifications
+
+    The `X-Cache` header says whether the result came from the result cache
+    (`hit`) or was computed (`miss`). When the PDF revises one uploaded
+    before, `revision` lists the pages changed, added and removed since.
+    Cache hits have no `revision` or `pdf_pages_cached`: nothing was extracted.
+    """
+    raw = await read_pdf_upload(file)
+    logger.info(f"Processing PDF: {file.filename}, size: {len(raw)} bytes")
+
+    result, cache_hit = await evaluate_document(raw)
+    if cache_hit is not None:
+        response.headers["X-Cache"] = "hit" if cache_hit else "miss"
+    return result
+
+
+# Bulk uploads (see app/bulk.py).
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "100"))
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(200 * 1024 * 1024)))
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "8"))
+
+
+@app.post("/evaluate-pdf/bulk")
+async def evaluate_pdf_bulk(files: List[UploadFile] = File(...)):
+    """
+    Evaluate many PDFs (and zip archives of PDFs) in one request.
+
+    Streams NDJSON, one line per document as soon as it is evaluated:
+    `index` (upload order), `filename`, `sha256`, `status_code`, and `result`
+    (the `/evaluate-pdf` response) or `error`. Identical documents are
+    evaluated once; the copies carry `duplicate_of` (the first one's index).
+    """
+    if len(files) > BULK_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"More than {BULK_MAX_FILES} documents in one upload.")
+    try:
+        uploads = await bulk.read_uploads(files, BULK_MAX_BYTES)
+        documents = await asyncio.to_thread(bulk.collect, uploads, BULK_MAX_FILES, BULK_MAX_BYTES)
+    except bulk.BulkError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    logger.info(
+        f"Bulk upload: {len(documents)} documents, {len({d.sha256 for d in documents if d.error is None})} distinct"
+    )
+
+    async def lines():
+        async with aclosing(bulk.evaluate_all(documents, evaluate_document, BULK_CONCURRENCY)) as results:
+            async for line in results:
+                yield json.dumps(line) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def run_job(pdf: bytes) -> Dict[str, Any]:
+    try:
+        result, _ = await evaluate_document(pdf)
+    except HTTPException as e:
+        raise JobFailed(e.status_code, str(e.detail))
+    return result
+
+
+# Background evaluation jobs (see app/jobs.py).
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "cache/jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_QUEUE = int(os.getenv("JOB_MAX_QUEUE", "100"))
+JOB_CALLBACK_TIMEOUT_SECONDS = float(os.getenv("JOB_CALLBACK_TIMEOUT_SECONDS", "10"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "168"))
+# Hosts callbacks may go to (internal ones included); empty allows any host
+# resolving to public addresses only.
+JOB_CALLBACK_ALLOWED_HOSTS = [h.strip() for h in os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",") if h.strip()]
+
+jobs = JobQueue(
+    JobStore(JOBS_DB_PATH),
+    run_job,
+    workers=JOB_WORKERS,
+    max_queue=JOB_MAX_QUEUE,
+    callback_timeout=JOB_CALLBACK_TIMEOUT_SECONDS,
+    retention=JOB_RETENTION_HOURS * 3600,
+    callback_allowed_hosts=JOB_CALLBACK_ALLOWED_HOSTS,
+)
+
+
+@app.on_event("startup")
+async def start_jobs():
+    await jobs.start()
+
+
+@app.on_event("shutdown")
+async def stop_jobs():
+    await jobs.stop()
+
+
+@app.post("/jobs/evaluate-pdf", status_code=202)
+async def create_evaluate_pdf_job(file: UploadFile = File(...), callback_url: Optional[str] = Form(None)):
+    """
+    Queue a PDF evaluation and return its job id at once.
+
+    Poll `GET /jobs/{job_id}` for the status and result. With `callback_url`,
+    the finished job (the same JSON) is also POSTed there.
+    """
+    raw = await read_pdf_upload(file)
+    try:
+        job_id = await jobs.submit(raw, file.filename, callback_url or None)
+    except UnsafeCallback as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFull:
+        raise HTTPException(status_code=503, detail="Job queue is full, retry later.", headers={"Retry-After": "5"})
+    logger.info(f"Queued job {job_id}: {file.filename}, size: {len(raw)} bytes")
+    return {"job_id": job_id, "status": QUEUED, "status_url": f"/jobs/{job_id}"}
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Status of a job, with its result once it succeeded or its error once it failed."""
+    job = jobs.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return public_job(job)
@@ -0,0 +1,147 @@
+import io
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Add the service root to path so `app` is importable
+here = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+state = tempfile.mkdtemp(prefix="leveler-tests-")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("RESULT_CACHE_PATH", os.path.join(state, "results.sqlite3"))
+os.environ.setdefault("PAGE_CACHE_PATH", os.path.join(state, "pages.sqlite3"))
+os.environ.setdefault("JOBS_DB_PATH", os.path.join(state, "jobs.sqlite3"))
+os.environ.setdefault("PDF_WORKERS", "2")
+
+import main
+from app.pdf_text import ExtractedText
+from app.result_cache import ResultCache
+from test_pdf_text import make_pdf
+
+
+@pytest.fixture
+def model_calls(monkeypatch):
+    """Prompts sent to the model; the model answers with a fixed evaluation."""
+    calls = []
+
+    async def call_model(user_content):
+        calls.append(user_content)
+        return {"domain": "backend", "required_level": "beginner", "complexity": "low", "estimates": {"pdf_pages": 0}}
+
+    monkeypatch.setattr(main, "call_model", call_model)
+    return calls
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path, model_calls):
+    monkeypatch.setattr(main, "cache", ResultCache(str(tmp_path / "results.sqlite3"), 1 << 20))
+    with TestClient(main.app) as c:
+        yield c
+
+
+def evaluate(client, pdf, filename="brief.pdf"):
+    return client.post("/evaluate-pdf", files={"file": (filename, pdf, "application/pdf")})
+
+
+def test_same_pdf_is_answered_from_the_result_cache(client, model_calls):
+    pdf = make_pdf(3, text="cached brief page {page} line {line}")
+    first = evaluate(client, pdf)
+    second = evaluate(client, pdf, filename="renamed.pdf")
+    assert (first.status_code, second.status_code) == (200, 200)
+    assert (first.headers["X-Cache"], second.headers["X-Cache"]) == ("miss", "hit")
+    assert second.json()["data"] == first.json()["data"]
+    assert first.json()["data"]["estimates"]["pdf_pages"] == 3
+    assert len(model_calls) == 1
+    assert client.get("/health").json()["result_cache"]["hits"] == 1
+
+
+def test_changing_the_model_or_the_prompt_misses_the_cache(client, model_calls, monkeypatch):
+    pdf = make_pdf(2, text="model change brief page {page} line {line}")
+    assert evaluate(client, pdf).headers["X-Cache"] == "miss"
+    monkeypatch.setattr(main, "OPENAI_MODEL", "another-model")
+    assert evaluate(client, pdf).headers["X-Cache"] == "miss"
+    monkeypatch.setattr(main, "SYSTEM_PROMPT", main.SYSTEM_PROMPT + "\nBe brief.")
+    assert evaluate(client, pdf).headers["X-Cache"] == "miss"
+    assert evaluate(client, pdf).headers["X-Cache"] == "hit"
+    assert len(model_calls) == 3
+
+
+def test_non_pdf_upload_is_rejected(client, model_calls):
+    resp = client.post("/evaluate-pdf", files={"file": ("brief.txt", b"hello", "text/plain")})
+    assert resp.status_code == 400
+    assert model_calls == []
+
+
+def test_bulk_upload_streams_one_line_per_document(client, model_calls):
+    pdf = make_pdf(1, text="bulk brief line {line}")
+    resp = client.post(
+        "/evaluate-pdf/bulk",
+        files=[("files", ("a.pdf", pdf, "application/pdf")), ("files", ("b.pdf", pdf, "application/pdf"))],
+    )
+    assert resp.status_code == 200
+    lines = sorted((json.loads(line) for line in resp.text.splitlines()), key=lambda line: line["index"])
+    assert [line["status_code"] for line in lines] == [200, 200]
+    assert lines[1]["duplicate_of"] == 0
+    assert len(model_calls) == 1
+
+
+def test_oversized_bulk_upload_is_refused(client, model_calls, monkeypatch):
+    monkeypatch.setattr(main, "BULK_MAX_BYTES", 1_000)
+    resp = client.post("/evaluate-pdf/bulk", files=[("files", ("a.pdf", b"%PDF" + b"0" * 2_000, "application/pdf"))])
+    assert resp.status_code == 413
+    assert model_calls == []
+
+
+def test_empty_condensed_text_falls_back_to_the_extracted_text(client, model_calls, monkeypatch):
+    monkeypatch.setattr(main.condense, "condense", lambda *args: main.condense.Condensed("", 0, 10, 5, 0))
+    resp = evaluate(client, make_pdf(1, text="fallback brief line {line}"))
+    assert resp.status_code == 200
+    assert resp.json()["prompt_tokens"] is None
+    assert "fallback brief line 1" in model_calls[0]
+
+
+def test_revisions_are_reported_and_not_served_from_the_result_cache(client, model_calls):
+    first = make_pdf(3, text="revised brief page {page} line {line}")
+    second = make_pdf(4, text="revised brief page {page} line {line}")
+    assert evaluate(client, first).json()["revision"] is None
+    revised = evaluate(client, second).json()
+    assert revised["revision"]["previous_pages"] == 3
+    assert (revised["revision"]["unchanged_pages"], revised["revision"]["added_pages"]) == (3, [4])
+    assert revised["pdf_pages_cached"] == 3
+
+    again = evaluate(client, second)
+    assert again.headers["X-Cache"] == "hit"
+    assert "revision" not in again.json() and "pdf_pages_cached" not in again.json()
+    assert again.json()["data"] == revised["data"]
+
+
+def test_corrupt_zip_member_does_not_fail_the_bulk_upload(client, model_calls):
+    pdf = make_pdf(1, text="zip brief line {line}")
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w", zipfile.ZIP_STORED) as archive:
+        archive.writestr("good.pdf", pdf)
+        archive.writestr("corrupt.pdf", b"%PDF corrupt")
+    data = bytearray(data.getvalue())
+    data[data.index(b"%PDF corrupt") + 5] ^= 0xFF
+    resp = client.post("/evaluate-pdf/bulk", files=[("files", ("briefs.zip", bytes(data), "application/zip"))])
+    assert resp.status_code == 200
+    lines = {json.loads(line)["filename"]: json.loads(line) for line in resp.text.splitlines()}
+    assert lines["briefs.zip/good.pdf"]["status_code"] == 200
+    assert lines["briefs.zip/corrupt.pdf"]["status_code"] == 400
+
+
+def test_results_of_a_cut_short_extraction_are_not_cached(client, model_calls, monkeypatch):
+    async def extract(pdf_bytes, max_chars, digest=None):
+        return ExtractedText("--- PDF PAGE 1 ---\nfirst page\n[TRUNCATED]\n", 5, 1, True, ["first page"])
+
+    monkeypatch.setattr(main.extractor, "extract", extract)
+    pdf = make_pdf(5, text="budget brief page {page} line {line}")
+    assert evaluate(client, pdf).headers["X-Cache"] == "miss"
+    assert evaluate(client, pdf).headers["X-Cache"] == "miss"
+    assert len(model_calls) == 2
@@ -0,0 +1,129 @@
+import asyncio
+import io
+import pathlib
+import sys
+import zipfile
+
+import pytest
+
+# Add the service root to path so `app` is importable
+here = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+
+from app import bulk
+from app.bulk import BulkError
+
+
+def zip_of(members):
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return data.getvalue()
+
+
+class FakeUpload:
+    def __init__(self, filename, data):
+        self.filename = filename
+        self.data = data
+        self.read_bytes = 0
+
+    async def read(self, size=-1):
+        chunk = self.data[self.read_bytes:self.read_bytes + size if size >= 0 else None]
+        self.read_bytes += len(chunk)
+        return chunk
+
+
+def run_all(documents, concurrency=4):
+    evaluated = []
+
+    async def evaluate(pdf):
+        evaluated.append(pdf)
+        if pdf == b"%PDF broken":
+            raise RuntimeError("broken")
+        return {"size": len(pdf)}, None
+
+    async def main():
+        return [line async for line in bulk.evaluate_all(documents, evaluate, concurrency)]
+
+    return asyncio.run(main()), evaluated
+
+
+def test_identical_documents_are_evaluated_once():
+    documents = bulk.collect(
+        [
+            ("a.pdf", b"%PDF one"),
+            ("briefs.zip", zip_of({"b.pdf": b"%PDF one", "c.pdf": b"%PDF two", "notes.txt": b"x", "__MACOSX/._b.pdf": b""})),
+            ("d.pdf", b"%PDF broken"),
+        ],
+        max_files=10,
+        max_bytes=1000,
+    )
+    assert [d.filename for d in documents] == ["a.pdf", "briefs.zip/b.pdf", "briefs.zip/c.pdf", "briefs.zip/notes.txt", "d.pdf"]
+    lines, evaluated = run_all(documents)
+    assert sorted(evaluated) == [b"%PDF broken", b"%PDF one", b"%PDF two"]
+    by_index = {line["index"]: line for line in lines}
+    assert len(by_index) == 5
+    assert by_index[1]["duplicate_of"] == 0 and by_index[1]["result"] == by_index[0]["result"]
+    assert by_index[1]["sha256"] == by_index[0]["sha256"]
+    assert "duplicate_of" not in by_index[0] and "duplicate_of" not in by_index[2]
+    assert by_index[3]["status_code"] == 400
+    assert (by_index[4]["status_code"], by_index[4]["error"]) == (500, "Evaluation failed: broken")
+
+
+def test_zip_members_are_checked_against_the_limit_before_decompressing():
+    bomb = zip_of({"big.pdf": b"%PDF" + b"0" * 100_000})
+    assert len(bomb) < 1_000
+    with pytest.raises(BulkError) as raised:
+        bulk.collect([("bomb.zip", bomb)], max_files=10, max_bytes=10_000)
+    assert raised.value.status_code == 413
+
+
+def test_too_many_zip_members_are_refused():
+    archive = zip_of({f"{i}.pdf": f"%PDF {i}" for i in range(5)})
+    with pytest.raises(BulkError) as raised:
+        bulk.collect([("many.zip", archive)], max_files=3, max_bytes=10_000)
+    assert raised.value.status_code == 413
+
+
+def test_invalid_zip_is_a_bad_request():
+    with pytest.raises(BulkError) as raised:
+        bulk.collect([("broken.zip", b"not a zip")], max_files=3, max_bytes=10_000)
+    assert raised.value.status_code == 400
+
+
+def test_reading_stops_as_soon_as_the_upload_is_too_large(monkeypatch):
+    monkeypatch.setattr(bulk, "READ_CHUNK", 100)
+    small, large, never_read = FakeUpload("a.pdf", b"1" * 150), FakeUpload("b.pdf", b"2" * 10_000), FakeUpload("c.pdf", b"3")
+    with pytest.raises(BulkError) as raised:
+        asyncio.run(bulk.read_uploads([small, large, never_read], max_bytes=500))
+    assert raised.value.status_code == 413
+    assert large.read_bytes == 400 and never_read.read_bytes == 0
+
+    uploads = asyncio.run(bulk.read_uploads([FakeUpload("a.pdf", b"1" * 150), FakeUpload(None, b"2")], max_bytes=500))
+    assert uploads == [("a.pdf", b"1" * 150), ("", b"2")]
+
+
+def test_unreadable_zip_members_get_an_error_line_of_their_own():
+    corrupt = io.BytesIO()
+    with zipfile.ZipFile(corrupt, "w", zipfile.ZIP_STORED) as archive:
+        archive.writestr("good.pdf", b"%PDF good")
+        archive.writestr("corrupt.pdf", b"%PDF corrupt")
+        archive.writestr("encrypted.pdf", b"%PDF encrypted")
+    data = bytearray(corrupt.getvalue())
+    # Flip a byte of corrupt.pdf's stored data, so its CRC no longer matches.
+    data[data.index(b"%PDF corrupt") + 5] ^= 0xFF
+    # Mark encrypted.pdf as encrypted in the central directory.
+    entry = data.index(b"PK\x01\x02", data.index(b"PK\x01\x02", data.index(b"PK\x01\x02") + 1) + 1)
+    data[entry + 8] |= 0x01
+
+    documents = bulk.collect([("briefs.zip", bytes(data))], max_files=10, max_bytes=10_000)
+    assert [(d.filename, d.error is None) for d in documents] == [
+        ("briefs.zip/good.pdf", True),
+        ("briefs.zip/corrupt.pdf", False),
+        ("briefs.zip/encrypted.pdf", False),
+    ]
+    assert "CRC" in documents[1].error and "encrypted" in documents[2].error
+    lines, evaluated = run_all(documents)
+    assert evaluated == [b"%PDF good"]
+    assert sorted(line["status_code"] for line in lines) == [200, 400, 400]
@@ -0,0 +1,70 @@
+import pathlib
+import sys
+
+# Add the service root to path so `app` is importable
+here = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+
+from app import condense
+
+
+def letters(n):
+    return "".join(chr(ord("a") + int(digit)) for digit in str(n))
+
+
+def brief(pages, body_lines=20):
+    """Pages with a running header and footer; body lines have no digits, so none looks numbered."""
+    return [
+        "\n".join(
+            ["ACME Corp  -  Confidential", f"Project brief, page {page} of {pages}"]
+            + [f"Section {letters(page)} {letters(line)}: the system   must handle it." for line in range(body_lines)]
+            + [f"Page {page} of {pages}", str(page)]
+        )
+        for page in range(1, pages + 1)
+    ]
+
+
+def test_repeated_headers_footers_and_page_numbers_are_dropped():
+    result = condense.condense(brief(6), 100_000, condense.estimate_tokens)
+    assert "ACME" not in result.text and "of 6" not in result.text
+    assert result.boilerplate_lines == 6 * 4
+    assert result.cut_pages == 0
+    assert "Section b a: the system must handle it." in result.text
+    assert result.text.startswith("--- PDF PAGE 1 ---\nSection b a")
+
+
+def test_short_pages_keep_their_lines():
+    slides = ["Agenda\nScope\nTimeline"] * 6
+    result = condense.condense(slides, 100_000, condense.estimate_tokens)
+    assert result.boilerplate_lines == 0
+    assert result.text.count("Scope") == 6
+
+
+def test_condensed_text_fits_the_budget_and_keeps_every_page_opening():
+    pages = brief(30, body_lines=60)
+    pages[3] = "Short page with one requirement."
+    result = condense.condense(pages, 2_000, condense.estimate_tokens)
+    assert result.original_tokens > 5 * 2_000
+    assert result.tokens <= 2_000
+    assert result.cut_pages == 29
+    assert "Short page with one requirement." in result.text
+    for page in range(1, 31):
+        assert f"--- PDF PAGE {page} ---" in result.text
+        if page != 4:
+            assert f"Section {letters(page)} a:" in result.text
+
+
+def test_token_counter_loads_the_encoding_on_first_use(monkeypatch):
+    loads = []
+
+    class FailingTiktoken:
+        @staticmethod
+        def encoding_for_model(model):
+            loads.append(model)
+            raise OSError("no network")
+
+    monkeypatch.setattr(condense, "tiktoken", FailingTiktoken)
+    count = condense.token_counter("gpt-4o")
+    assert loads == []
+    assert count("x" * 10) == 3 and count("") == 0
+    assert loads == ["gpt-4o"]
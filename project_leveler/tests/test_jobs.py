@@ -0,0 +1,164 @@
+import asyncio
+import json
+import pathlib
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Add the service root to path so `app` is importable
+here = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+
+from app.jobs import (
+    FAILED,
+    QUEUED,
+    RUNNING,
+    SUCCEEDED,
+    JobFailed,
+    JobQueue,
+    JobStore,
+    QueueFull,
+    UnsafeCallback,
+    check_callback_url,
+)
+
+
+async def evaluate(pdf):
+    if pdf == b"bad":
+        raise JobFailed(400, "Could not extract readable text from the PDF.")
+    return {"success": True, "size": len(pdf)}
+
+
+async def wait_finished(store, job_id):
+    for _ in range(500):
+        job = store.get(job_id)
+        if job["status"] in (SUCCEEDED, FAILED) and (not job["callback_url"] or job["callback_status"]):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+@pytest.fixture
+def callbacks():
+    """Local callback receiver that answers 500 to the first delivery and 200 after."""
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(500 if len(received) == 1 else 200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/callback", received
+    server.shutdown()
+
+
+def test_jobs_go_from_queued_to_finished(tmp_path):
+    async def main():
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        queue = JobQueue(store, evaluate, workers=2)
+        good = await queue.submit(b"%PDF good", "good.pdf", None)
+        bad = await queue.submit(b"bad", "bad.pdf", None)
+        # Nothing runs before the workers start.
+        assert store.get(good)["status"] == QUEUED
+        await queue.start()
+        try:
+            return await wait_finished(store, good), await wait_finished(store, bad), store.pdf(good)
+        finally:
+            await queue.stop()
+
+    good, bad, pdf = asyncio.run(main())
+    assert (good["status"], good["result"]) == (SUCCEEDED, {"success": True, "size": 9})
+    assert (bad["status"], bad["status_code"], bad["result"]) == (FAILED, 400, None)
+    # The PDF is dropped once the job finished.
+    assert pdf is None
+
+
+def test_unfinished_jobs_run_again_after_a_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = JobStore(path)
+    queued = store.create(b"%PDF queued", "queued.pdf", None)
+    interrupted = store.create(b"%PDF interrupted", "interrupted.pdf", None)
+    store.start(interrupted)
+    assert store.get(interrupted)["status"] == RUNNING
+    store.close()
+
+    async def main():
+        store = JobStore(path)
+        queue = JobQueue(store, evaluate)
+        await queue.start()
+        try:
+            return [(await wait_finished(store, job_id))["status"] for job_id in (queued, interrupted)]
+        finally:
+            await queue.stop()
+
+    assert asyncio.run(main()) == [SUCCEEDED, SUCCEEDED]
+
+
+def test_full_queue_rejects_new_jobs(tmp_path):
+    async def main():
+        queue = JobQueue(JobStore(str(tmp_path / "jobs.sqlite3")), evaluate, max_queue=1)
+        await queue.submit(b"%PDF", "one.pdf", None)
+        with pytest.raises(QueueFull):
+            await queue.submit(b"%PDF", "two.pdf", None)
+
+    asyncio.run(main())
+
+
+def test_failed_callback_is_retried(tmp_path, callbacks):
+    url, received = callbacks
+
+    async def main():
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        queue = JobQueue(store, evaluate, callback_allowed_hosts=["127.0.0.1"])
+        await queue.start()
+        try:
+            job_id = await queue.submit(b"%PDF", "brief.pdf", url)
+            return job_id, await wait_finished(store, job_id)
+        finally:
+            await queue.stop()
+
+    job_id, job = asyncio.run(main())
+    assert job["callback_status"] == "delivered"
+    assert len(received) == 2
+    assert received[1]["job_id"] == job_id and received[1]["result"] == {"success": True, "size": 4}
+
+
+@pytest.mark.parametrize("url", [
+    "ftp://example.com/callback",
+    "http://localhost/callback",
+    "http://127.0.0.1:8000/callback",
+    "http://10.1.2.3/callback",
+    "http://169.254.169.254/latest/meta-data",
+    "http://[::1]/callback",
+    "http://[::ffff:192.168.0.1]/callback",
+])
+def test_callbacks_to_internal_addresses_are_rejected(url):
+    with pytest.raises(UnsafeCallback):
+        check_callback_url(url)
+
+
+def test_callback_allow_list_admits_only_its_hosts():
+    check_callback_url("http://backend:8000/callback", {"backend"})
+    check_callback_url("https://93.184.215.14/callback")
+    with pytest.raises(UnsafeCallback):
+        check_callback_url("https://93.184.215.14/callback", {"backend"})
+
+
+def test_unsafe_callback_is_refused_at_submission(tmp_path):
+    async def main():
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        queue = JobQueue(store, evaluate)
+        with pytest.raises(UnsafeCallback):
+            await queue.submit(b"%PDF", "brief.pdf", "http://127.0.0.1/callback")
+        return store.counts()
+
+    assert asyncio.run(main()) == {}
@@ -0,0 +1,68 @@
+import pathlib
+import sys
+
+# Add the service root to path so `app` is importable
+here = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+
+from app.page_cache import PageCache, diff
+
+
+def test_page_texts_are_evicted_least_recently_used_first(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite3"), max_pages=2)
+    cache.put_many({"a": "page a", "b": "page b"})
+    assert cache.get_many(["a", "x"]) == {"a": "page a"}
+    cache.put_many({"c": "page c"})
+    assert cache.get_many(["a", "b", "c"]) == {"a": "page a", "c": "page c"}
+    stats = cache.stats()
+    assert (stats["pages"], stats["hits"], stats["misses"]) == (2, 3, 2)
+    cache.close()
+
+
+def test_previous_version_is_the_document_sharing_the_most_pages(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite3"))
+    assert cache.previous_version("v2", ["p1", "p2", "p3"]) is None
+    cache.remember("v1", ["p1", "p2", "p3", "p4"])
+    cache.remember("other", ["p1", "q2"])
+    assert cache.previous_version("v2", ["p1", "p2", "p3x", "p4", "p5"]) == ("v1", ["p1", "p2", "p3", "p4"])
+    # A document is never its own previous version, and one shared page of four is not enough.
+    assert cache.previous_version("v1", ["p1", "p2", "p3", "p4"]) is None
+    cache.close()
+
+
+def test_pages_common_to_many_documents_do_not_make_a_revision(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite3"), common_documents=2)
+    for i in range(3):
+        cache.remember(f"brief{i}", ["blank", "cover", f"body{i}"])
+    # Only the blank page and the cover match: they are in every brief.
+    assert cache.previous_version("new", ["blank", "cover", "other body"]) is None
+    assert cache.previous_version("new", ["blank", "cover", "body1", "other body"]) is None
+    assert cache.previous_version("new", ["blank", "cover", "body1", "body1b"]) is None
+    cache.remember("brief1-v2", ["blank", "cover", "body1", "more1"])
+    assert cache.previous_version("new", ["blank", "body1", "more1", "extra"]) == (
+        "brief1-v2", ["blank", "cover", "body1", "more1"]
+    )
+
+
+def test_oldest_documents_are_forgotten_first(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite3"), max_documents=1)
+    cache.remember("v1", ["p1"])
+    cache.remember("v2", ["p2"])
+    assert cache.previous_version("v3", ["p1"]) is None
+    assert cache.previous_version("v3", ["p2"]) == ("v2", ["p2"])
+    cache.close()
+
+
+def test_diff_numbers_changed_added_and_removed_pages():
+    assert diff("v1", ["a", "b", "c", "d"], ["a", "B", "c", "d", "e"]) == {
+        "previous_sha256": "v1",
+        "previous_pages": 4,
+        "unchanged_pages": 3,
+        "changed_pages": [2],
+        "added_pages": [5],
+        "removed_pages": [],
+    }
+    result = diff("v1", ["a", "b", "c", "d"], ["a", "d"])
+    assert (result["unchanged_pages"], result["changed_pages"], result["removed_pages"]) == (2, [], [2, 3])
+    result = diff("v1", ["a", "b", "c"], ["x", "y", "z", "w"])
+    assert (result["changed_pages"], result["added_pages"]) == ([1, 2, 3], [4])
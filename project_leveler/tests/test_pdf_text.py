@@ -0,0 +1,116 @@
+import asyncio
+import pathlib
+import sys
+import time
+
+import pytest
+
+# Add the service root to path so `app` is importable
+here = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+
+from app.pdf_text import PdfExtractor, TaskTimeout, extract_pages
+
+
+def make_pdf(pages, lines=20, text="page {page} line {line} lorem ipsum dolor sit amet"):
+    """Minimal PDF whose page `page` (1-based) shows `lines` lines of `text`."""
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(pages))
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i in range(pages):
+        shown = " ".join(f"({text.format(page=i + 1, line=j + 1)}) Tj T*" for j in range(lines))
+        stream = f"BT /F1 10 Tf 12 TL 20 780 Td {shown} ET"
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792]"
+            f" /Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+@pytest.fixture
+def extractor():
+    extractor = PdfExtractor(workers=2, pages_per_task=2, task_timeout=1)
+    yield extractor
+    extractor.shutdown()
+
+
+def test_extract_keeps_page_order(extractor):
+    extracted = asyncio.run(extractor.extract(make_pdf(9, lines=2), 100_000))
+    assert (extracted.pages, extracted.pages_read, extracted.budget_exhausted) == (9, 9, False)
+    assert [text.split()[1] for text in extracted.page_texts] == [str(page) for page in range(1, 10)]
+    assert extracted.text.index("PDF PAGE 1") < extracted.text.index("PDF PAGE 2") < extracted.text.index("PDF PAGE 9")
+    assert "[TRUNCATED]" not in extracted.text
+
+
+def test_extract_stops_reading_at_max_chars(extractor):
+    extracted = asyncio.run(extractor.extract(make_pdf(60), 2_500))
+    assert extracted.pages == 60
+    # Reading stops at the first page that fills the text.
+    sizes = [len(text) for text in extracted.page_texts]
+    assert sum(sizes[:-1]) < 2_500 <= sum(sizes)
+    assert extracted.pages_read == len(sizes) < 10
+    assert len(extracted.text) <= 2_500 + len("\n[TRUNCATED]\n")
+    assert extracted.text.endswith("[TRUNCATED]\n")
+
+
+def test_a_task_over_the_timeout_is_killed_and_other_documents_still_finish(extractor):
+    async def main():
+        return await asyncio.gather(
+            extractor.call(time.sleep, 30),
+            extractor.extract(make_pdf(6, lines=2), 100_000),
+            return_exceptions=True,
+        )
+
+    started = time.monotonic()
+    stuck, extracted = asyncio.run(main())
+    assert time.monotonic() - started < 10
+    assert isinstance(stuck, TaskTimeout)
+    assert extracted.pages_read == 6
+    assert extractor.timeouts == 1
+    assert asyncio.run(extractor.page_count(make_pdf(4))) == 4
+
+
+def test_tasks_waiting_for_a_worker_are_not_timed_out():
+    extractor = PdfExtractor(workers=1, task_timeout=1)
+    try:
+        async def main():
+            return await asyncio.gather(*(extractor.call(time.sleep, 0.6) for _ in range(3)))
+
+        # Each task runs well within the timeout, though the last one starts 1.2s after submission.
+        assert asyncio.run(main()) == [None, None, None]
+        assert extractor.timeouts == 0
+    finally:
+        extractor.shutdown()
+
+
+def test_a_cancelled_range_stops_after_its_current_page():
+    extractor = PdfExtractor(workers=1)
+    pdf = make_pdf(1000)
+    try:
+        async def main():
+            extraction = asyncio.ensure_future(extractor.call(extract_pages, "doc", pdf, list(range(1000)), None, 10**9))
+            while extractor.pool.started_at(1) is None:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.2)
+            extraction.cancel()
+            started = time.monotonic()
+            # The only worker is free again long before the 1000 pages could have been read.
+            await extractor.call(time.sleep, 0)
+            return time.monotonic() - started
+
+        assert asyncio.run(main()) < 1
+    finally:
+        extractor.shutdown()
@@ -0,0 +1,36 @@
+import pathlib
+import sys
+
+# Add the service root to path so `app` is importable
+here = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+
+from app import result_cache
+from app.result_cache import ResultCache
+
+
+def test_key_changes_with_every_input():
+    base = result_cache.key("a" * 64, "gpt-4o", "prompt", "max_chars=1")
+    assert base == result_cache.key("a" * 64, "gpt-4o", "prompt", "max_chars=1")
+    assert len({
+        base,
+        result_cache.key("b" * 64, "gpt-4o", "prompt", "max_chars=1"),
+        result_cache.key("a" * 64, "gpt-4o-mini", "prompt", "max_chars=1"),
+        result_cache.key("a" * 64, "gpt-4o", "prompt.", "max_chars=1"),
+        result_cache.key("a" * 64, "gpt-4o", "prompt", "max_chars=2"),
+    }) == 5
+
+
+def test_get_put_and_least_recently_used_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.sqlite3"), max_bytes=250)
+    assert cache.get("one") is None
+    cache.put("one", {"value": "1" * 80})
+    cache.put("two", {"value": "2" * 80})
+    assert cache.get("one") == {"value": "1" * 80}
+    # A third result overflows the cache; "two" is the least recently used.
+    cache.put("three", {"value": "3" * 80})
+    assert cache.get("two") is None
+    assert cache.get("one") is not None and cache.get("three") is not None
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (2, 3, 2)
+    cache.close()
@@ -0,0 +1,120 @@
+from typing import List, Optional
+
+import numpy as np
+
+
+def unit_vectors(features: np.ndarray, norms: np.ndarray) -> np.ndarray:
+    """Normalized full student vectors, with the domain one-hot 1 as column 0.
+
+    Within one (domain, level) partition the dot product of these with a
+    normalized project vector is exactly the cosine similarity.
+    """
+    units = np.empty((features.shape[0], features.shape[1] + 1), dtype=np.float32)
+    units[:, 0] = 1.0
+    units[:, 1:] = features
+    units /= norms[:, None]
+    return units
+
+
+def _assign(units: np.ndarray, centroids: np.ndarray, chunk: int = 16384) -> np.ndarray:
+    out = np.empty(units.shape[0], dtype=np.int64)
+    for start in range(0, units.shape[0], chunk):
+        out[start:start + chunk] = np.argmax(units[start:start + chunk] @ centroids.T, axis=1)
+    return out
+
+
+def _kmeans(points: np.ndarray, k: int, rng: np.random.Generator, iters: int) -> np.ndarray:
+    """Spherical k-means: centroids are unit vectors, assignment is by dot product."""
+    centroids = points[rng.choice(points.shape[0], k, replace=False)]
+    for _ in range(iters):
+        assign = _assign(points, centroids)
+        sums = np.stack(
+            [np.bincount(assign, weights=points[:, d], minlength=k) for d in range(points.shape[1])], axis=1
+        )
+        lengths = np.linalg.norm(sums, axis=1)
+        filled = lengths > 0
+        centroids[filled] = (sums[filled] / lengths[filled, None]).astype(np.float32)
+    return centroids
+
+
+class IVFPartition:
+    """Inverted-file index over the eligible students of one (domain, level).
+
+    Students are clustered by their normalized vectors; a query scores the
+    centroids and only scans the rows of the `probes` closest lists. When a
+    partition has no more distinct vectors than lists (typical for seeded
+    exports, whose profiles come from a few presets) every list holds a
+    single vector and probing is exact for the lists it reaches.
+
+    Like `RecommenderIndex`, a partition is never modified once built;
+    `with_row`/`without_row` return a new one sharing the untouched lists.
+    """
+
+    __slots__ = ("centroids", "lists")
+
+    def __init__(self, centroids: np.ndarray, lists: List[np.ndarray]):
+        self.centroids = centroids
+        self.lists = lists
+
+    @classmethod
+    def build(
+        cls,
+        rows: np.ndarray,
+        units: np.ndarray,
+        n_lists: Optional[int] = None,
+        seed: int = 0,
+        iters: int = 8,
+        sample_per_list: int = 64,
+    ) -> "IVFPartition":
+        """Cluster `rows` (sorted) whose normalized vectors are `units`."""
+        n_lists = n_lists or max(1, min(1024, int(np.sqrt(rows.size))))
+        distinct = np.unique(units, axis=0)
+        if distinct.shape[0] <= n_lists:
+            centroids = distinct
+        else:
+            rng = np.random.default_rng(seed)
+            take = min(rows.size, n_lists * sample_per_list)
+            sample = units[rng.choice(rows.size, take, replace=False)]
+            k = min(n_lists, np.unique(sample, axis=0).shape[0])
+            centroids = _kmeans(sample, k, rng, iters)
+        assign = _assign(units, centroids)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(centroids.shape[0] + 1))
+        lists = [rows[order[bounds[i]:bounds[i + 1]]] for i in range(centroids.shape[0])]
+        return cls(centroids.astype(np.float32), lists)
+
+    def __len__(self) -> int:
+        return sum(rows.size for rows in self.lists)
+
+    def search(self, query: np.ndarray, probes: int, min_rows: int = 0) -> np.ndarray:
+        """Sorted rows of the `probes` lists closest to the normalized `query`.
+
+        Keeps probing further lists until at least `min_rows` rows are found.
+        """
+        order = np.argsort(-(self.centroids @ query), kind="stable")
+        picked = []
+        found = 0
+        for i, li in enumerate(order):
+            if i >= probes and found >= min_rows:
+                break
+            picked.append(self.lists[li])
+            found += self.lists[li].size
+        if not picked:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(picked))
+
+    def with_row(self, row: int, unit: np.ndarray) -> "IVFPartition":
+        """New partition with `row` added to its closest list; `row` must exceed every stored row."""
+        li = int(np.argmax(self.centroids @ unit.astype(np.float64)))
+        lists = list(self.lists)
+        lists[li] = np.append(lists[li], np.int64(row))
+        return IVFPartition(self.centroids, lists)
+
+    def without_row(self, row: int) -> "IVFPartition":
+        for li, rows in enumerate(self.lists):
+            i = int(np.searchsorted(rows, row))
+            if i < rows.size and rows[i] == row:
+                lists = list(self.lists)
+                lists[li] = np.delete(rows, i)
+                return IVFPartition(self.centroids, lists)
+        return self
@@ -0,0 +1,303 @@
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from app.history import HistoryStore
+from app.journal import ChangeJournal, segment_id
+from app.recommender_index import RecommenderIndex
+from app.snapshot import is_snapshot, load_snapshot, stream_columns
+
+
+logger = logging.getLogger("recommender.dataset")
+
+
+def load_json(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"DATA_PATH not found: {path}")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_index(
+    path: str,
+    stream_min_bytes: Optional[int] = None,
+    history_half_life_days: Optional[float] = None,
+) -> RecommenderIndex:
+    """Build an index from a compiled binary snapshot (mmap'ed) or an ai_analysis.json export.
+
+    JSON exports of at least `stream_min_bytes` are streamed record by record
+    into compact columns instead of being parsed whole with `json.load`. With
+    `history_half_life_days`, assignment/submission/evaluation history feeds
+    the feature vectors; that needs a JSON export, snapshots drop the history.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"DATA_PATH not found: {path}")
+    if is_snapshot(path):
+        if history_half_life_days is not None:
+            raise ValueError(f"{path} is a snapshot; history features need a JSON export")
+        return load_snapshot(path)
+    if stream_min_bytes is not None and os.path.getsize(path) >= stream_min_bytes:
+        if history_half_life_days is None:
+            return stream_columns(path).index()
+        history = HistoryStore(history_half_life_days)
+        builder = stream_columns(path, history)
+        return builder.index(history.freeze())
+    return RecommenderIndex.from_data(load_json(path), history_half_life_days)
+
+
+@dataclass(frozen=True)
+class DatasetSnapshot:
+    """One immutable, fully-built view of the dataset.
+
+    Readers grab a reference to the current snapshot and use it for the whole
+    request; a reload or an incremental change builds a new snapshot and swaps
+    the reference, so readers never observe a half-applied update.
+    """
+
+    version: int
+    path: str
+    mtime_ns: int
+    inode: int
+    loaded_at: float
+    load_seconds: float
+    index: RecommenderIndex = field(repr=False)
+    changes: int = 0
+    # Bytes of the shared change journal already applied to `index`.
+    journal_offset: int = 0
+
+    @property
+    def segment(self) -> str:
+        return segment_id(self.inode, self.mtime_ns)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "path": self.path,
+            "loaded_at": datetime.fromtimestamp(self.loaded_at, tz=timezone.utc).isoformat(),
+            "load_seconds": round(self.load_seconds, 6),
+            "changes_since_load": self.changes,
+            **self.index.stats(),
+        }
+
+
+class DatasetStore:
+    """Process-level holder of the current DatasetSnapshot with hot reload.
+
+    `current()` is lock-free for readers: it compares the file's (mtime, inode)
+    with the loaded snapshot at most once per `check_interval` seconds and, when
+    the file changed, one thread rebuilds the snapshot while everybody else keeps
+    serving the previous one.
+
+    `path` may be a binary snapshot or a JSON export. When it does not exist,
+    `fallback_path` (if given) is used instead. JSON exports of at least
+    `stream_min_bytes` are ingested incrementally (see `load_index`). With
+    `ann_min_rows` > 0, every loaded index gets IVF partitions for its
+    (domain, level) partitions of at least that many eligible students.
+    `history_half_life_days` turns on history features (see `load_index`).
+
+    With a `journal` (see app.journal), incremental changes are shared with
+    every other process serving the same file: `apply` appends them to the
+    journal and `current()` replays the ones other processes appended, at the
+    same `check_interval`.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        check_interval: float = 1.0,
+        fallback_path: Optional[str] = None,
+        stream_min_bytes: Optional[int] = None,
+        ann_min_rows: int = 0,
+        history_half_life_days: Optional[float] = None,
+        journal: Optional[ChangeJournal] = None,
+    ):
+        self.path = path
+        self.fallback_path = fallback_path
+        self.check_interval = check_interval
+        self.stream_min_bytes = stream_min_bytes
+        self.ann_min_rows = ann_min_rows
+        self.history_half_life_days = history_half_life_days
+        self.journal = journal
+        self._snapshot: Optional[DatasetSnapshot] = None
+        self._version = 0
+        self._next_check = 0.0
+        self._reload_lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> Optional[DatasetSnapshot]:
+        return self._snapshot
+
+    def refresh_due(self) -> bool:
+        """Whether the next `current()` would check the file (and possibly reload)."""
+        return self._snapshot is None or time.monotonic() >= self._next_check
+
+    def current(self) -> DatasetSnapshot:
+        snap = self._snapshot
+        now = time.monotonic()
+        if snap is None or now >= self._next_check:
+            self._next_check = now + self.check_interval
+            if self._changed(snap):
+                self.reload(blocking=snap is None)
+                snap = self._snapshot
+            elif self._journal_pending(snap):
+                self.catch_up(blocking=False)
+                snap = self._snapshot
+        if snap is None:
+            raise FileNotFoundError(f"DATA_PATH not found: {self.source_path()}")
+        return snap
+
+    def source_path(self) -> str:
+        if self.fallback_path and not os.path.exists(self.path):
+            return self.fallback_path
+        return self.path
+
+    def _changed(self, snap: Optional[DatasetSnapshot]) -> bool:
+        path = self.source_path()
+        try:
+            st = os.stat(path)
+        except OSError:
+            if snap is not None:
+                logger.warning("DATA_PATH %s disappeared; keeping snapshot v%s", path, snap.version)
+            return snap is None
+        return snap is None or (path, st.st_mtime_ns, st.st_ino) != (snap.path, snap.mtime_ns, snap.inode)
+
+    def _journal_pending(self, snap: DatasetSnapshot) -> bool:
+        try:
+            return self.journal is not None and os.path.getsize(self.journal.path) != snap.journal_offset
+        except OSError:
+            return False
+
+    def reload(self, blocking: bool = True) -> Optional[DatasetSnapshot]:
+        """Rebuild the snapshot from disk and publish it.
+
+        With `blocking=False` the call returns immediately when another thread
+        is already reloading. A file that fails to load keeps the previous
+        snapshot in service; the error is raised only when there is nothing to
+        fall back to.
+        """
+        if not self._reload_lock.acquire(blocking=blocking):
+            return self._snapshot
+        try:
+            return self._reload()
+        finally:
+            self._reload_lock.release()
+
+    def _reload(self) -> Optional[DatasetSnapshot]:
+        path = self.source_path()
+        try:
+            st = os.stat(path)
+        except OSError:
+            if self._snapshot is None:
+                raise FileNotFoundError(f"DATA_PATH not found: {path}")
+            return self._snapshot
+
+        prev = self._snapshot
+        if prev is not None and (path, st.st_mtime_ns, st.st_ino) == (prev.path, prev.mtime_ns, prev.inode):
+            return prev
+
+        started = time.perf_counter()
+        try:
+            index = load_index(path, self.stream_min_bytes, self.history_half_life_days)
+            if self.ann_min_rows > 0:
+                index = index.with_ann(self.ann_min_rows)
+        except (OSError, ValueError) as e:
+            if prev is None:
+                raise
+            logger.error("Reload of %s failed, keeping snapshot v%s: %s", path, prev.version, e)
+            return prev
+
+        self._version += 1
+        snap = DatasetSnapshot(
+            version=self._version,
+            path=path,
+            mtime_ns=st.st_mtime_ns,
+            inode=st.st_ino,
+            loaded_at=time.time(),
+            load_seconds=time.perf_counter() - started,
+            index=index,
+        )
+        self._snapshot = snap
+        logger.info("Loaded dataset v%s from %s in %.3fs", snap.version, path, snap.load_seconds)
+        return self._catch_up()
+
+    def catch_up(self, blocking: bool = True) -> Optional[DatasetSnapshot]:
+        """Apply the journal entries other processes appended since the last call."""
+        if not self._reload_lock.acquire(blocking=blocking):
+            return self._snapshot
+        try:
+            return self._catch_up()
+        finally:
+            self._reload_lock.release()
+
+    def _catch_up(self) -> Optional[DatasetSnapshot]:
+        snap = self._snapshot
+        if self.journal is None or snap is None:
+            return snap
+        changes, offset = self.journal.read(snap.segment, snap.journal_offset)
+        if not changes:
+            if offset != snap.journal_offset:
+                self._snapshot = snap = replace(snap, journal_offset=offset)
+            return snap
+        index = snap.index
+        for change in changes:
+            try:
+                index = _apply_op(index, change["op"], change["args"])
+            except (KeyError, TypeError, ValueError, RuntimeError) as e:
+                # The writer validated it against the same state; only skew between
+                # code versions gets here.
+                logger.error("Skipping journal entry %r: %s", change, e)
+        self._version += 1
+        self._snapshot = replace(
+            snap, version=self._version, index=index, changes=snap.changes + len(changes), journal_offset=offset
+        )
+        return self._snapshot
+
+    def apply(self, op: str, *args: Any) -> DatasetSnapshot:
+        """Publish a new snapshot whose index is `index.<op>(*args)` of the current one.
+
+        `op` names a RecommenderIndex method returning a new index
+        (`upsert_student`, `delete_project`, `record_history`, ...), so the
+        change can be journaled. Changes are serialized with reloads. They
+        live until the next reload of DATA_PATH, so the exporter must include
+        them in its next file.
+        """
+        with self._reload_lock:
+            if self.journal is None:
+                snap = self._snapshot
+                if snap is None:
+                    raise FileNotFoundError(f"DATA_PATH not found: {self.path}")
+                index = _apply_op(snap.index, op, args)
+                self._version += 1
+                self._snapshot = replace(snap, version=self._version, index=index, changes=snap.changes + 1)
+                return self._snapshot
+            with self.journal.locked():
+                # Under the journal lock: first the latest file, then every change
+                # appended before ours, so ours is validated against that state.
+                if self._changed(self._snapshot):
+                    self._reload()
+                snap = self._catch_up()
+                if snap is None:
+                    raise FileNotFoundError(f"DATA_PATH not found: {self.path}")
+                index = _apply_op(snap.index, op, args)
+                offset = self.journal.append(snap.segment, {"op": op, "args": list(args)})
+                self._version += 1
+                self._snapshot = replace(
+                    snap, version=self._version, index=index, changes=snap.changes + 1, journal_offset=offset
+                )
+                return self._snapshot
+
+
+JOURNALED_OPS = frozenset(
+    {"upsert_student", "delete_student", "upsert_project", "delete_project", "record_history"}
+)
+
+
+def _apply_op(index: RecommenderIndex, op: str, args) -> RecommenderIndex:
+    if op not in JOURNALED_OPS:
+        raise ValueError(f"Unknown change {op!r}")
+    return getattr(index, op)(*args)
@@ -0,0 +1,89 @@
+"""Bounded thread pool for the blocking parts of async endpoints.
+
+The event loop serves in-memory lookups itself and hands dataset reloads and
+heavy scoring to a `BoundedExecutor`. At most `workers` jobs run and at most
+`max_queue` wait; past that `run` raises `Overloaded` at once, and a job that
+waited longer than `queue_timeout` seconds is dropped before it starts, so
+latency under a burst stays bounded and callers can answer 503.
+"""
+
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class Overloaded(Exception):
+    """The executor is full, or a job waited in the queue for too long."""
+
+
+class BoundedExecutor:
+    def __init__(self, workers: int = 4, max_queue: int = 64, queue_timeout: Optional[float] = None):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="recommender")
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def queued(self) -> int:
+        return self.in_flight - self.running
+
+    def _start(self, fn: Callable[[], Any], submitted_at: float) -> Any:
+        waited = time.monotonic() - submitted_at
+        with self._lock:
+            if self.queue_timeout is not None and waited > self.queue_timeout:
+                self.in_flight -= 1
+                self.timed_out += 1
+                raise Overloaded(f"Waited {waited:.3f}s in the executor queue")
+            self.running += 1
+        try:
+            return fn()
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.in_flight -= 1
+                self.completed += 1
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> "Future[Any]":
+        """Queue `fn(*args, **kwargs)` with the caller's context variables, or raise `Overloaded`."""
+        with self._lock:
+            if self.in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise Overloaded(f"{self.in_flight} jobs in flight")
+            self.in_flight += 1
+        call = functools.partial(contextvars.copy_context().run, functools.partial(fn, *args, **kwargs))
+        try:
+            return self._pool.submit(self._start, call, time.monotonic())
+        except BaseException:
+            with self._lock:
+                self.in_flight -= 1
+            raise
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Await `fn(*args, **kwargs)` run on the pool."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queue_timeout_seconds": self.queue_timeout,
+                "running": self.running,
+                "queued": self.in_flight - self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,287 @@
+"""Per-student aggregates of assignment, submission and evaluation history.
+
+Every event updates the aggregates of one student in O(1): counters and sums
+only, nothing is rescanned. The aggregates are turned into four extra
+features that extend the recommender's student vector (projects get matching
+target values), see `features`:
+
+- acceptance rate: accepted or completed assignments / all assignments
+- submission rate: accepted assignments with at least one submission /
+  accepted assignments
+- mean criteria score of the student's evaluations
+- recency-weighted evaluation score: each evaluation counts
+  `0.5 ** (age / half_life)`, with age measured from the student's latest one
+
+Each rate is smoothed towards a prior with `PRIOR_WEIGHT` pseudo-events (0.5
+for the rates, the student's profile skill for the scores), so a student
+without history keeps roughly their profile-based position.
+"""
+
+import copy
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.structures import CowMap
+
+
+HISTORY_SECTIONS = ("assignments", "submissions", "evaluations")
+HISTORY_DIM = 4
+PRIOR_WEIGHT = 2.0
+ACCEPTED_STATUSES = ("accepted", "completed")
+
+
+@dataclass(frozen=True)
+class StudentHistory:
+    assignments: int = 0
+    accepted: int = 0
+    # Accepted assignments with at least one submission.
+    submitted: int = 0
+    evaluations: int = 0
+    # Sum over evaluations of the mean of their criteria scores.
+    criteria_sum: float = 0.0
+    score_sum: float = 0.0
+    # Recency-weighted score sum and weight, both as of `decayed_at`.
+    decayed_sum: float = 0.0
+    decayed_weight: float = 0.0
+    decayed_at: float = 0.0
+
+
+EMPTY = StudentHistory()
+
+
+@dataclass(frozen=True)
+class _Assignment:
+    user_id: Any = None
+    accepted: bool = False
+    submitted: bool = False
+
+
+@dataclass(frozen=True)
+class _Evaluation:
+    user_id: Any
+    score: float
+    criteria: float
+    at: float
+
+
+def _timestamp(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _criteria_mean(evaluation: Dict[str, Any], score: float) -> float:
+    scores = [_number(v) for v in (evaluation.get("criteria_scores") or {}).values()]
+    return sum(scores) / len(scores) if scores else score
+
+
+def _clip(x: float) -> float:
+    return max(0.0, min(1.0, x))
+
+
+class HistoryStore:
+    """Aggregates per student id, updated event by event.
+
+    `record` returns a new store and leaves this one untouched (the maps are
+    CowMaps), so a store can hang off a published RecommenderIndex. Bulk
+    loading (`from_entities`, `add`) mutates plain dicts and is finished with
+    `freeze`.
+    """
+
+    def __init__(self, half_life_days: float = 90.0):
+        self.half_life = half_life_days * 86400.0
+        self.students: Any = {}
+        self.assignments: Any = {}
+        self.evaluations: Any = {}
+        # Latest event time seen; used for evaluations without `evaluated_at`.
+        self.clock = 0.0
+
+    @classmethod
+    def from_entities(cls, entities: Dict[str, Any], half_life_days: float = 90.0) -> "HistoryStore":
+        store = cls(half_life_days)
+        for section in HISTORY_SECTIONS:
+            for record in entities.get(section, []) or []:
+                store.add(section, record)
+        return store.freeze()
+
+    def freeze(self) -> "HistoryStore":
+        for name in ("students", "assignments", "evaluations"):
+            value = getattr(self, name)
+            if isinstance(value, dict):
+                setattr(self, name, CowMap(value))
+        return self
+
+    def _put(self, name: str, key: Any, value: Any) -> None:
+        target = getattr(self, name)
+        if isinstance(target, dict):
+            target[key] = value
+        else:
+            setattr(self, name, target.set(key, value))
+
+    def get(self, student_id: Any) -> StudentHistory:
+        return self.students.get(student_id, EMPTY)
+
+    def __len__(self) -> int:
+        return len(self.students)
+
+    def record(self, section: str, event: Dict[str, Any]) -> Tuple["HistoryStore", List[Any]]:
+        """New store with `event` applied, and the ids of the students it changed.
+
+        An assignment or evaluation that moves to another student changes the
+        previous owner too.
+        """
+        previous = self._owner(section, event)
+        new = copy.copy(self)
+        changed = new.add(section, event)
+        return new, [sid for sid in dict.fromkeys((previous, changed)) if sid is not None]
+
+    def _owner(self, section: str, event: Dict[str, Any]) -> Any:
+        """Student the already recorded assignment or evaluation that `event` replaces belongs to."""
+        if section == "assignments":
+            prev = self.assignments.get(event.get("id"))
+        elif section == "evaluations" and event.get("submission_id") is not None:
+            prev = self.evaluations.get(event.get("submission_id"))
+        else:
+            prev = None
+        return prev.user_id if prev is not None else None
+
+    def add(self, section: str, event: Dict[str, Any]) -> Any:
+        if section == "assignments":
+            return self._assignment(event)
+        if section == "submissions":
+            return self._submission(event)
+        if section == "evaluations":
+            return self._evaluation(event)
+        raise ValueError(f"Unknown history section {section!r}")
+
+    def _assignment(self, a: Dict[str, Any]) -> Any:
+        # Re-sending an assignment (e.g. invited -> accepted) replaces its previous state.
+        aid = a.get("id")
+        prev = self.assignments.get(aid)
+        user_id = a.get("user_id")
+        accepted = str(a.get("status")) in ACCEPTED_STATUSES
+        submitted = prev is not None and prev.submitted
+        if prev is not None and prev.user_id is not None:
+            h = self.get(prev.user_id)
+            self._put("students", prev.user_id, replace(
+                h,
+                assignments=h.assignments - 1,
+                accepted=h.accepted - prev.accepted,
+                submitted=h.submitted - (prev.accepted and prev.submitted),
+            ))
+        h = self.get(user_id)
+        self._put("students", user_id, replace(
+            h,
+            assignments=h.assignments + 1,
+            accepted=h.accepted + accepted,
+            submitted=h.submitted + (accepted and submitted),
+        ))
+        self._put("assignments", aid, _Assignment(user_id, accepted, submitted))
+        return user_id
+
+    def _submission(self, s: Dict[str, Any]) -> Any:
+        aid = s.get("assignment_id")
+        prev = self.assignments.get(aid)
+        if prev is None:
+            # Submission ahead of its assignment: remember it for when the assignment arrives.
+            self._put("assignments", aid, _Assignment(submitted=True))
+            return None
+        if prev.submitted:
+            return None
+        self._put("assignments", aid, replace(prev, submitted=True))
+        if prev.accepted and prev.user_id is not None:
+            h = self.get(prev.user_id)
+            self._put("students", prev.user_id, replace(h, submitted=h.submitted + 1))
+            return prev.user_id
+        return None
+
+    def _evaluation(self, e: Dict[str, Any]) -> Any:
+        user_id = e.get("user_id")
+        score = _number(e.get("score"))
+        at = _timestamp(e.get("evaluated_at"))
+        at = self.clock if at is None else at
+        self.clock = max(self.clock, at)
+        evaluation = _Evaluation(user_id, score, _criteria_mean(e, score), at)
+
+        key = e.get("submission_id")
+        prev = self.evaluations.get(key) if key is not None else None
+        if prev is not None:
+            # A re-scored submission replaces its earlier evaluation.
+            self._put("students", prev.user_id, self._without(self.get(prev.user_id), prev))
+        self._put("students", user_id, self._with(self.get(user_id), evaluation))
+        if key is not None:
+            self._put("evaluations", key, evaluation)
+        return user_id
+
+    def _decay(self, dt: float) -> float:
+        return 0.5 ** (dt / self.half_life) if self.half_life > 0 else 1.0
+
+    def _with(self, h: StudentHistory, ev: _Evaluation) -> StudentHistory:
+        if h.decayed_weight == 0.0 or ev.at >= h.decayed_at:
+            factor = self._decay(ev.at - h.decayed_at) if h.decayed_weight else 0.0
+            decayed_sum, decayed_weight, at = h.decayed_sum * factor + ev.score, h.decayed_weight * factor + 1.0, ev.at
+        else:
+            w = self._decay(h.decayed_at - ev.at)
+            decayed_sum, decayed_weight, at = h.decayed_sum + w * ev.score, h.decayed_weight + w, h.decayed_at
+        return replace(
+            h,
+            evaluations=h.evaluations + 1,
+            criteria_sum=h.criteria_sum + ev.criteria,
+            score_sum=h.score_sum + ev.score,
+            decayed_sum=decayed_sum,
+            decayed_weight=decayed_weight,
+            decayed_at=at,
+        )
+
+    def _without(self, h: StudentHistory, ev: _Evaluation) -> StudentHistory:
+        w = self._decay(max(0.0, h.decayed_at - ev.at))
+        return replace(
+            h,
+            evaluations=h.evaluations - 1,
+            criteria_sum=h.criteria_sum - ev.criteria,
+            score_sum=h.score_sum - ev.score,
+            decayed_sum=h.decayed_sum - w * ev.score,
+            decayed_weight=max(0.0, h.decayed_weight - w),
+        )
+
+    def features(self, student_id: Any, skill: float) -> List[float]:
+        """History features of a student whose profile skill (0-1) is `skill`."""
+        return history_features(self.get(student_id), skill)
+
+    def matrix(self, student_ids: Sequence[Any], skills: np.ndarray) -> np.ndarray:
+        """`features` for many students, as a float64 (n, HISTORY_DIM) matrix."""
+        out = np.empty((len(student_ids), HISTORY_DIM), dtype=np.float64)
+        for row in range(len(student_ids)):
+            out[row] = history_features(self.get(student_ids[row]), float(skills[row]))
+        return out
+
+
+def history_features(h: StudentHistory, skill: float) -> List[float]:
+    k = PRIOR_WEIGHT
+    return [
+        _clip((h.accepted + 0.5 * k) / (h.assignments + k)),
+        _clip((h.submitted + 0.5 * k) / (h.accepted + k)),
+        _clip((h.criteria_sum / 100.0 + skill * k) / (h.evaluations + k)),
+        _clip((h.decayed_sum / 100.0 + skill * k) / (h.decayed_weight + k)),
+    ]
+
+
+def project_history_targets(expected_skill: float) -> List[float]:
+    """What a project asks of the history features: reliable students scoring at its level."""
+    return [1.0, 1.0, expected_skill, expected_skill]
+
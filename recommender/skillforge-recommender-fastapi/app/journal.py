@@ -0,0 +1,107 @@
+"""Append-only log of incremental changes shared by the workers of one host.
+
+When several worker processes serve the same snapshot file, a write that
+lands on one of them must reach all of them. Writers append one JSON line per
+change to `<snapshot>.journal` under an exclusive `flock` on a sibling
+`.lock` file (the journal itself is replaced on publish); every worker
+replays the lines past its own offset, in file order, so all workers apply
+the same changes in the same order on top of the same snapshot.
+
+The first line names the snapshot segment the changes apply to. Publishing
+a new snapshot replaces the journal with an empty one for the new segment
+(`reset`; a writer that finds a journal for another segment does the same).
+Like in-memory changes of a single process, journaled changes are dropped
+when a new export is published and must be part of it.
+"""
+
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+def journal_path(snapshot_path: str) -> str:
+    return f"{snapshot_path}.journal"
+
+
+def segment_id(inode: int, mtime_ns: int) -> str:
+    """Identity of a published dataset file; replacing the file changes it."""
+    return f"{inode}:{mtime_ns}"
+
+
+def reset(path: str, segment: str) -> None:
+    """Atomically replace the journal at `path` with an empty one for `segment`."""
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"segment": segment}) + "\n")
+    os.replace(tmp_path, path)
+
+
+class ChangeJournal:
+    def __init__(self, path: str):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+
+    def _segment(self, f) -> Optional[str]:
+        f.seek(0)
+        first = f.readline()
+        if not first.endswith(b"\n"):
+            return None
+        try:
+            return json.loads(first).get("segment")
+        except ValueError:
+            return None
+
+    def read(self, segment: str, offset: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Changes for `segment` after byte `offset` (0 = from the start) and the new offset.
+
+        A journal that belongs to another segment yields nothing: the caller's
+        snapshot is about to be replaced.
+        """
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return [], offset
+        with f:
+            if self._segment(f) != segment:
+                return [], offset
+            if offset == 0:
+                offset = f.tell()
+            f.seek(offset)
+            changes = []
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # A writer is mid-append; pick the line up next time.
+                    break
+                changes.append(json.loads(line))
+                offset += len(line)
+            return changes, offset
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Exclusive writer lock; hold it from catching up until the append."""
+        with open(self.lock_path, "ab") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def append(self, segment: str, change: Dict[str, Any]) -> int:
+        """Append `change` to a journal for `segment`, replacing a journal for any other segment.
+
+        Must be called while holding `locked()`, after catching up with
+        `read`. Returns the offset just past the appended line.
+        """
+        try:
+            with open(self.path, "rb") as f:
+                current = self._segment(f)
+        except FileNotFoundError:
+            current = None
+        if current != segment:
+            reset(self.path, segment)
+        with open(self.path, "ab") as f:
+            f.write(json.dumps(change).encode("utf-8") + b"\n")
+            f.flush()
+            return f.tell()
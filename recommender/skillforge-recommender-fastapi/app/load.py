@@ -0,0 +1,93 @@
+"""Active assignment counts per student, for the candidate load cap.
+
+Only assignments in an `ACTIVE_ASSIGNMENT_STATUSES` status are kept (id ->
+student id), so re-sending an assignment with a new status (accepted ->
+completed) moves the count in O(1). Counts are kept sparse: students without
+active assignments are not stored, and `over` only walks the loaded ones.
+"""
+
+import copy
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+from app.structures import CowMap
+
+
+ACTIVE_ASSIGNMENT_STATUSES = ("accepted",)
+
+
+class AssignmentLoad:
+    """Like HistoryStore: `record` returns a new instance, bulk `add` is finished with `freeze`."""
+
+    def __init__(self):
+        self.active: Any = {}
+        self.counts: Any = {}
+
+    @classmethod
+    def from_entities(cls, entities: Dict[str, Any]) -> "AssignmentLoad":
+        load = cls()
+        for record in entities.get("assignments", []) or []:
+            load.add(record)
+        return load.freeze()
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple[Any, Any]]) -> "AssignmentLoad":
+        """Load of (assignment id, student id) pairs of active assignments."""
+        load = cls()
+        for aid, user_id in pairs:
+            load.add({"id": aid, "user_id": user_id, "status": ACTIVE_ASSIGNMENT_STATUSES[0]})
+        return load.freeze()
+
+    def freeze(self) -> "AssignmentLoad":
+        for name in ("active", "counts"):
+            value = getattr(self, name)
+            if isinstance(value, dict):
+                setattr(self, name, CowMap(value))
+        return self
+
+    def _put(self, name: str, key: Any, value: Any) -> None:
+        target = getattr(self, name)
+        if isinstance(target, dict):
+            target[key] = value
+        else:
+            setattr(self, name, target.set(key, value))
+
+    def _delete(self, name: str, key: Any) -> None:
+        target = getattr(self, name)
+        if isinstance(target, dict):
+            del target[key]
+        else:
+            setattr(self, name, target.delete(key))
+
+    def _bump(self, user_id: Any, delta: int) -> None:
+        count = self.counts.get(user_id, 0) + delta
+        if count > 0:
+            self._put("counts", user_id, count)
+        elif user_id in self.counts:
+            self._delete("counts", user_id)
+
+    def record(self, event: Dict[str, Any]) -> "AssignmentLoad":
+        new = copy.copy(self)
+        new.add(event)
+        return new
+
+    def add(self, assignment: Dict[str, Any]) -> Any:
+        aid = assignment.get("id")
+        user_id = assignment.get("user_id")
+        if aid is not None and aid in self.active:
+            self._bump(self.active.get(aid), -1)
+            self._delete("active", aid)
+        if str(assignment.get("status")) in ACTIVE_ASSIGNMENT_STATUSES:
+            self._bump(user_id, 1)
+            if aid is not None:
+                self._put("active", aid, user_id)
+        return user_id
+
+    def count(self, user_id: Any) -> int:
+        return self.counts.get(user_id, 0)
+
+    def over(self, cap: int) -> Iterator[Any]:
+        """Ids of the students holding more than `cap` active assignments."""
+        return (user_id for user_id, count in self.counts.items() if count > cap)
+
+    def __len__(self) -> int:
+        return len(self.active)
@@ -1,10 +1,20 @@
+import functools
 import os
-import json
-from fastapi import FastAPI, Query, HTTPException
-from pydantic import BaseModel
+import logging
+import time
+from fastapi import Depends, FastAPI, Header, Query, HTTPException, Response
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Any, Dict
 
-from app.recommender_cosine import recommend_students
+from app.cache import ResultCache
+from app.dataset import DatasetSnapshot, DatasetStore
+from app.executor import BoundedExecutor, Overloaded
+from app.journal import ChangeJournal, journal_path
+from app.materialized import Materializer
+from app.metrics import CONTENT_TYPE, Registry, RequestMetrics, record_stages
+
+
+MAX_TOP_N = 50
 
 
 class Candidate(BaseModel):
@@ -20,9 +30,116 @@ class CandidatesResponse(BaseModel):
     project_id: int
     top_n: int
     semi_active_min_similarity: float
+    ann_probes: int = 0
+    max_active_assignments: Optional[int] = None
+    diversity: float = 0.0
     candidates: List[Candidate]
 
 
+class ProjectMatch(BaseModel):
+    project_id: int
+    title: Optional[str] = None
+    domain: Optional[str] = None
+    required_level: Optional[str] = None
+    adjusted_required_level: Optional[str] = None
+    complexity: Optional[str] = None
+    similarity: float
+
+
+class StudentProjectsResponse(BaseModel):
+    student_id: int
+    top_n: int
+    semi_active_min_similarity: float
+    projects: List[ProjectMatch]
+
+
+class BatchQuery(BaseModel):
+    project_id: int
+    top_n: int = Field(7, ge=1, le=MAX_TOP_N)
+    semi_active_min_similarity: float = Field(0.80, ge=0.0, le=1.0)
+
+
+class BatchRequest(BaseModel):
+    projects: List[BatchQuery] = Field(..., min_length=1)
+
+
+class BatchResult(BaseModel):
+    project_id: int
+    top_n: int
+    semi_active_min_similarity: float
+    candidates: Optional[List[Candidate]] = None
+    error: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    results: List[BatchResult]
+
+
+class StudentUpsert(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    name: Optional[str] = None
+    email: Optional[str] = None
+    domain: str
+    level: str
+    activity_profile: str = "low-activity"
+    profile_settings: Dict[str, Any] = Field(default_factory=dict)
+
+
+class ProjectUpsert(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    title: Optional[str] = None
+    domain: str
+    required_level: str = "beginner"
+    complexity: str = "low"
+    status: str = "open"
+
+
+class ChangeResponse(BaseModel):
+    id: int
+    deleted: bool = False
+    version: int
+
+
+class AssignmentEvent(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    id: int
+    project_id: Optional[int] = None
+    user_id: int
+    status: str
+    match_score: Optional[float] = None
+
+
+class SubmissionEvent(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    id: Optional[int] = None
+    assignment_id: int
+    milestone_id: Optional[int] = None
+    user_id: Optional[int] = None
+    status: Optional[str] = None
+
+
+class EvaluationEvent(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    submission_id: Optional[int] = None
+    user_id: int
+    score: float
+    criteria_scores: Dict[str, float] = Field(default_factory=dict)
+    evaluated_at: Optional[str] = None
+
+
+class HistoryEventResponse(BaseModel):
+    student_id: Optional[int] = None
+    version: int
+
+
+BATCH_MAX_PROJECTS = int(os.getenv("BATCH_MAX_PROJECTS", "500"))
+
+
 app = FastAPI(
     title="SkillForge Recommender API",
     version="1.0.0",
@@ -30,42 +147,420 @@ app = FastAPI(
 )
 
 
-def load_data() -> Dict[str, Any]:
-    path = os.getenv("DATA_PATH", "./data/ai_analysis.json")
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"DATA_PATH not found: {path}")
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+logger = logging.getLogger("recommender")
+
+# Process-level dataset: loaded once, swapped when the source file's mtime/inode changes.
+# A compiled SNAPSHOT_PATH is mmap'ed when present; DATA_PATH (JSON) is the fallback.
+DATA_PATH = os.getenv("DATA_PATH", "./data/ai_analysis.json")
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH")
+# History features extend the similarity vectors with assignment/evaluation aggregates.
+# Snapshots do not carry history, so SNAPSHOT_PATH is ignored while they are on.
+HISTORY_FEATURES = os.getenv("HISTORY_FEATURES", "").lower() in ("1", "true", "yes")
+if HISTORY_FEATURES and SNAPSHOT_PATH:
+    logger.warning("HISTORY_FEATURES is on; ignoring SNAPSHOT_PATH and loading %s", DATA_PATH)
+    SNAPSHOT_PATH = None
+# With several worker processes (gunicorn.conf.py), incremental changes go through a
+# journal next to the served file so that every worker applies them.
+SHARED_JOURNAL = os.getenv("SHARED_JOURNAL", "").lower() in ("1", "true", "yes")
+store = DatasetStore(
+    path=SNAPSHOT_PATH or DATA_PATH,
+    fallback_path=DATA_PATH if SNAPSHOT_PATH else None,
+    check_interval=float(os.getenv("DATA_RELOAD_CHECK_SECONDS", "1.0")),
+    stream_min_bytes=int(os.getenv("STREAM_INGEST_MIN_BYTES", str(64 * 1024 * 1024))),
+    ann_min_rows=int(os.getenv("ANN_MIN_ROWS", "0")),
+    history_half_life_days=float(os.getenv("HISTORY_HALF_LIFE_DAYS", "90")) if HISTORY_FEATURES else None,
+    journal=ChangeJournal(journal_path(SNAPSHOT_PATH or DATA_PATH)) if SHARED_JOURNAL else None,
+)
+# Probes used when a request does not pass ann_probes; 0 keeps the exact scan.
+ANN_DEFAULT_PROBES = int(os.getenv("ANN_DEFAULT_PROBES", "0"))
+# Reranking defaults for requests that do not pass them: no load cap, no diversity.
+_max_active = os.getenv("MAX_ACTIVE_ASSIGNMENTS_DEFAULT")
+MAX_ACTIVE_ASSIGNMENTS_DEFAULT = int(_max_active) if _max_active else None
+DIVERSITY_DEFAULT = float(os.getenv("DIVERSITY_DEFAULT", "0"))
+
+# Top MAX_TOP_N of every open project at the default parameters, rebuilt in the background
+# for every snapshot version and served without scoring (see app.materialized).
+MATERIALIZE_CANDIDATES = os.getenv("MATERIALIZE_CANDIDATES", "1").lower() in ("1", "true", "yes")
+materializer = (
+    Materializer(
+        top_n=MAX_TOP_N,
+        semi_active_min_similarity=0.80,
+        max_active_assignments=MAX_ACTIVE_ASSIGNMENTS_DEFAULT,
+        diversity=DIVERSITY_DEFAULT,
+    )
+    if MATERIALIZE_CANDIDATES
+    else None
+)
+
+# Candidate lists keyed by (project_id, semi_active_min_similarity, ann_probes,
+# max_active_assignments, diversity) within one snapshot version. Entries hold the top
+# MAX_TOP_N; smaller top_n are slices (diversity reranking keeps that prefix property).
+candidates_cache = ResultCache(
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "1024")),
+    ttl_seconds=float(os.getenv("CACHE_TTL_SECONDS", "300")),
+)
+
+# Endpoints are async: lookups run on the event loop, dataset reloads and heavy scoring
+# on this bounded executor. When it is full, requests get 503 instead of queueing.
+executor = BoundedExecutor(
+    workers=int(os.getenv("EXECUTOR_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    max_queue=int(os.getenv("EXECUTOR_MAX_QUEUE", "64")),
+    queue_timeout=float(os.getenv("EXECUTOR_QUEUE_TIMEOUT_SECONDS", "2.0")) or None,
+)
+# Candidate queries scoring at most this many students stay on the event loop.
+INLINE_MAX_ROWS = int(os.getenv("INLINE_MAX_ROWS", "20000"))
+_refresh = None
+_materializing = None
+
+# Prometheus metrics on /metrics (per process, see app.metrics).
+metrics = Registry()
+http_requests = metrics.counter(
+    "recommender_http_requests", "HTTP requests by route template, method and status code.", ("route", "method", "status")
+)
+http_latency = metrics.histogram(
+    "recommender_http_request_duration_seconds", "HTTP request latency by route template.", ("route", "method")
+)
+candidate_stages = metrics.histogram(
+    "recommender_candidates_stage_seconds",
+    "Time per stage of /projects/{project_id}/candidates: load, eligibility, vectorize, score, rank.",
+    ("stage",),
+)
+
+_DATASET_GAUGES = (
+    ("students", "Students in the current dataset snapshot."),
+    ("projects", "Projects in the current dataset snapshot."),
+    ("buckets", "Non-empty (domain, level, activity) buckets."),
+    ("largest_bucket", "Students in the largest bucket."),
+    ("ann_partitions", "Partitions with an IVF index."),
+    ("version", "Version of the current dataset snapshot."),
+    ("changes_since_load", "Incremental changes applied since the last load."),
+    ("load_seconds", "Seconds the last dataset load took."),
+)
+_CACHE_COUNTERS = ("hits", "misses", "evictions", "expirations", "invalidations")
+
+
+@metrics.collector
+def dataset_metrics():
+    snap = store.snapshot
+    if snap is None:
+        return []
+    info = snap.info()
+    return [(f"recommender_dataset_{k}", "gauge", doc, [("", {}, info[k])]) for k, doc in _DATASET_GAUGES]
+
+
+@metrics.collector
+def cache_metrics():
+    stats = candidates_cache.stats()
+    families = [
+        (f"recommender_cache_{k}", "counter", f"Candidate cache {k}.", [("_total", {}, stats[k])])
+        for k in _CACHE_COUNTERS
+    ]
+    families.append(("recommender_cache_entries", "gauge", "Entries in the candidate cache.", [("", {}, stats["size"])]))
+    return families
+
+
+@metrics.collector
+def materializer_metrics():
+    if materializer is None:
+        return []
+    stats = materializer.stats()
+    return [
+        ("recommender_materialized_projects", "gauge", "Open projects with precomputed candidates.",
+         [("", {}, stats["projects"])]),
+        ("recommender_materialized_hits", "counter", "Candidate requests served from the precomputed table.",
+         [("_total", {}, stats["hits"])]),
+        ("recommender_materialized_builds", "counter", "Builds of the precomputed table.",
+         [("_total", {}, stats["builds"])]),
+        ("recommender_materialized_groups_scored", "counter", "(domain, level) groups rescored by builds.",
+         [("_total", {}, stats["groups_scored"])]),
+        ("recommender_materialized_build_seconds", "gauge", "Seconds the last build took.",
+         [("", {}, stats["last_build_seconds"])]),
+    ]
+
+
+@metrics.collector
+def executor_metrics():
+    stats = executor.stats()
+    return [
+        ("recommender_executor_running", "gauge", "Executor jobs running.", [("", {}, stats["running"])]),
+        ("recommender_executor_queued", "gauge", "Executor jobs waiting.", [("", {}, stats["queued"])]),
+        ("recommender_executor_completed", "counter", "Executor jobs finished.", [("_total", {}, stats["completed"])]),
+        ("recommender_executor_rejected", "counter", "Jobs rejected because the executor was full.",
+         [("_total", {}, stats["rejected"])]),
+        ("recommender_executor_timed_out", "counter", "Jobs dropped after waiting longer than the queue timeout.",
+         [("_total", {}, stats["timed_out"])]),
+    ]
+
+
+# Requests slower than TRACE_SLOW_MS are logged with their request id and stage timings.
+_slow_ms = os.getenv("TRACE_SLOW_MS")
+app.add_middleware(
+    RequestMetrics,
+    requests=http_requests,
+    latency=http_latency,
+    slow_seconds=float(_slow_ms) / 1000.0 if _slow_ms else None,
+)
+
+
+@app.on_event("startup")
+def startup_event():
+    try:
+        snap = store.reload()
+    except Exception as e:
+        # Keep the process up; requests report the error until the file appears.
+        logger.error("Initial dataset load failed: %s", e)
+        return
+    materialize(snap)
+
+
+def materialize(snap: DatasetSnapshot) -> None:
+    """Start building the candidate table for `snap` in the background unless one is running."""
+    global _materializing
+    if materializer is None or not materializer.due(snap.version):
+        return
+    if _materializing is not None and not _materializing.done():
+        return
+    try:
+        _materializing = executor.submit(materializer.refresh, snap.version, snap.index)
+    except Overloaded:
+        pass  # retried by the next request
+
+def overloaded(e: Overloaded) -> HTTPException:
+    return HTTPException(status_code=503, detail=f"Recommender is overloaded: {e}", headers={"Retry-After": "1"})
+
+
+async def current_snapshot() -> DatasetSnapshot:
+    """The current snapshot without blocking the event loop.
+
+    Only the very first load is awaited. Afterwards the file check (and a
+    reload or journal catch-up) runs in the background on the executor while
+    requests keep using the snapshot they find.
+    """
+    global _refresh
+    snap = store.snapshot
+    if snap is None:
+        snap = await executor.run(store.current)
+    elif store.refresh_due() and (_refresh is None or _refresh.done()):
+        try:
+            _refresh = executor.submit(store.current)
+        except Overloaded:
+            pass  # retried by the next request
+    materialize(snap)
+    return snap
 
 
 @app.get("/health")
-def health():
-    return {"status": "ok"}
+async def health():
+    try:
+        snap = await current_snapshot()
+    except (OSError, ValueError, Overloaded):
+        snap = store.snapshot
+    return {
+        "status": "ok",
+        "dataset": snap.info() if snap is not None else None,
+        "executor": executor.stats(),
+        "materialized": materializer.stats() if materializer is not None else None,
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return candidates_cache.stats()
 
 
 @app.get("/projects/{project_id}/candidates", response_model=CandidatesResponse)
-def project_candidates(
+async def project_candidates(
     project_id: int,
-    top_n: int = Query(7, ge=1, le=50),
+    top_n: int = Query(7, ge=1, le=MAX_TOP_N),
     semi_active_min_similarity: float = Query(0.80, ge=0.0, le=1.0),
+    ann_probes: Optional[int] = Query(None, ge=0, le=1024),
+    max_active_assignments: Optional[int] = Query(None, ge=0),
+    diversity: Optional[float] = Query(None, ge=0.0, le=1.0),
 ):
+    if ann_probes is None:
+        ann_probes = ANN_DEFAULT_PROBES
+    if max_active_assignments is None:
+        max_active_assignments = MAX_ACTIVE_ASSIGNMENTS_DEFAULT
+    if diversity is None:
+        diversity = DIVERSITY_DEFAULT
     try:
-        data = load_data()
-        candidates = recommend_students(
-            data=data,
-            project_id=project_id,
+        started = time.perf_counter()
+        snap = await current_snapshot()
+        stages = {"load": time.perf_counter() - started}
+        ranked = None
+        if materializer is not None and materializer.serves(
+            semi_active_min_similarity, ann_probes, max_active_assignments, diversity
+        ):
+            ranked = materializer.lookup(snap.version, project_id, top_n)
+        key = (project_id, semi_active_min_similarity, ann_probes, max_active_assignments, diversity)
+        if ranked is None:
+            ranked = candidates_cache.get(snap.version, key)
+        if ranked is None:
+            query = functools.partial(
+                snap.index.recommend,
+                project_id=project_id,
+                top_n=MAX_TOP_N,
+                semi_active_min_similarity=semi_active_min_similarity,
+                ann_probes=ann_probes,
+                max_active_assignments=max_active_assignments,
+                diversity=diversity,
+                timings=stages,
+            )
+            # Small partitions are scored right on the event loop, large ones on the executor.
+            if snap.index.pool_size(project_id) <= INLINE_MAX_ROWS:
+                ranked = query()
+            else:
+                ranked = await executor.run(query)
+            candidates_cache.put(snap.version, key, ranked)
+        record_stages(candidate_stages, stages)
+        candidates = ranked[:top_n]
+        return {
+            "project_id": project_id,
+            "top_n": top_n,
+            "semi_active_min_similarity": semi_active_min_similarity,
+            "ann_probes": ann_probes,
+            "max_active_assignments": max_active_assignments,
+            "diversity": diversity,
+            "candidates": candidates,
+        }
+    except Overloaded as e:
+        raise overloaded(e)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
+
+
+@app.get("/students/{student_id}/projects", response_model=StudentProjectsResponse)
+async def student_projects(
+    student_id: int,
+    top_n: int = Query(7, ge=1, le=MAX_TOP_N),
+    semi_active_min_similarity: float = Query(0.80, ge=0.0, le=1.0),
+):
+    try:
+        index = (await current_snapshot()).index
+        projects = index.recommend_projects(
+            student_id=student_id,
             top_n=top_n,
             semi_active_min_similarity=semi_active_min_similarity,
         )
         return {
-            "project_id": project_id,
+            "student_id": student_id,
             "top_n": top_n,
             "semi_active_min_similarity": semi_active_min_similarity,
-            "candidates": candidates,
+            "projects": projects,
         }
+    except Overloaded as e:
+        raise overloaded(e)
     except FileNotFoundError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
+
+
+@app.post("/projects/candidates:batch", response_model=BatchResponse)
+async def project_candidates_batch(body: BatchRequest):
+    """Candidates for many projects in one call.
+
+    Unknown project ids are reported per entry in `error` and do not fail the
+    rest of the batch.
+    """
+    if len(body.projects) > BATCH_MAX_PROJECTS:
+        raise HTTPException(status_code=422, detail=f"At most {BATCH_MAX_PROJECTS} projects per batch")
+    try:
+        index = (await current_snapshot()).index
+        queries = [(q.project_id, q.top_n, q.semi_active_min_similarity) for q in body.projects]
+        answers = await executor.run(index.recommend_many, queries)
+        return {
+            "results": [
+                {
+                    "project_id": q.project_id,
+                    "top_n": q.top_n,
+                    "semi_active_min_similarity": q.semi_active_min_similarity,
+                    **answer,
+                }
+                for q, answer in zip(body.projects, answers)
+            ]
+        }
+    except Overloaded as e:
+        raise overloaded(e)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """Write endpoints need X-Admin-Token == RECOMMENDER_ADMIN_TOKEN; unset means writes are off."""
+    expected = os.getenv("RECOMMENDER_ADMIN_TOKEN")
+    if not expected or x_admin_token != expected:
+        raise HTTPException(status_code=403, detail="forbidden")
+
+
+def apply_change(op: str, *args: Any) -> int:
+    try:
+        return store.apply(op, *args).version
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.put("/students/{student_id}", response_model=ChangeResponse, dependencies=[Depends(require_admin_token)])
+def upsert_student(student_id: int, body: StudentUpsert):
+    record = {**body.model_dump(), "id": student_id}
+    version = apply_change("upsert_student", record)
+    return {"id": student_id, "version": version}
+
+
+@app.delete("/students/{student_id}", response_model=ChangeResponse, dependencies=[Depends(require_admin_token)])
+def delete_student(student_id: int):
+    version = apply_change("delete_student", student_id)
+    return {"id": student_id, "deleted": True, "version": version}
+
+
+@app.put("/projects/{project_id}", response_model=ChangeResponse, dependencies=[Depends(require_admin_token)])
+def upsert_project(project_id: int, body: ProjectUpsert):
+    record = {**body.model_dump(), "id": project_id}
+    version = apply_change("upsert_project", record)
+    return {"id": project_id, "version": version}
+
+
+@app.delete("/projects/{project_id}", response_model=ChangeResponse, dependencies=[Depends(require_admin_token)])
+def delete_project(project_id: int):
+    version = apply_change("delete_project", project_id)
+    return {"id": project_id, "deleted": True, "version": version}
+
+
+def record_history(section: str, event: Dict[str, Any]) -> Dict[str, Any]:
+    # Assignments always feed the active assignment counts (load cap).
+    if not HISTORY_FEATURES and section != "assignments":
+        raise HTTPException(status_code=409, detail="History features are disabled (HISTORY_FEATURES)")
+    version = apply_change("record_history", section, event)
+    return {"student_id": event.get("user_id"), "version": version}
+
+
+@app.post("/history/assignments", response_model=HistoryEventResponse, dependencies=[Depends(require_admin_token)])
+def record_assignment(body: AssignmentEvent):
+    """Create or update an assignment (e.g. invited -> accepted)."""
+    return record_history("assignments", body.model_dump())
+
+
+@app.post("/history/submissions", response_model=HistoryEventResponse, dependencies=[Depends(require_admin_token)])
+def record_submission(body: SubmissionEvent):
+    return record_history("submissions", body.model_dump())
+
+
+@app.post("/history/evaluations", response_model=HistoryEventResponse, dependencies=[Depends(require_admin_token)])
+def record_evaluation(body: EvaluationEvent):
+    """Add an evaluation, or replace the earlier one for the same submission."""
+    return record_history("evaluations", body.model_dump())
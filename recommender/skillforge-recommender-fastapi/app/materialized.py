@@ -0,0 +1,165 @@
+"""Precomputed candidate lists for every open project, rebuilt per snapshot version.
+
+Most candidate traffic asks for the same open projects with the default
+parameters, and those answers only change with the dataset. `Materializer`
+computes the top `top_n` of every open project for one snapshot version in
+the background and `lookup` serves them in O(1); requests with other
+parameters, and requests arriving before the table caught up with the
+current version, are scored live.
+
+Rebuilds are incremental. Incremental changes leave the untouched
+(domain, level) groups of an index as the very same arrays (see
+RecommenderIndex), so a group whose eligible students and open projects are
+the same objects as in the previous table keeps its lists; only the groups a
+change touched are rescored, each with one matrix product. A reload builds
+everything.
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.recommender_index import RecommenderIndex
+
+
+# Similarity matrices are scored in project chunks of about this many cells.
+_SCORE_CELLS = 1 << 22
+
+
+# Per (domain, level): the eligible rows and open project rows the lists were computed
+# from, and project_id -> (ranked student rows, rounded similarities).
+_Group = Tuple[np.ndarray, np.ndarray, Dict[int, Tuple[np.ndarray, np.ndarray]]]
+
+
+class CandidateTable:
+    __slots__ = ("version", "index", "groups", "projects")
+
+    def __init__(self, version: int, index: RecommenderIndex, groups: Dict[Tuple[str, str], _Group]):
+        self.version = version
+        self.index = index
+        self.groups = groups
+        self.projects: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        for _, _, lists in groups.values():
+            self.projects.update(lists)
+
+
+class Materializer:
+    def __init__(
+        self,
+        top_n: int = 50,
+        semi_active_min_similarity: float = 0.80,
+        max_active_assignments: Optional[int] = None,
+        diversity: float = 0.0,
+    ):
+        self.top_n = top_n
+        self.semi_active_min_similarity = semi_active_min_similarity
+        self.max_active_assignments = max_active_assignments
+        self.diversity = diversity
+        self.table: Optional[CandidateTable] = None
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.groups_scored = 0
+        self.groups_reused = 0
+        self.last_build_seconds = 0.0
+        self.hits = 0
+
+    def serves(
+        self,
+        semi_active_min_similarity: float,
+        ann_probes: int,
+        max_active_assignments: Optional[int],
+        diversity: float,
+    ) -> bool:
+        """Whether a request with these parameters can be answered from the table."""
+        return (
+            semi_active_min_similarity == self.semi_active_min_similarity
+            and ann_probes == 0
+            and max_active_assignments == self.max_active_assignments
+            and diversity == self.diversity
+        )
+
+    def due(self, version: int) -> bool:
+        table = self.table
+        return table is None or table.version != version
+
+    def lookup(self, version: int, project_id: int, top_n: int) -> Optional[List[Dict[str, Any]]]:
+        """Top `top_n` candidates of an open project at snapshot `version`, or None when not materialized."""
+        table = self.table
+        if table is None or table.version != version or top_n > self.top_n:
+            return None
+        entry = table.projects.get(project_id)
+        if entry is None:
+            return None
+        self.hits += 1
+        rows, sims = entry
+        return table.index.candidates(rows[:top_n], sims[:top_n])
+
+    def refresh(self, version: int, index: RecommenderIndex) -> CandidateTable:
+        """Build (and publish) the table for `index` at snapshot `version`, reusing unchanged groups."""
+        with self._lock:
+            prev = self.table
+            if prev is not None and prev.version >= version:
+                # Versions only grow; an older job finishing late must not win.
+                return prev
+            started = time.perf_counter()
+            reusable = prev is not None and (
+                self.max_active_assignments is None or prev.index.load is index.load
+            )
+            groups: Dict[Tuple[str, str], _Group] = {}
+            scored = reused = 0
+            for key, project_rows in index.open_projects.items():
+                eligible = index.eligible_group(key)
+                old = prev.groups.get(key) if reusable else None
+                if old is not None and old[0] is eligible and old[1] is project_rows:
+                    groups[key] = old
+                    reused += 1
+                    continue
+                groups[key] = (eligible, project_rows, self._score_group(index, eligible, project_rows))
+                scored += 1
+
+            table = CandidateTable(version, index, groups)
+            self.table = table
+            self.builds += 1
+            self.groups_scored += scored
+            self.groups_reused += reused
+            self.last_build_seconds = time.perf_counter() - started
+            return table
+
+    def _score_group(
+        self, index: RecommenderIndex, eligible: np.ndarray, project_rows: np.ndarray
+    ) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        projects = [index.projects[int(row)] for row in project_rows]
+        if eligible.size == 0:
+            empty = (np.empty(0, dtype=np.int64), np.empty(0))
+            return {int(p.get("id", -1)): empty for p in projects}
+        lists = {}
+        chunk = max(1, _SCORE_CELLS // eligible.size)
+        for start in range(0, len(projects), chunk):
+            batch = projects[start:start + chunk]
+            pm = index.project_vectors(batch)
+            sims = index.score_many(eligible, pm)
+            for col, project in enumerate(batch):
+                lists[int(project.get("id", -1))] = index.top_ranked(
+                    eligible,
+                    sims[:, col],
+                    pm[col],
+                    self.top_n,
+                    self.semi_active_min_similarity,
+                    self.max_active_assignments,
+                    self.diversity,
+                )
+        return lists
+
+    def stats(self) -> Dict[str, Any]:
+        table = self.table
+        return {
+            "version": table.version if table is not None else None,
+            "projects": len(table.projects) if table is not None else 0,
+            "builds": self.builds,
+            "groups_scored": self.groups_scored,
+            "groups_reused": self.groups_reused,
+            "last_build_seconds": round(self.last_build_seconds, 6),
+            "hits": self.hits,
+        }
@@ -0,0 +1,261 @@
+"""Prometheus metrics and request ids for the recommender API.
+
+Counters and histograms are kept in process and rendered in the Prometheus
+text format (version 0.0.4) by `Registry.render`; values that already live
+elsewhere (dataset size, cache statistics) are read at scrape time through
+collector callbacks. With several workers every process has its own values,
+so scrape them per worker or aggregate by `instance`.
+
+`RequestMetrics` is a plain ASGI middleware: it times every request, counts
+it by route template and status code, and gives it a request id (the
+caller's `X-Request-ID`, or a fresh one) that is echoed in the response and
+attached to the request's tracing span when OpenTelemetry is installed.
+"""
+
+import bisect
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    from opentelemetry import trace as _otel_trace
+except ImportError:  # optional dependency
+    _otel_trace = None
+
+
+logger = logging.getLogger("recommender.requests")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+REQUEST_ID_HEADER = "x-request-id"
+
+Labels = Tuple[str, ...]
+# Samples of one metric family: (suffix, labels, value).
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.type = "counter"
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        return [("_total", dict(zip(self.labelnames, k)), v) for k, v in items]
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.type = "histogram"
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (non-cumulative) + overflow, sum].
+        self._values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][i] += 1
+            entry[1][0] += value
+
+    def count(self, *labels: str) -> int:
+        entry = self._values.get(labels)
+        return sum(entry[0]) if entry else 0
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = [(k, list(counts), total[0]) for k, (counts, total) in self._values.items()]
+        out: List[Sample] = []
+        for key, counts, total in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                out.append(("_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            out.append(("_sum", labels, total))
+            out.append(("_count", labels, cumulative))
+        return out
+
+
+class Registry:
+    """Named metrics plus collector callbacks evaluated on every scrape.
+
+    A collector returns `(name, type, documentation, samples)` families, for
+    values owned by another object such as the dataset store or the cache.
+    """
+
+    def __init__(self):
+        self.metrics: List[Any] = []
+        self.collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+
+    def register(self, metric: Any) -> Any:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs: Any) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, **kwargs))
+
+    def collector(self, fn: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]) -> Callable:
+        self.collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        families = [(m.name, m.type, m.documentation, m.samples()) for m in self.metrics]
+        for fn in self.collectors:
+            try:
+                families.extend(fn())
+            except Exception as e:  # a broken collector must not take /metrics down
+                logger.error("Metrics collector %s failed: %s", getattr(fn, "__name__", fn), e)
+        lines = []
+        for name, kind, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+_request_stages: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_stages", default=None
+)
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def record_stages(histogram: Histogram, stages: Dict[str, float]) -> None:
+    """Observe per-stage seconds and keep them for the current request's trace."""
+    for stage, seconds in stages.items():
+        histogram.observe(seconds, stage)
+    current = _request_stages.get()
+    if current is not None:
+        for stage, seconds in stages.items():
+            current[stage] = current.get(stage, 0.0) + seconds
+
+
+class RequestMetrics:
+    """ASGI middleware: request counters/latency by route, request ids and tracing.
+
+    Requests slower than `slow_seconds` (when set) are logged as one JSON
+    line with their id, route, status and stage timings.
+    """
+
+    def __init__(
+        self,
+        app: Any,
+        requests: Counter,
+        latency: Histogram,
+        slow_seconds: Optional[float] = None,
+    ):
+        self.app = app
+        self.requests = requests
+        self.latency = latency
+        self.slow_seconds = slow_seconds
+        self.tracer = _otel_trace.get_tracer("skillforge.recommender") if _otel_trace is not None else None
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == REQUEST_ID_HEADER.encode():
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        stages: Dict[str, float] = {}
+        id_token = _request_id.set(request_id)
+        stages_token = _request_stages.set(stages)
+        status = 500
+
+        async def send_with_id(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", ()))
+                headers.append((REQUEST_ID_HEADER.encode(), request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        started = time.perf_counter()
+        span = None
+        if self.tracer is not None:
+            span = self.tracer.start_span(f"{scope.get('method', 'GET')} {scope.get('path', '')}")
+            span.set_attribute("request.id", request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope.get("method", "GET")
+            self.requests.inc(route, method, str(status))
+            self.latency.observe(elapsed, route, method)
+            if span is not None:
+                span.set_attribute("http.route", route)
+                span.set_attribute("http.status_code", status)
+                for stage, seconds in stages.items():
+                    span.set_attribute(f"recommender.stage.{stage}_ms", round(seconds * 1000.0, 3))
+                span.end()
+            if self.slow_seconds is not None and elapsed >= self.slow_seconds:
+                logger.warning(json.dumps({
+                    "event": "slow_request",
+                    "request_id": request_id,
+                    "method": method,
+                    "route": route,
+                    "path": scope.get("path"),
+                    "status": status,
+                    "ms": round(elapsed * 1000.0, 3),
+                    "stages_ms": {k: round(v * 1000.0, 3) for k, v in stages.items()},
+                }))
+            _request_stages.reset(stages_token)
+            _request_id.reset(id_token)
@@ -0,0 +1,772 @@
+import copy
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.ann import IVFPartition, unit_vectors
+from app.history import HistoryStore, project_history_targets
+from app.load import AssignmentLoad
+from app.recommender_cosine import adjusted_required_level, project_vector, student_vector
+from app.structures import ArrayColumn, Column, CowMap, append_row
+
+
+BucketKey = Tuple[str, str, str]
+
+ACTIVITY_CODES = {"low-activity": 0, "semi-active": 1, "active": 2}
+OTHER_ACTIVITY = 3
+
+# Rounded similarities within this distance of the N-th best raw score can still
+# tie with it after rounding to 4 decimals, so they join the exact final sort.
+_ROUNDING_SLACK = 1e-4
+# Bound on how far a similarity computed from the float32 features can be from
+# the float64 one (observed errors stay below 1e-7).
+_FLOAT32_SLACK = 1e-6
+# Candidates (best first) that diversity reranking picks from. Fixed, so the
+# first k of a reranked top 50 are the reranked top k.
+DIVERSITY_POOL = 250
+
+
+# student_vector/project_vector with an empty vocabulary yield just the numeric
+# tail of the vector, without the domain one-hot block.
+def student_features(student: Dict[str, Any]) -> List[float]:
+    return student_vector(student, [])
+
+
+def project_features(project: Dict[str, Any]) -> List[float]:
+    return project_vector(project, [])
+
+
+FEATURE_DIM = len(student_features({}))
+# Position of the profile skill in student_features (expected skill for projects).
+SKILL_FEATURE = 2
+
+
+def row_norms(matrix: np.ndarray) -> np.ndarray:
+    """Norms of the full vectors behind `matrix` rows, including the domain one-hot 1."""
+    return np.sqrt(1.0 + np.einsum("ij,ij->i", matrix, matrix)).astype(np.float32)
+
+
+def shortlist(sims: np.ndarray, top_n: int) -> np.ndarray:
+    """Indices of float32-based `sims` that can make the top `top_n` once rescored and rounded to 4 decimals."""
+    if sims.size <= top_n:
+        return np.arange(sims.size)
+    best = np.argpartition(-sims, top_n - 1)[:top_n]
+    return np.nonzero(sims >= sims[best].min() - _ROUNDING_SLACK - 2 * _FLOAT32_SLACK)[0]
+
+
+def rounded(sims: np.ndarray) -> np.ndarray:
+    """`round(sim, 4)` of every entry, as the reference computes it.
+
+    Python's `round` is applied once per distinct value (numpy's rounding can
+    differ on halfway cases), which keeps tie-heavy shortlists cheap.
+    """
+    values, inverse = np.unique(sims, return_inverse=True)
+    return np.array([round(float(v), 4) for v in values], dtype=np.float64)[inverse]
+
+
+_NO_ROWS = np.empty(0, dtype=np.int64)
+
+
+def _with_row(groups: Dict[Any, np.ndarray], key: Any, row: int) -> Dict[Any, np.ndarray]:
+    updated = dict(groups)
+    updated[key] = np.append(groups.get(key, np.empty(0, dtype=np.int64)), np.int64(row))
+    return updated
+
+
+def _without_row(groups: Dict[Any, np.ndarray], key: Any, row: int) -> Dict[Any, np.ndarray]:
+    updated = dict(groups)
+    rows = groups.get(key)
+    if rows is not None:
+        rows = rows[rows != row]
+        if rows.size:
+            updated[key] = rows
+        else:
+            del updated[key]
+    return updated
+
+
+def eligible_groups(buckets: Dict[BucketKey, np.ndarray]) -> Dict[Tuple[str, str], np.ndarray]:
+    """Union of the non low-activity buckets per (domain, level), in dataset order,
+    so ties keep the same order as a full scan."""
+    eligible: Dict[Tuple[str, str], List[np.ndarray]] = {}
+    for (domain, level, activity), rows in buckets.items():
+        if activity == "low-activity":
+            continue
+        eligible.setdefault((domain, level), []).append(rows)
+    return {k: np.sort(np.concatenate(v)) for k, v in eligible.items()}
+
+
+class RecommenderIndex:
+    """Per-snapshot lookup structures for `recommend_students`.
+
+    Built once when a dataset snapshot is loaded:
+    - `project_rows`: project id -> row in `projects`
+    - `domain_vocab`: the sorted domain vocabulary used for the one-hot block
+    - `buckets`: (domain, level, activity_profile) -> student rows
+    - `features`: float32 matrix of the numeric student features, one row per
+      student, with `norms` holding the precomputed norm of each full vector
+    - `exact_features`: the same rows in float64, as computed from the
+      records; every pass over many students uses the float32 matrix, and
+      only the shortlist is rescored from these before rounding
+    - `project_matrix`/`project_norms`: the same for projects, with open
+      projects grouped by (domain, adjusted required level) for the reverse
+      student -> projects query
+    - `ann`: optional IVF partitions per (domain, level), see `with_ann`
+    - `load`: active assignment counts per student id, for the load cap of
+      `top_candidates`
+    - `history`: optional per-student history aggregates; when present every
+      feature row is extended with the history features and projects with
+      their targets (see app.history), so similarities no longer match
+      `recommend_students` exactly
+
+    The domain one-hot block is not materialized: a project is only scored
+    against students of its own domain, so that block always contributes
+    exactly 1 to the dot product and 1 to each squared norm. The resulting
+    similarities equal `cosine_similarity(student_vector, project_vector)`
+    once rescored in float64: float32 alone is off by up to ~1e-7, enough to
+    flip the 4th decimal of continuous profiles.
+
+    A query only touches the students that share the project's domain and
+    adjusted required level, which are exactly the ones `eligible()` accepts.
+
+    An index is never modified once published. `upsert_student`,
+    `delete_student`, `upsert_project` and `delete_project` return a new index
+    that shares storage with this one: a changed record is appended as a new
+    row (the old row stays intact for readers of the previous index) and only
+    the affected buckets and overlay maps are copied. Student rows are
+    appended to the tail of `ArrayColumn`s, never to the base arrays, so an
+    mmap'ed snapshot stays shared however many changes are applied.
+    """
+
+    def __init__(
+        self,
+        students: List[Dict[str, Any]],
+        projects: List[Dict[str, Any]],
+        history: Optional[HistoryStore] = None,
+        load: Optional[AssignmentLoad] = None,
+    ):
+        n = len(students)
+        ids = [s.get("id") for s in students]
+        activities = [str(s.get("activity_profile", "low-activity")) for s in students]
+        exact_features = np.array([student_features(s) for s in students], dtype=np.float64).reshape(n, FEATURE_DIM)
+        features = exact_features.astype(np.float32)
+
+        student_rows: Dict[Any, int] = {}
+        for row, sid in enumerate(ids):
+            student_rows.setdefault(sid, row)
+
+        buckets: Dict[BucketKey, List[int]] = {}
+        for row, s in enumerate(students):
+            buckets.setdefault(self.bucket_key(s), []).append(row)
+
+        self._init(
+            projects=projects,
+            ids=ids,
+            names=[s.get("name") for s in students],
+            domains=[s.get("domain") for s in students],
+            levels=[s.get("level") for s in students],
+            activities=activities,
+            activity_codes=np.array([ACTIVITY_CODES.get(a, OTHER_ACTIVITY) for a in activities], dtype=np.int8),
+            features=features,
+            norms=row_norms(features),
+            exact_features=exact_features,
+            student_rows=student_rows,
+            buckets={k: np.array(v, dtype=np.int64) for k, v in buckets.items()},
+            student_domain_vocab={str(s.get("domain", "")) for s in students},
+            history=history,
+            load=load,
+        )
+
+    @classmethod
+    def from_columns(cls, **columns: Any) -> "RecommenderIndex":
+        """Build an index from already columnar student data (see `_init`), e.g. a binary snapshot."""
+        index = cls.__new__(cls)
+        index._init(**columns)
+        return index
+
+    def _init(
+        self,
+        projects: List[Dict[str, Any]],
+        ids: Sequence[Any],
+        names: Sequence[Any],
+        domains: Sequence[Any],
+        levels: Sequence[Any],
+        activities: Sequence[str],
+        activity_codes: np.ndarray,
+        features: np.ndarray,
+        norms: np.ndarray,
+        student_rows: Any,
+        buckets: Dict[BucketKey, np.ndarray],
+        student_domain_vocab: Iterable[str],
+        history: Optional[HistoryStore] = None,
+        eligible: Optional[Dict[Tuple[str, str], np.ndarray]] = None,
+        load: Optional[AssignmentLoad] = None,
+        exact_features: Optional[np.ndarray] = None,
+    ) -> None:
+        self.projects = Column(list(projects))
+        self.n_projects = len(self.projects)
+        project_rows: Dict[int, int] = {}
+        for row, p in enumerate(projects):
+            project_rows.setdefault(int(p.get("id", -1)), row)
+        self.project_rows = CowMap(project_rows)
+
+        self.domain_vocab = sorted({str(p.get("domain", "")) for p in projects} | set(student_domain_vocab))
+
+        self.history = history
+        self.load = load if load is not None else AssignmentLoad().freeze()
+        if exact_features is None:
+            # Snapshots before format 3 only hold the float32 features.
+            exact_features = features
+        if history is not None:
+            exact_features = np.hstack([exact_features, history.matrix(ids, exact_features[:, SKILL_FEATURE])])
+            features = exact_features.astype(np.float32)
+            norms = row_norms(features)
+
+        self.n_students = len(ids)
+        self.student_ids = Column(ids)
+        self.student_names = Column(names)
+        self.student_domains = Column(domains)
+        self.student_levels = Column(levels)
+        self.student_activities = Column(activities)
+        # Changed students are appended past the base arrays, which may be mmap'ed.
+        self.activity_codes = ArrayColumn(activity_codes)
+        self.features = ArrayColumn(features)
+        self.norms = ArrayColumn(norms)
+        self.exact_features = ArrayColumn(exact_features)
+        self.student_rows = CowMap(student_rows)
+
+        self.project_matrix = np.array([self.project_vector(p) for p in projects], dtype=np.float32).reshape(
+            len(projects), self.features.shape[1]
+        )
+        self.project_norms = row_norms(self.project_matrix)
+        open_groups: Dict[Tuple[str, str], List[int]] = {}
+        for row, p in enumerate(projects):
+            if str(p.get("status")) != "open" or self.project_rows.get(int(p.get("id", -1))) != row:
+                continue
+            open_groups.setdefault(self.project_group(p), []).append(row)
+        self.open_projects: Dict[Tuple[str, str], np.ndarray] = {
+            k: np.array(v, dtype=np.int64) for k, v in open_groups.items()
+        }
+
+        self.buckets = buckets
+        self._eligible: Dict[Tuple[str, str], np.ndarray] = (
+            eligible if eligible is not None else eligible_groups(buckets)
+        )
+        self.ann: Dict[Tuple[str, str], IVFPartition] = {}
+
+    @classmethod
+    def from_data(cls, data: Dict[str, Any], history_half_life_days: Optional[float] = None) -> "RecommenderIndex":
+        """Index of a parsed export; with `history_half_life_days`, history features are on."""
+        entities = data.get("entities", {}) or {}
+        history = None
+        if history_half_life_days is not None:
+            history = HistoryStore.from_entities(entities, history_half_life_days)
+        return cls(
+            students=list(entities.get("students", []) or []),
+            projects=list(entities.get("projects", []) or []),
+            history=history,
+            load=AssignmentLoad.from_entities(entities),
+        )
+
+    def student_vector(self, student_id: Any, static: Sequence[float]) -> np.ndarray:
+        """Exact (float64) feature row of a student from its `student_features`, plus history features when enabled."""
+        row = list(static)
+        if self.history is not None:
+            row += self.history.features(student_id, float(static[SKILL_FEATURE]))
+        return np.asarray(row, dtype=np.float64)
+
+    def project_vector(self, project: Dict[str, Any]) -> List[float]:
+        """`project_features`, plus the history targets when history features are enabled."""
+        row = project_features(project)
+        if self.history is not None:
+            row += project_history_targets(row[SKILL_FEATURE])
+        return row
+
+    @staticmethod
+    def bucket_key(student: Dict[str, Any]) -> BucketKey:
+        # Same string coercions as eligible() so bucket membership matches it exactly.
+        return (
+            str(student.get("domain")),
+            str(student.get("level")),
+            str(student.get("activity_profile", "low-activity")),
+        )
+
+    def bucket_key_at(self, row: int) -> BucketKey:
+        return (str(self.student_domains[row]), str(self.student_levels[row]), self.student_activities[row])
+
+    @staticmethod
+    def project_group(project: Dict[str, Any]) -> Tuple[str, str]:
+        return (str(project.get("domain")), adjusted_required_level(project))
+
+    def upsert_student(self, student: Dict[str, Any]) -> "RecommenderIndex":
+        """New index with `student` added, or replacing the student with the same id."""
+        new = self._put_student(
+            student.get("id"),
+            student.get("name"),
+            student.get("domain"),
+            student.get("level"),
+            str(student.get("activity_profile", "low-activity")),
+            student_features(student),
+        )
+        new._add_domain(student.get("domain", ""))
+        return new
+
+    def record_history(self, section: str, event: Dict[str, Any]) -> "RecommenderIndex":
+        """New index with a history event (assignment, submission or evaluation) applied.
+
+        Assignments always update the active assignment counts. With history
+        features, the aggregates change in O(1) and every affected student, if
+        indexed, gets a fresh feature row like an upsert of the same profile:
+        the new owner, and the previous one when the event moves an
+        assignment or evaluation to another student.
+        """
+        if self.history is None and section != "assignments":
+            raise RuntimeError("History features are not enabled")
+        new = copy.copy(self)
+        if section == "assignments":
+            new.load = self.load.record(event)
+        if self.history is None:
+            return new
+        new.history, student_ids = self.history.record(section, event)
+        for student_id in student_ids:
+            row = new.student_rows.get(student_id)
+            if row is None:
+                continue
+            new = new._put_student(
+                student_id,
+                new.student_names[row],
+                new.student_domains[row],
+                new.student_levels[row],
+                new.student_activities[row],
+                new.exact_features[row, :FEATURE_DIM].tolist(),
+            )
+        return new
+
+    def _put_student(
+        self,
+        sid: Any,
+        name: Any,
+        domain: Any,
+        level: Any,
+        activity: str,
+        static: Sequence[float],
+    ) -> "RecommenderIndex":
+        new = self.delete_student(sid) if sid in self.student_rows else copy.copy(self)
+
+        row = new.n_students
+        for column, value in (
+            (new.student_ids, sid),
+            (new.student_names, name),
+            (new.student_domains, domain),
+            (new.student_levels, level),
+            (new.student_activities, activity),
+        ):
+            column.put(row, value)
+        exact = new.student_vector(sid, static)
+        feats = exact.astype(np.float32)
+        new.activity_codes = new.activity_codes.append(row, ACTIVITY_CODES.get(activity, OTHER_ACTIVITY))
+        new.features = new.features.append(row, feats)
+        new.norms = new.norms.append(row, np.sqrt(1.0 + float(feats @ feats)))
+        new.exact_features = new.exact_features.append(row, exact)
+        new.n_students = row + 1
+        new.student_rows = new.student_rows.set(sid, row)
+
+        # The new row is the highest one, so appending keeps every bucket sorted.
+        domain, level, activity = key = new.bucket_key_at(row)
+        new.buckets = _with_row(new.buckets, key, row)
+        if activity != "low-activity":
+            new._eligible = _with_row(new._eligible, (domain, level), row)
+            ivf = new.ann.get((domain, level))
+            if ivf is not None:
+                new.ann = dict(new.ann)
+                new.ann[(domain, level)] = ivf.with_row(row, unit_vectors(feats[None, :], new.norms[row:row + 1])[0])
+        return new
+
+    def delete_student(self, student_id: Any) -> "RecommenderIndex":
+        row = self.student_rows.get(student_id)
+        if row is None:
+            raise ValueError(f"Student with id={student_id} not found")
+        new = copy.copy(self)
+        domain, level, activity = key = self.bucket_key_at(row)
+        new.buckets = _without_row(self.buckets, key, row)
+        if activity != "low-activity":
+            new._eligible = _without_row(self._eligible, (domain, level), row)
+            ivf = self.ann.get((domain, level))
+            if ivf is not None:
+                new.ann = dict(self.ann)
+                new.ann[(domain, level)] = ivf.without_row(row)
+        new.student_rows = self.student_rows.delete(student_id)
+        return new
+
+    def upsert_project(self, project: Dict[str, Any]) -> "RecommenderIndex":
+        """New index with `project` added, or replacing the project with the same id."""
+        pid = int(project.get("id", -1))
+        new = self.delete_project(pid) if pid in self.project_rows else copy.copy(self)
+
+        row = new.n_projects
+        new.projects.put(row, project)
+        feats = np.asarray(self.project_vector(project), dtype=np.float32)
+        new.project_matrix = append_row(new.project_matrix, row, feats)
+        new.project_norms = append_row(new.project_norms, row, np.sqrt(1.0 + float(feats @ feats)))
+        new.n_projects = row + 1
+        new.project_rows = new.project_rows.set(pid, row)
+        new._add_domain(project.get("domain", ""))
+        if str(project.get("status")) == "open":
+            new.open_projects = _with_row(new.open_projects, self.project_group(project), row)
+        return new
+
+    def delete_project(self, project_id: int) -> "RecommenderIndex":
+        row = self.project_rows.get(int(project_id))
+        if row is None:
+            raise ValueError(f"Project with id={project_id} not found")
+        new = copy.copy(self)
+        project = self.projects[row]
+        if str(project.get("status")) == "open":
+            new.open_projects = _without_row(self.open_projects, self.project_group(project), row)
+        new.project_rows = self.project_rows.delete(int(project_id))
+        return new
+
+    def _add_domain(self, domain: Any) -> None:
+        if str(domain) not in self.domain_vocab:
+            self.domain_vocab = sorted(self.domain_vocab + [str(domain)])
+
+    def with_ann(self, min_rows: int, n_lists: Optional[int] = None, seed: int = 0) -> "RecommenderIndex":
+        """New index with an IVF partition for every (domain, level) of at least `min_rows` eligible students.
+
+        Partitions are kept up to date by the incremental updates (new rows go
+        to their closest list) and are rebuilt from scratch on the next load.
+        """
+        new = copy.copy(self)
+        new.ann = {}
+        for key, rows in self._eligible.items():
+            if min_rows > 0 and rows.size >= min_rows:
+                units = unit_vectors(self.features[rows], self.norms[rows])
+                new.ann[key] = IVFPartition.build(rows, units, n_lists=n_lists, seed=seed)
+        return new
+
+    def get_project(self, project_id: int) -> Optional[Dict[str, Any]]:
+        row = self.project_rows.get(int(project_id))
+        return None if row is None else self.projects[row]
+
+    def eligible_group(self, key: Tuple[str, str]) -> np.ndarray:
+        """Eligible (non low-activity) student rows of a (domain, level), in dataset order."""
+        return self._eligible.get(key, _NO_ROWS)
+
+    def eligible_rows(self, project: Dict[str, Any]) -> np.ndarray:
+        if str(project.get("status")) != "open":
+            return np.empty(0, dtype=np.int64)
+        return self._eligible.get(self.project_group(project), np.empty(0, dtype=np.int64))
+
+    def pool_size(self, project_id: int) -> int:
+        """Number of students an exact `recommend` for `project_id` scores (0 if unknown)."""
+        project = self.get_project(project_id)
+        return 0 if project is None else int(self.eligible_rows(project).size)
+
+    def score(self, rows: np.ndarray, project: Dict[str, Any]) -> np.ndarray:
+        """Cosine similarity of `project` against the student `rows` (float64)."""
+        return self.score_vector(rows, np.asarray(self.project_vector(project), dtype=np.float64))
+
+    def score_vector(self, rows: np.ndarray, pv: np.ndarray) -> np.ndarray:
+        """`score` for an already built project vector `pv`."""
+        pnorm = np.sqrt(1.0 + pv @ pv)
+        dots = 1.0 + self.features[rows] @ pv
+        return dots / (self.norms[rows] * pnorm)
+
+    def exact_scores(self, rows: np.ndarray, pv: np.ndarray) -> np.ndarray:
+        """`score_vector` recomputed in float64 from `exact_features`, for a shortlist of rows."""
+        sv = self.exact_features[rows].astype(np.float64)
+        return (1.0 + sv @ pv) / (np.sqrt(1.0 + np.einsum("ij,ij->i", sv, sv)) * np.sqrt(1.0 + pv @ pv))
+
+    def approximate_rows(self, project: Dict[str, Any], probes: int, min_rows: int) -> Optional[np.ndarray]:
+        """Eligible rows in the `probes` IVF lists closest to `project`, or None without an IVF partition."""
+        if str(project.get("status")) != "open":
+            return None
+        ivf = self.ann.get(self.project_group(project))
+        if ivf is None:
+            return None
+        pv = np.asarray([1.0] + self.project_vector(project), dtype=np.float64)
+        return ivf.search(pv / np.sqrt(pv @ pv), probes, min_rows)
+
+    def recommend(
+        self,
+        project_id: int,
+        top_n: int = 7,
+        semi_active_min_similarity: float = 0.80,
+        ann_probes: int = 0,
+        max_active_assignments: Optional[int] = None,
+        diversity: float = 0.0,
+        timings: Optional[Dict[str, float]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Best candidates for a project, as `recommend_students` ranks them.
+
+        With `ann_probes` > 0 and an IVF partition for the project's
+        (domain, level), only the students in the `ann_probes` closest lists
+        are scored: more probes trade latency for recall. Otherwise (and by
+        default) every eligible student is scored. `max_active_assignments`
+        and `diversity` rerank the result, see `top_candidates`.
+
+        A `timings` dict receives the seconds spent per stage: `eligibility`,
+        `vectorize`, `score` and `rank`.
+        """
+        started = time.perf_counter()
+        project = self.get_project(project_id)
+        if project is None:
+            raise ValueError(f"Project with id={project_id} not found")
+
+        rows = None
+        if ann_probes > 0:
+            rows = self.approximate_rows(project, ann_probes, top_n)
+        if rows is None:
+            rows = self.eligible_rows(project)
+        eligible_at = time.perf_counter()
+        if rows.size == 0:
+            if timings is not None:
+                timings["eligibility"] = eligible_at - started
+            return []
+        pv = np.asarray(self.project_vector(project), dtype=np.float64)
+        vectorized_at = time.perf_counter()
+        sims = self.score_vector(rows, pv)
+        scored_at = time.perf_counter()
+        result = self.top_candidates(
+            rows,
+            sims,
+            pv,
+            top_n,
+            semi_active_min_similarity,
+            max_active_assignments=max_active_assignments,
+            diversity=diversity,
+        )
+        if timings is not None:
+            timings["eligibility"] = eligible_at - started
+            timings["vectorize"] = vectorized_at - eligible_at
+            timings["score"] = scored_at - vectorized_at
+            timings["rank"] = time.perf_counter() - scored_at
+        return result
+
+    def recommend_many(self, queries: List[Tuple[int, int, float]]) -> List[Dict[str, Any]]:
+        """Answer several `(project_id, top_n, semi_active_min_similarity)` queries at once.
+
+        Projects that share an eligible bucket are scored together with one
+        matrix-matrix product. Each entry of the result carries either
+        `candidates` or an `error`, in the order of `queries`.
+        """
+        results: List[Dict[str, Any]] = [{} for _ in queries]
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        projects: List[Optional[Dict[str, Any]]] = []
+        for i, (project_id, _, _) in enumerate(queries):
+            project = self.get_project(project_id)
+            projects.append(project)
+            if project is None:
+                results[i] = {"error": f"Project with id={project_id} not found"}
+            elif str(project.get("status")) != "open":
+                results[i] = {"candidates": []}
+            else:
+                groups.setdefault(self.project_group(project), []).append(i)
+
+        for key, members in groups.items():
+            rows = self._eligible.get(key, np.empty(0, dtype=np.int64))
+            if rows.size == 0:
+                for i in members:
+                    results[i] = {"candidates": []}
+                continue
+            pm = self.project_vectors([projects[i] for i in members])
+            sims = self.score_many(rows, pm)
+            for col, i in enumerate(members):
+                _, top_n, threshold = queries[i]
+                results[i] = {"candidates": self.top_candidates(rows, sims[:, col], pm[col], top_n, threshold)}
+        return results
+
+    def project_vectors(self, projects: List[Dict[str, Any]]) -> np.ndarray:
+        """`project_vector` of each project, as a float64 (len(projects), dim) matrix."""
+        dim = self.features.shape[1]
+        return np.asarray([self.project_vector(p) for p in projects], dtype=np.float64).reshape(len(projects), dim)
+
+    def score_many(self, rows: np.ndarray, pm: np.ndarray) -> np.ndarray:
+        """Cosine similarities of student `rows` (axis 0) against the project vectors `pm` (axis 1)."""
+        pnorms = np.sqrt(1.0 + np.einsum("ij,ij->i", pm, pm))
+        dots = 1.0 + self.features[rows] @ pm.T
+        return dots / (self.norms[rows][:, None] * pnorms[None, :])
+
+    def top_candidates(
+        self,
+        rows: np.ndarray,
+        sims: np.ndarray,
+        pv: np.ndarray,
+        top_n: int,
+        semi_active_min_similarity: float,
+        max_active_assignments: Optional[int] = None,
+        diversity: float = 0.0,
+    ) -> List[Dict[str, Any]]:
+        """Filter, rank and format the best `top_n` of `rows` scored as `sims` against the project vector `pv`.
+
+        Ordering matches `recommend_students`: rounded similarity desc, active
+        before semi-active, then dataset order.
+
+        Two optional reranking steps follow scoring:
+
+        - `max_active_assignments` drops students holding more active
+          assignments than that (see app.load)
+        - `diversity` in (0, 1] reranks the best `DIVERSITY_POOL` candidates
+          by maximal marginal relevance: each pick maximizes
+          `(1 - diversity) * similarity - diversity * redundancy`, where
+          redundancy is the largest similarity to a student already picked
+          (see `diverse_order`). 0 keeps the plain ranking.
+
+        Both are linear in the number of candidates: the cap is one `isin`
+        against the overloaded students, and reranking does `top_n` passes
+        over a pool of at most `DIVERSITY_POOL`.
+        """
+        rows, sims = self.top_ranked(
+            rows, sims, pv, top_n, semi_active_min_similarity, max_active_assignments, diversity
+        )
+        return self.candidates(rows, sims)
+
+    def top_ranked(
+        self,
+        rows: np.ndarray,
+        sims: np.ndarray,
+        pv: np.ndarray,
+        top_n: int,
+        semi_active_min_similarity: float,
+        max_active_assignments: Optional[int] = None,
+        diversity: float = 0.0,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """`top_candidates` as (rows, rounded similarities) arrays, best first.
+
+        The semi-active threshold and the final rounding use exact scores:
+        rows whose float32 score is too close to call are rescored.
+        """
+        top_n = max(0, int(top_n))
+        semi = self.activity_codes[rows] == ACTIVITY_CODES["semi-active"]
+        borderline = semi & (np.abs(sims - semi_active_min_similarity) <= _FLOAT32_SLACK)
+        if borderline.any():
+            sims = sims.copy()
+            sims[borderline] = self.exact_scores(rows[borderline], pv)
+        keep = ~(semi & (sims < semi_active_min_similarity))
+        if max_active_assignments is not None:
+            keep &= ~np.isin(rows, self.overloaded_rows(max_active_assignments))
+        rows, sims = rows[keep], sims[keep]
+        if top_n == 0 or rows.size == 0:
+            return rows[:0], sims[:0]
+
+        pool = max(top_n, DIVERSITY_POOL) if diversity > 0 else top_n
+        near = shortlist(sims, pool)
+        rows = rows[near]
+        sims = rounded(self.exact_scores(rows, pv))
+        inactive = self.activity_codes[rows] != ACTIVITY_CODES["active"]
+        ranked = np.lexsort((rows, inactive, -sims))[:pool]
+        if diversity > 0:
+            ranked = ranked[self.diverse_order(rows[ranked], sims[ranked], top_n, diversity)]
+        ranked = ranked[:top_n]
+        return rows[ranked], sims[ranked]
+
+    def candidates(self, rows: np.ndarray, sims: np.ndarray) -> List[Dict[str, Any]]:
+        return [self.candidate(int(row), float(sim)) for row, sim in zip(rows, sims)]
+
+    def overloaded_rows(self, max_active_assignments: int) -> np.ndarray:
+        """Rows of the indexed students with more than `max_active_assignments` active assignments."""
+        rows = [self.student_rows.get(sid) for sid in self.load.over(max_active_assignments)]
+        return np.array([r for r in rows if r is not None], dtype=np.int64)
+
+    def diverse_order(self, rows: np.ndarray, sims: np.ndarray, top_n: int, diversity: float) -> np.ndarray:
+        """Greedy maximal-marginal-relevance picks among `rows` (ranked best first) scored `sims`.
+
+        Students of one partition share their domain and level and their raw
+        cosines all sit close to 1, so two students are compared by the
+        cosine of their feature rows centered on the pool mean, clipped at 0:
+        1 for identical profiles, 0 for unrelated or opposite ones. Ties go to
+        the better ranked row, so `diversity` = 0 keeps the order.
+        """
+        centered = self.features[rows].astype(np.float64)
+        centered -= centered.mean(axis=0)
+        lengths = np.linalg.norm(centered, axis=1)
+        units = np.divide(centered, lengths[:, None], out=np.zeros_like(centered), where=lengths[:, None] > 0)
+        relevance = (1.0 - diversity) * sims
+        redundancy = np.zeros(rows.size)
+        picked = np.zeros(rows.size, dtype=bool)
+        order = []
+        for _ in range(min(top_n, rows.size)):
+            gain = np.where(picked, -np.inf, relevance - diversity * redundancy)
+            i = int(np.argmax(gain))
+            order.append(i)
+            picked[i] = True
+            np.maximum(redundancy, units @ units[i], out=redundancy)
+        return np.array(order, dtype=np.int64)
+
+    def recommend_projects(
+        self,
+        student_id: Any,
+        top_n: int = 7,
+        semi_active_min_similarity: float = 0.80,
+    ) -> List[Dict[str, Any]]:
+        """Open projects that fit a student, best first.
+
+        Applies the same `eligible()` rules and semi-active threshold as the
+        forward query, so a project lists the student iff the student would
+        be a candidate for it (before top-N truncation).
+        """
+        row = self.student_rows.get(student_id)
+        if row is None:
+            raise ValueError(f"Student with id={student_id} not found")
+
+        activity = self.student_activities[row]
+        top_n = max(0, int(top_n))
+        if activity == "low-activity" or top_n == 0:
+            return []
+        prows = self.open_projects.get((str(self.student_domains[row]), str(self.student_levels[row])))
+        if prows is None:
+            return []
+
+        sv = self.features[row].astype(np.float64)
+        dots = 1.0 + self.project_matrix[prows] @ sv
+        sims = dots / (self.project_norms[prows] * float(self.norms[row]))
+        if activity == "semi-active":
+            borderline = np.abs(sims - semi_active_min_similarity) <= _FLOAT32_SLACK
+            if borderline.any():
+                sims[borderline] = self.exact_project_scores(prows[borderline], row)
+            keep = sims >= semi_active_min_similarity
+            prows, sims = prows[keep], sims[keep]
+
+        near = shortlist(sims, top_n)
+        prows = prows[near]
+        sims = rounded(self.exact_project_scores(prows, row))
+        ranked = np.lexsort((prows, -sims))[:top_n]
+        return [self.project_match(int(prows[i]), float(sims[i])) for i in ranked]
+
+    def exact_project_scores(self, prows: np.ndarray, row: int) -> np.ndarray:
+        """Float64 similarities of the projects at `prows` to the student at `row`, from the source values."""
+        pm = self.project_vectors([self.projects[int(p)] for p in prows])
+        sv = self.exact_features[row].astype(np.float64)
+        return (1.0 + pm @ sv) / (np.sqrt(1.0 + np.einsum("ij,ij->i", pm, pm)) * np.sqrt(1.0 + sv @ sv))
+
+    def project_match(self, row: int, similarity: float) -> Dict[str, Any]:
+        p = self.projects[row]
+        return {
+            "project_id": int(p.get("id", -1)),
+            "title": p.get("title"),
+            "domain": p.get("domain"),
+            "required_level": p.get("required_level"),
+            "adjusted_required_level": adjusted_required_level(p),
+            "complexity": p.get("complexity"),
+            "similarity": similarity,
+        }
+
+    def candidate(self, row: int, similarity: float) -> Dict[str, Any]:
+        return {
+            "student_id": self.student_ids[row],
+            "name": self.student_names[row],
+            "domain": self.student_domains[row],
+            "level": self.student_levels[row],
+            "activity_profile": self.student_activities[row],
+            "similarity": similarity,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "students": len(self.student_rows),
+            "projects": len(self.project_rows),
+            "buckets": len(self.buckets),
+            "largest_bucket": max((len(v) for v in self.buckets.values()), default=0),
+            "ann_partitions": len(self.ann),
+        }
@@ -0,0 +1,406 @@
+"""Compact columnar binary snapshot of the recommender features.
+
+Only what the recommender reads is kept: student ids, names and
+domain/level/activity (interned as integer codes), the float32 feature matrix
+with row norms and its float64 source (read only to rescore shortlists), the
+project fields used for scoring and the active
+assignments (for the load cap). Other assignments, milestones, submissions,
+evaluations and the analysis blob are dropped.
+
+Layout: 8-byte magic, little-endian uint64 header length, JSON header, then
+64-byte aligned raw arrays described by the header. `load_snapshot` maps the
+file read-only and wraps the arrays without copying them. Since format 2 the
+bucket and eligible-partition row lists are stored too, so a process that
+maps a snapshot allocates nothing proportional to the number of students and
+any number of workers share one copy through the page cache. Format 3 adds
+the float64 `exact_features`; older files rescore from the float32 features.
+
+The same columns can be built straight from a streamed JSON export
+(`stream_columns`), which is how the compiler reads its input and how very
+large exports are ingested without `json.load`.
+
+Compile an export with:
+
+    python -m app.snapshot data/ai_analysis.json data/recommender.snap
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.history import HISTORY_SECTIONS, HistoryStore
+from app.load import AssignmentLoad
+from app.recommender_index import (
+    ACTIVITY_CODES,
+    FEATURE_DIM,
+    OTHER_ACTIVITY,
+    BucketKey,
+    RecommenderIndex,
+    eligible_groups,
+    row_norms,
+    student_features,
+)
+from app.stream_json import iter_entities
+from app.structures import CodedSeq, IntSeq, SortedKeyMap, StrSeq
+
+
+MAGIC = b"SFRSNAP1"
+FORMAT_VERSION = 3
+# Format 1 lacks the bucket row arrays; they are rebuilt at load time.
+READABLE_FORMATS = (1, 2, 3)
+ALIGN = 64
+PROJECT_FIELDS = ("domain", "required_level", "complexity", "status")
+
+
+def is_snapshot(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class _Interner:
+    """Maps JSON scalar values to dense integer codes."""
+
+    def __init__(self):
+        self.table: List[Any] = []
+        self._codes: Dict[str, int] = {}
+
+    def code(self, value: Any) -> int:
+        key = json.dumps(value)
+        code = self._codes.get(key)
+        if code is None:
+            code = self._codes[key] = len(self.table)
+            self.table.append(value)
+        return code
+
+
+def _require_int(value: Any, what: str) -> int:
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"Binary snapshots need integer {what} ids, got {value!r}")
+    return value
+
+
+class _Strings:
+    """Optional strings appended into a UTF-8 blob with offsets and a null mask."""
+
+    def __init__(self):
+        self.blob = bytearray()
+        self.offsets = array("q", [0])
+        self.nulls = bytearray()
+
+    def append(self, value: Any) -> None:
+        if value is not None:
+            self.blob += str(value).encode("utf-8")
+        self.offsets.append(len(self.blob))
+        self.nulls.append(value is None)
+
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        return {
+            f"{prefix}_blob": np.frombuffer(bytes(self.blob), dtype=np.uint8),
+            f"{prefix}_offsets": np.frombuffer(self.offsets, dtype=np.int64),
+            f"{prefix}_nulls": np.frombuffer(bytes(self.nulls), dtype=np.uint8),
+        }
+
+
+class ColumnBuilder:
+    """Accumulates student and project records into compact typed columns.
+
+    Records are reduced to ids, names, interned codes and features as
+    they arrive and are not kept, so the builder can consume a stream.
+    """
+
+    def __init__(self):
+        self.tables = {"domain": _Interner(), "level": _Interner(), "activity": _Interner()}
+        self.ids = array("q")
+        self.names = _Strings()
+        self.codes = {k: array("i") for k in self.tables}
+        self.activity_codes = array("b")
+        self.features = array("d")
+
+        self.project_tables = {f: _Interner() for f in PROJECT_FIELDS}
+        self.project_ids = array("q")
+        self.project_titles = _Strings()
+        self.project_codes = {f: array("i") for f in PROJECT_FIELDS}
+        self.load = AssignmentLoad()
+
+    def add_student(self, s: Dict[str, Any]) -> None:
+        sid = _require_int(s.get("id"), "student")
+        activity = str(s.get("activity_profile", "low-activity"))
+        self.ids.append(sid)
+        self.names.append(s.get("name"))
+        self.codes["domain"].append(self.tables["domain"].code(s.get("domain")))
+        self.codes["level"].append(self.tables["level"].code(s.get("level")))
+        self.codes["activity"].append(self.tables["activity"].code(activity))
+        self.activity_codes.append(ACTIVITY_CODES.get(activity, OTHER_ACTIVITY))
+        self.features.extend(student_features(s))
+
+    def add_project(self, p: Dict[str, Any]) -> None:
+        self.project_ids.append(_require_int(p.get("id"), "project"))
+        self.project_titles.append(p.get("title"))
+        for f in PROJECT_FIELDS:
+            self.project_codes[f].append(self.project_tables[f].code(p.get(f)))
+
+    def add_assignment(self, a: Dict[str, Any]) -> None:
+        _require_int(a.get("id"), "assignment")
+        _require_int(a.get("user_id"), "assignment user")
+        self.load.add(a)
+
+    def add(self, section: str, record: Dict[str, Any]) -> None:
+        if section == "students":
+            self.add_student(record)
+        elif section == "projects":
+            self.add_project(record)
+        elif section == "assignments":
+            self.add_assignment(record)
+
+    def _groups(self) -> Tuple[Dict[BucketKey, np.ndarray], Dict[Tuple[str, str], np.ndarray]]:
+        tables = {k: t.table for k, t in self.tables.items()}
+        buckets = _buckets(
+            np.frombuffer(self.codes["domain"], dtype=np.int32),
+            np.frombuffer(self.codes["level"], dtype=np.int32),
+            np.frombuffer(self.codes["activity"], dtype=np.int32),
+            tables,
+        )
+        return buckets, eligible_groups(buckets)
+
+    def header(self) -> Dict[str, Any]:
+        buckets, eligible = self._groups()
+        return {
+            "students": len(self.ids),
+            "projects": len(self.project_ids),
+            "tables": {k: t.table for k, t in self.tables.items()},
+            "project_tables": {k: t.table for k, t in self.project_tables.items()},
+            "bucket_keys": [list(k) for k in buckets],
+            "eligible_keys": [list(k) for k in eligible],
+        }
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        n = len(self.ids)
+        id_array = np.frombuffer(self.ids, dtype=np.int64)
+        order = np.argsort(id_array, kind="stable")
+        sorted_ids = id_array[order]
+        first = np.ones(n, dtype=bool)
+        first[1:] = sorted_ids[1:] != sorted_ids[:-1]
+        exact_features = np.frombuffer(self.features, dtype=np.float64).reshape(n, FEATURE_DIM)
+        features = exact_features.astype(np.float32)
+
+        arrays: Dict[str, np.ndarray] = {
+            "student_ids": id_array,
+            "student_id_keys": sorted_ids[first],
+            "student_id_rows": order[first].astype(np.int64),
+            **self.names.arrays("student_name"),
+            "student_domain_codes": np.frombuffer(self.codes["domain"], dtype=np.int32),
+            "student_level_codes": np.frombuffer(self.codes["level"], dtype=np.int32),
+            "student_activity_codes": np.frombuffer(self.codes["activity"], dtype=np.int32),
+            "activity_codes": np.frombuffer(self.activity_codes, dtype=np.int8),
+            "features": features,
+            "norms": row_norms(features),
+            "exact_features": exact_features,
+            "project_ids": np.frombuffer(self.project_ids, dtype=np.int64),
+            **self.project_titles.arrays("project_title"),
+        }
+        for f in PROJECT_FIELDS:
+            arrays[f"project_{f}_codes"] = np.frombuffer(self.project_codes[f], dtype=np.int32)
+        buckets, eligible = self._groups()
+        arrays["bucket_rows"], arrays["bucket_bounds"] = _pack(list(buckets.values()))
+        arrays["eligible_rows"], arrays["eligible_bounds"] = _pack(list(eligible.values()))
+        active = list(self.load.active.items())
+        arrays["active_assignment_ids"] = np.array([aid for aid, _ in active], dtype=np.int64)
+        arrays["active_assignment_users"] = np.array([uid for _, uid in active], dtype=np.int64)
+        return arrays
+
+    def index(self, history: Optional[HistoryStore] = None) -> RecommenderIndex:
+        """An in-memory index over the accumulated columns."""
+        return index_from_arrays(self.arrays(), self.header(), history=history)
+
+
+def _pack(groups: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenate row groups into one array plus `len(groups) + 1` bounds."""
+    bounds = np.zeros(len(groups) + 1, dtype=np.int64)
+    bounds[1:] = np.cumsum([g.size for g in groups])
+    rows = np.concatenate(groups).astype(np.int64) if groups else np.empty(0, dtype=np.int64)
+    return rows, bounds
+
+
+def _unpack(keys: List[List[Any]], rows: np.ndarray, bounds: np.ndarray) -> Dict[Tuple, np.ndarray]:
+    return {tuple(k): rows[bounds[i]:bounds[i + 1]] for i, k in enumerate(keys)}
+
+
+def write_snapshot(
+    students: Iterable[Dict[str, Any]],
+    projects: Iterable[Dict[str, Any]],
+    out_path: str,
+    assignments: Iterable[Dict[str, Any]] = (),
+) -> Dict[str, Any]:
+    """Write a snapshot of `students`/`projects`/`assignments` to `out_path` atomically."""
+    builder = ColumnBuilder()
+    for s in students:
+        builder.add_student(s)
+    for p in projects:
+        builder.add_project(p)
+    for a in assignments:
+        builder.add_assignment(a)
+    return _write(builder, out_path)
+
+
+def _write(builder: ColumnBuilder, out_path: str) -> Dict[str, Any]:
+    arrays = builder.arrays()
+    header: Dict[str, Any] = {"format": FORMAT_VERSION, "created_at": time.time(), **builder.header(), "arrays": {}}
+    offset = 0
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        arrays[name] = arr
+        header["arrays"][name] = {"offset": offset, "dtype": arr.dtype.str, "shape": list(arr.shape)}
+        offset += -(-arr.nbytes // ALIGN) * ALIGN
+
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 8 + len(header_bytes)) // ALIGN) * ALIGN
+
+    tmp_path = f"{out_path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for name, arr in arrays.items():
+            f.seek(data_start + header["arrays"][name]["offset"])
+            f.write(arr.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, out_path)
+    return {"students": header["students"], "projects": header["projects"], "bytes": data_start + offset}
+
+
+def stream_columns(json_path: str, history: Optional[HistoryStore] = None) -> ColumnBuilder:
+    """Stream students, projects and assignments of a JSON export into a ColumnBuilder.
+
+    With a (bulk-loading) `history`, the history sections of the export are
+    streamed into it in the same pass.
+    """
+    builder = ColumnBuilder()
+    sections = ("students", "projects", "assignments")
+    if history is not None:
+        sections += tuple(s for s in HISTORY_SECTIONS if s not in sections)
+    for section, record in iter_entities(json_path, sections=sections):
+        if history is not None and section in HISTORY_SECTIONS:
+            history.add(section, record)
+        builder.add(section, record)
+    return builder
+
+
+def compile_snapshot(json_path: str, out_path: str) -> Dict[str, Any]:
+    return _write(stream_columns(json_path), out_path)
+
+
+def load_snapshot(path: str) -> RecommenderIndex:
+    """Map a snapshot file and build a RecommenderIndex over it without copying the arrays."""
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[: len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a recommender snapshot")
+    (header_len,) = struct.unpack_from("<Q", mm, len(MAGIC))
+    header_end = len(MAGIC) + 8 + header_len
+    header = json.loads(mm[len(MAGIC) + 8 : header_end].decode("utf-8"))
+    if header.get("format") not in READABLE_FORMATS:
+        raise ValueError(f"Unsupported snapshot format {header.get('format')!r} in {path}")
+    data_start = -(-header_end // ALIGN) * ALIGN
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        count = int(np.prod(spec["shape"]))
+        arr = np.frombuffer(mm, dtype=np.dtype(spec["dtype"]), count=count, offset=data_start + spec["offset"])
+        arrays[name] = arr.reshape(spec["shape"])
+    return index_from_arrays(arrays, header)
+
+
+def index_from_arrays(
+    arrays: Dict[str, np.ndarray],
+    header: Dict[str, Any],
+    history: Optional[HistoryStore] = None,
+) -> RecommenderIndex:
+    tables = header["tables"]
+    domain_codes = arrays["student_domain_codes"]
+    level_codes = arrays["student_level_codes"]
+    activity_name_codes = arrays["student_activity_codes"]
+
+    project_tables = header["project_tables"]
+    project_ids = arrays["project_ids"]
+    titles = StrSeq(arrays["project_title_blob"], arrays["project_title_offsets"], arrays["project_title_nulls"])
+    field_codes = {f: arrays[f"project_{f}_codes"] for f in PROJECT_FIELDS}
+    projects = []
+    for row in range(len(project_ids)):
+        project = {"id": int(project_ids[row]), "title": titles[row]}
+        for f in PROJECT_FIELDS:
+            project[f] = project_tables[f][field_codes[f][row]]
+        projects.append(project)
+
+    if "bucket_rows" in arrays:
+        buckets = _unpack(header["bucket_keys"], arrays["bucket_rows"], arrays["bucket_bounds"])
+        eligible = _unpack(header["eligible_keys"], arrays["eligible_rows"], arrays["eligible_bounds"])
+    else:
+        buckets = _buckets(domain_codes, level_codes, activity_name_codes, tables)
+        eligible = None
+    load = None
+    if "active_assignment_ids" in arrays:
+        load = AssignmentLoad.from_pairs(
+            zip(arrays["active_assignment_ids"].tolist(), arrays["active_assignment_users"].tolist())
+        )
+
+    return RecommenderIndex.from_columns(
+        projects=projects,
+        ids=IntSeq(arrays["student_ids"]),
+        names=StrSeq(arrays["student_name_blob"], arrays["student_name_offsets"], arrays["student_name_nulls"]),
+        domains=CodedSeq(domain_codes, tables["domain"]),
+        levels=CodedSeq(level_codes, tables["level"]),
+        activities=CodedSeq(activity_name_codes, tables["activity"]),
+        activity_codes=arrays["activity_codes"],
+        features=arrays["features"],
+        norms=arrays["norms"],
+        exact_features=arrays.get("exact_features"),
+        student_rows=SortedKeyMap(arrays["student_id_keys"], arrays["student_id_rows"]),
+        buckets=buckets,
+        eligible=eligible,
+        student_domain_vocab={str(d) for d in tables["domain"]},
+        history=history,
+        load=load,
+    )
+
+
+def _buckets(
+    domain_codes: np.ndarray,
+    level_codes: np.ndarray,
+    activity_codes: np.ndarray,
+    tables: Dict[str, List[Any]],
+) -> Dict[BucketKey, np.ndarray]:
+    """Group student rows by (domain, level, activity) from their codes, vectorized."""
+    n_levels = max(len(tables["level"]), 1)
+    n_activities = max(len(tables["activity"]), 1)
+    combined = (domain_codes.astype(np.int64) * n_levels + level_codes) * n_activities + activity_codes
+    order = np.argsort(combined, kind="stable")
+    keys, starts = np.unique(combined[order], return_index=True)
+    groups: Dict[BucketKey, List[np.ndarray]] = {}
+    for key, rows in zip(keys.tolist(), np.split(order, starts[1:])):
+        dl, a = divmod(key, n_activities)
+        d, lv = divmod(dl, n_levels)
+        bucket = (str(tables["domain"][d]), str(tables["level"][lv]), tables["activity"][a])
+        groups.setdefault(bucket, []).append(rows)
+    # Different raw values can share a string key (e.g. None and "None").
+    return {k: np.sort(np.concatenate(v)).astype(np.int64) for k, v in groups.items()}
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compile ai_analysis.json into a recommender snapshot.")
+    parser.add_argument("source", help="path to ai_analysis.json")
+    parser.add_argument("output", help="path of the snapshot file to write")
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    summary = compile_snapshot(args.source, args.output)
+    print(json.dumps({**summary, "seconds": round(time.perf_counter() - started, 3), "output": args.output}))
+
+
+if __name__ == "__main__":
+    main()
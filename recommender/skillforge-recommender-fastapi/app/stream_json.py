@@ -0,0 +1,173 @@
+"""Incremental reader for very large ai_analysis.json exports.
+
+`iter_entities` walks the document with a small rolling buffer and yields the
+items of the requested `entities.<section>` arrays one at a time. Every other
+value (metadata, analysis, assignments, ...) is skipped by scanning brackets
+and strings without building Python objects, so memory stays bounded by the
+buffer and the largest single item rather than by the file size.
+"""
+
+import json
+import re
+from typing import Any, Iterable, Iterator, TextIO, Tuple
+
+
+_STRING_END = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+# Everything up to the next bracket that is not inside a string.
+_SKIP_RUN = re.compile(r'(?:[^"\[\]{}]+|"[^"\\]*(?:\\.[^"\\]*)*")*', re.DOTALL)
+_SCALAR_END = re.compile(r"[,}\]\s]")
+_WS = re.compile(r"\s*")
+
+
+class _Scanner:
+    def __init__(self, f: TextIO, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Append the next chunk, dropping consumed text. False at end of input."""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                raise ValueError("Unexpected end of JSON input")
+
+    def expect(self, ch: str) -> None:
+        if self.peek() != ch:
+            raise ValueError(f"Expected {ch!r} at offset {self.pos}, found {self.buf[self.pos]!r}")
+        self.pos += 1
+
+    def _skip_string_body(self) -> None:
+        # self.pos is just past the opening quote
+        while True:
+            m = _STRING_END.match(self.buf, self.pos)
+            if m:
+                self.pos = m.end()
+                return
+            if not self.fill():
+                raise ValueError("Unterminated JSON string")
+
+    def read_string(self) -> str:
+        self.expect('"')
+        self.pos -= 1  # keep the opening quote in the buffer across refills
+        while True:
+            m = _STRING_END.match(self.buf, self.pos + 1)
+            if m:
+                value = json.loads(self.buf[self.pos:m.end()])
+                self.pos = m.end()
+                return value
+            if not self.fill():
+                raise ValueError("Unterminated JSON string")
+
+    def read_value(self) -> Any:
+        self.peek()
+        decoder = json.JSONDecoder()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number at the very end of the buffer may continue in the next chunk.
+            if end == len(self.buf) and not self.eof and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def skip_value(self) -> None:
+        ch = self.peek()
+        if ch == '"':
+            self.pos += 1
+            self._skip_string_body()
+            return
+        if ch not in "[{":
+            while True:
+                m = _SCALAR_END.search(self.buf, self.pos)
+                if m:
+                    self.pos = m.start()
+                    return
+                self.pos = len(self.buf)
+                if not self.fill():
+                    return
+        depth = 0
+        while True:
+            self.pos = _SKIP_RUN.match(self.buf, self.pos).end()
+            if self.pos == len(self.buf) or self.buf[self.pos] == '"':
+                # Out of input, or a string that continues in the next chunk.
+                if not self.fill():
+                    raise ValueError("Unexpected end of JSON input")
+                continue
+            c = self.buf[self.pos]
+            self.pos += 1
+            if c in "[{":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def members(self) -> Iterator[str]:
+        """Iterate over the keys of the object at the cursor; the caller consumes each value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.read_string()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("}")
+            return
+
+    def items(self) -> Iterator[Any]:
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.read_value()
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+
+def iter_entities(
+    path: str,
+    sections: Iterable[str] = ("students", "projects"),
+    chunk_size: int = 1 << 16,
+) -> Iterator[Tuple[str, Any]]:
+    """Yield `(section, item)` for every item of `entities.<section>`, in file order."""
+    wanted = set(sections)
+    with open(path, "r", encoding="utf-8") as f:
+        scanner = _Scanner(f, chunk_size)
+        for key in scanner.members():
+            if key != "entities":
+                scanner.skip_value()
+                continue
+            for section in scanner.members():
+                if section not in wanted or scanner.peek() != "[":
+                    scanner.skip_value()
+                    continue
+                for item in scanner.items():
+                    yield section, item
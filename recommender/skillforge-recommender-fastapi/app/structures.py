@@ -0,0 +1,247 @@
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+_DELETED = object()
+
+
+class CowMap:
+    """Immutable mapping with cheap copy-on-write updates.
+
+    Lookups go to a small overlay first and then to a large shared base dict.
+    `set`/`delete` return a new CowMap that copies only the overlay, and the
+    overlay is folded into a fresh base once it grows past an eighth of the
+    base, so a stream of single-key updates costs amortized O(1) each while
+    every published CowMap stays unchanged for its readers.
+    """
+
+    __slots__ = ("_base", "_overlay", "_size")
+
+    def __init__(self, base: Optional[Dict[Hashable, Any]] = None):
+        self._base: Dict[Hashable, Any] = base if base is not None else {}
+        self._overlay: Dict[Hashable, Any] = {}
+        self._size = len(self._base)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._overlay.get(key, self)
+        if value is self:
+            return self._base.get(key, default)
+        return default if value is _DELETED else value
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _DELETED) is not _DELETED
+
+    def __len__(self) -> int:
+        return self._size
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        for key, value in self._base.items():
+            if key not in self._overlay:
+                yield key, value
+        for key, value in self._overlay.items():
+            if value is not _DELETED:
+                yield key, value
+
+    def values(self) -> Iterator[Any]:
+        return (value for _, value in self.items())
+
+    def set(self, key: Hashable, value: Any) -> "CowMap":
+        return self._with(key, value, 0 if key in self else 1)
+
+    def delete(self, key: Hashable) -> "CowMap":
+        if key not in self:
+            return self
+        return self._with(key, _DELETED, -1)
+
+    def _with(self, key: Hashable, value: Any, size_delta: int) -> "CowMap":
+        new = CowMap.__new__(CowMap)
+        new._base = self._base
+        new._overlay = dict(self._overlay)
+        new._overlay[key] = value
+        new._size = self._size + size_delta
+        if len(new._overlay) > max(64, len(new._base) // 8):
+            new._base = dict(new.items())
+            new._overlay = {}
+        return new
+
+
+def append_row(buf: np.ndarray, n: int, value: Any) -> np.ndarray:
+    """Write `value` at row `n` of `buf`, growing it geometrically when full.
+
+    Rows below `n` are never touched, and growth copies into a new array, so
+    readers holding the previous buffer keep a consistent view.
+    """
+    if n >= buf.shape[0]:
+        grown = np.zeros((max(16, 2 * buf.shape[0]),) + buf.shape[1:], dtype=buf.dtype)
+        grown[:n] = buf[:n]
+        buf = grown
+    buf[n] = value
+    return buf
+
+
+class Column:
+    """Read-only base sequence with an append-only tail.
+
+    The base can be a plain list or one of the array-backed sequences below,
+    e.g. a view over an mmap'ed snapshot; appends never touch it.
+    """
+
+    __slots__ = ("_base", "_n_base", "_tail")
+
+    def __init__(self, base: Sequence[Any] = ()):
+        self._base = base
+        self._n_base = len(base)
+        self._tail: List[Any] = []
+
+    def __len__(self) -> int:
+        return self._n_base + len(self._tail)
+
+    def __getitem__(self, row: int) -> Any:
+        if row < self._n_base:
+            return self._base[row]
+        return self._tail[row - self._n_base]
+
+    def put(self, row: int, value: Any) -> None:
+        """Store `value` at `row`, which must be past the base."""
+        # Rows past `row` can only be leftovers of a failed write; no index refers to them.
+        del self._tail[row - self._n_base:]
+        self._tail.append(value)
+
+
+class ArrayColumn:
+    """Read-only base array with an append-only tail of rows: Column for ndarrays.
+
+    Row `i` is `base[i]` below `len(base)` and `tail[i - len(base)]` past it.
+    The base, e.g. an array over an mmap'ed snapshot, is never written or
+    copied, so changed rows cost memory in proportion to the changes and
+    every process keeps sharing the base through the page cache. `append`
+    returns a new ArrayColumn; the tail grows like `append_row`, so readers
+    of the previous one keep a consistent view.
+
+    Indexing takes a row, a slice or an integer array of rows, optionally
+    followed by column indices (`col[rows]`, `col[row, :k]`).
+    """
+
+    __slots__ = ("base", "tail", "_n_base")
+
+    def __init__(self, base: np.ndarray, tail: Optional[np.ndarray] = None):
+        self.base = base
+        self._n_base = base.shape[0]
+        self.tail = tail if tail is not None else np.empty((0,) + base.shape[1:], dtype=base.dtype)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return (self._n_base + self.tail.shape[0],) + self.base.shape[1:]
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.base.dtype
+
+    def append(self, row: int, value: Any) -> "ArrayColumn":
+        """New ArrayColumn with `value` at `row`, which must be past the base."""
+        return ArrayColumn(self.base, append_row(self.tail, row - self._n_base, value))
+
+    def take(self, rows: np.ndarray) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.int64)
+        past = rows >= self._n_base
+        if not past.any():
+            return self.base[rows]
+        out = np.empty(rows.shape + self.base.shape[1:], dtype=self.base.dtype)
+        out[~past] = self.base[rows[~past]]
+        out[past] = self.tail[rows[past] - self._n_base]
+        return out
+
+    def __getitem__(self, key: Any) -> Any:
+        rest: Tuple[Any, ...] = ()
+        if isinstance(key, tuple):
+            key, rest = key[0], key[1:]
+        if isinstance(key, (int, np.integer)):
+            row = int(key)
+            value = self.base[row] if row < self._n_base else self.tail[row - self._n_base]
+        else:
+            if isinstance(key, slice):
+                key = np.arange(*key.indices(self.shape[0]))
+            value = self.take(key)
+            rest = (slice(None),) + rest if rest else rest
+        return value[rest] if rest else value
+
+
+class IntSeq:
+    """Python ints over an integer array."""
+
+    __slots__ = ("_values",)
+
+    def __init__(self, values: np.ndarray):
+        self._values = values
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __getitem__(self, row: int) -> int:
+        return int(self._values[row])
+
+
+class CodedSeq:
+    """Values interned as integer codes into a small table."""
+
+    __slots__ = ("_codes", "_table")
+
+    def __init__(self, codes: np.ndarray, table: List[Any]):
+        self._codes = codes
+        self._table = table
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __getitem__(self, row: int) -> Any:
+        return self._table[self._codes[row]]
+
+
+class StrSeq:
+    """Optional UTF-8 strings packed in one blob and delimited by `offsets`."""
+
+    __slots__ = ("_blob", "_offsets", "_nulls")
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray, nulls: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+        self._nulls = nulls
+
+    def __len__(self) -> int:
+        return len(self._nulls)
+
+    def __getitem__(self, row: int) -> Optional[str]:
+        if self._nulls[row]:
+            return None
+        return bytes(self._blob[int(self._offsets[row]):int(self._offsets[row + 1])]).decode("utf-8")
+
+
+class SortedKeyMap:
+    """Read-only int key -> row mapping backed by sorted key/row arrays.
+
+    Usable as a CowMap base; lookups are a binary search and nothing is
+    materialized per key. Keys must be unique.
+    """
+
+    __slots__ = ("_keys", "_rows")
+
+    def __init__(self, keys: np.ndarray, rows: np.ndarray):
+        self._keys = keys
+        self._rows = rows
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            k = int(key)
+        except (TypeError, ValueError):
+            return default
+        i = int(np.searchsorted(self._keys, k))
+        if i < len(self._keys) and int(self._keys[i]) == k:
+            return int(self._rows[i])
+        return default
+
+    def items(self) -> Iterator[Tuple[int, int]]:
+        return zip(self._keys.tolist(), self._rows.tolist())
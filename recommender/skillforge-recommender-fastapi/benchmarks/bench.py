@@ -0,0 +1,328 @@
+"""Latency/throughput benchmark for the recommender.
+
+Generates (or reuses) a synthetic export, loads it the way the service does
+and times three query shapes against one or more targets:
+
+- `single`:  one project's candidates (`GET /projects/{id}/candidates`)
+- `batch`:   `--batch-size` projects per call (`POST /projects/candidates:batch`)
+- `reverse`: one student's projects (`GET /students/{id}/projects`)
+
+Targets:
+
+- `index`:     `RecommenderIndex` in-process (the serving hot path)
+- `api`:       the FastAPI app through an in-process `TestClient`, including
+               validation and serialization; the result cache and the
+               precomputed candidate table are disabled unless `--api-cache`
+               and `--api-materialized` are given, so the app scores every query
+- `reference`: the original `recommend_students` (single queries only; it is
+               O(students) Python per query, so keep datasets small)
+- `ann`:       single queries through IVF partitions (`--ann-min-rows`), once
+               per `--ann-probes` value, with recall@top_n against the exact scan
+
+Results are written as JSON (`--out`) so runs from different commits can be
+compared; `--baseline` compares against an earlier result file and exits
+non-zero when a p50/p95 latency regresses by more than `--max-regression`:
+
+    python -m benchmarks.bench --students 100000 --projects 2000 --skew 1.0 \\
+        --out bench.json --baseline bench-main.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.dataset import load_index, load_json
+from app.recommender_cosine import recommend_students
+from app.recommender_index import RecommenderIndex
+
+from .synthetic import add_dataset_arguments, dataset_from_args, write_dataset
+
+TARGETS = ("index", "api", "reference", "ann")
+
+
+def summarize(latencies: Sequence[float], items_per_call: int = 1) -> Dict[str, Any]:
+    """Latency percentiles (ms) and throughput of a list of per-call durations (s)."""
+    lat = np.asarray(latencies, dtype=np.float64)
+    if lat.size == 0:
+        return {"calls": 0}
+    total = float(lat.sum())
+    p50, p95, p99 = np.percentile(lat, [50, 95, 99]) * 1000.0
+    return {
+        "calls": int(lat.size),
+        "items_per_call": items_per_call,
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "mean_ms": round(float(lat.mean()) * 1000.0, 4),
+        "max_ms": round(float(lat.max()) * 1000.0, 4),
+        "calls_per_s": round(lat.size / total, 2) if total > 0 else None,
+        "items_per_s": round(lat.size * items_per_call / total, 2) if total > 0 else None,
+    }
+
+
+def time_calls(fn: Callable[[Any], Any], args: Sequence[Any], warmup: int) -> List[float]:
+    for a in args[:warmup]:
+        fn(a)
+    latencies = []
+    for a in args:
+        start = time.perf_counter()
+        fn(a)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+class Workload:
+    """Seeded query mix over the project and student ids of an index."""
+
+    def __init__(self, index: RecommenderIndex, queries: int, batch_size: int, seed: int):
+        rng = np.random.default_rng(seed)
+        project_ids = [index.projects[row].get("id") for row in range(index.n_projects)]
+        student_ids = [index.student_ids[row] for row in range(index.n_students)]
+
+        def pick(ids: List[Any], size: int) -> List[Any]:
+            return [ids[i] for i in rng.integers(0, len(ids), size)] if ids else []
+
+        self.single = pick(project_ids, queries)
+        self.batch = [pick(project_ids, batch_size) for _ in range(max(1, queries // max(1, batch_size)))]
+        self.reverse = pick(student_ids, queries)
+
+
+def bench_index(index: RecommenderIndex, work: Workload, args: argparse.Namespace) -> Dict[str, Any]:
+    top_n, semi = args.top_n, args.semi_active_min_similarity
+    return {
+        "single": summarize(time_calls(lambda pid: index.recommend(pid, top_n, semi), work.single, args.warmup)),
+        "batch": summarize(
+            time_calls(lambda ids: index.recommend_many([(pid, top_n, semi) for pid in ids]), work.batch, args.warmup),
+            args.batch_size,
+        ),
+        "reverse": summarize(
+            time_calls(lambda sid: index.recommend_projects(sid, top_n, semi), work.reverse, args.warmup)
+        ),
+    }
+
+
+def bench_api(data_path: str, work: Workload, args: argparse.Namespace) -> Dict[str, Any]:
+    os.environ["DATA_PATH"] = data_path
+    os.environ.pop("SNAPSHOT_PATH", None)
+    if not args.api_cache:
+        os.environ["CACHE_MAX_ENTRIES"] = "0"
+    # Precomputed candidates answer single queries from a table: off unless asked for.
+    os.environ["MATERIALIZE_CANDIDATES"] = "1" if args.api_materialized else "0"
+    from fastapi.testclient import TestClient
+
+    from app import main as app_module
+
+    params = {"top_n": args.top_n, "semi_active_min_similarity": args.semi_active_min_similarity}
+
+    def checked(resp):
+        if resp.status_code != 200:
+            raise RuntimeError(f"{resp.request.url}: HTTP {resp.status_code} {resp.text[:200]}")
+        return resp
+
+    with TestClient(app_module.app) as client:
+        single = time_calls(
+            lambda pid: checked(client.get(f"/projects/{pid}/candidates", params=params)), work.single, args.warmup
+        )
+        batch = time_calls(
+            lambda ids: checked(
+                client.post("/projects/candidates:batch", json={"projects": [{"project_id": pid, **params} for pid in ids]})
+            ),
+            work.batch,
+            args.warmup,
+        )
+        reverse = time_calls(
+            lambda sid: checked(client.get(f"/students/{sid}/projects", params=params)), work.reverse, args.warmup
+        )
+    return {
+        "single": summarize(single),
+        "batch": summarize(batch, args.batch_size),
+        "reverse": summarize(reverse),
+    }
+
+
+def bench_reference(data_path: str, work: Workload, args: argparse.Namespace) -> Dict[str, Any]:
+    data = load_json(data_path)
+    queries = work.single[: args.reference_queries]
+    return {
+        "single": summarize(
+            time_calls(
+                lambda pid: recommend_students(data, pid, args.top_n, args.semi_active_min_similarity),
+                queries,
+                min(args.warmup, 1),
+            )
+        ),
+    }
+
+
+def recall_at_n(exact: List[Dict[str, Any]], approx: List[Dict[str, Any]]) -> float:
+    """Tie-aware recall@top_n: share of the exact list matched by approximate results at least as similar.
+
+    Exact lists break similarity ties by dataset order, so an approximate
+    result that swaps in an equally similar student still counts as a hit.
+    """
+    if not exact:
+        return 1.0
+    kth = exact[-1]["similarity"]
+    return min(len(exact), sum(1 for c in approx if c["similarity"] >= kth)) / len(exact)
+
+
+def bench_ann(index: RecommenderIndex, work: Workload, args: argparse.Namespace) -> Dict[str, Any]:
+    start = time.perf_counter()
+    ann_index = index.with_ann(args.ann_min_rows)
+    build_seconds = round(time.perf_counter() - start, 3)
+    top_n, semi = args.top_n, args.semi_active_min_similarity
+    exact = [index.recommend(pid, top_n, semi) for pid in work.single]
+
+    results: Dict[str, Any] = {"build": {"seconds": build_seconds, "partitions": len(ann_index.ann)}}
+    for probes in args.ann_probes:
+        latencies = time_calls(lambda pid: ann_index.recommend(pid, top_n, semi, probes), work.single, args.warmup)
+        approx = [ann_index.recommend(pid, top_n, semi, probes) for pid in work.single]
+        stats = summarize(latencies)
+        stats["recall"] = round(float(np.mean([recall_at_n(e, a) for e, a in zip(exact, approx)])), 4) if exact else None
+        results[f"probes_{probes}"] = stats
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__)
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Human-readable regressions of `result` against `baseline`; empty when none."""
+    regressions = []
+    for target, shapes in result["results"].items():
+        for shape, stats in shapes.items():
+            base = baseline.get("results", {}).get(target, {}).get(shape)
+            if not base or "p50_ms" not in stats:
+                continue
+            for metric in ("p50_ms", "p95_ms"):
+                old, new = base.get(metric), stats.get(metric)
+                if old and new and new > old * (1.0 + max_regression):
+                    regressions.append(f"{target}.{shape}.{metric}: {old:.3f} -> {new:.3f} ms (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the recommender on a synthetic dataset.")
+    add_dataset_arguments(parser)
+    parser.add_argument("--data", help="Reuse an existing export instead of generating one")
+    parser.add_argument("--targets", default="index,api", help=f"Comma-separated subset of {','.join(TARGETS)}")
+    parser.add_argument("--queries", type=int, default=500, help="Single and reverse queries per target")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--top-n", type=int, default=7)
+    parser.add_argument("--semi-active-min-similarity", type=float, default=0.80)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--reference-queries", type=int, default=50)
+    parser.add_argument("--api-cache", action="store_true", help="Keep the API result cache enabled")
+    parser.add_argument(
+        "--api-materialized", action="store_true", help="Keep the API's precomputed candidate table enabled"
+    )
+    parser.add_argument("--ann-min-rows", type=int, default=1000, help="Partition size that gets an IVF index (ann target)")
+    parser.add_argument("--ann-probes", default="1,2,4,8", help="Comma-separated probe counts (ann target)")
+    parser.add_argument("--out", help="Write results as JSON to this path (default: stdout only)")
+    parser.add_argument("--baseline", help="Earlier result JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed p50/p95 slowdown vs baseline")
+    args = parser.parse_args(argv)
+    args.targets = [t for t in args.targets.split(",") if t]
+    args.ann_probes = [int(p) for p in args.ann_probes.split(",") if p]
+    unknown = set(args.targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+    return args
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    dataset = dataset_from_args(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = args.data
+        generate_seconds = None
+        if data_path is None:
+            data_path = os.path.join(tmp, "ai_analysis.json")
+            start = time.perf_counter()
+            write_dataset(dataset, data_path)
+            generate_seconds = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        index = load_index(data_path)
+        load_seconds = round(time.perf_counter() - start, 3)
+        work = Workload(index, args.queries, args.batch_size, args.seed)
+
+        results: Dict[str, Any] = {}
+        for target in args.targets:
+            if target == "index":
+                results[target] = bench_index(index, work, args)
+            elif target == "api":
+                results[target] = bench_api(data_path, work, args)
+            elif target == "ann":
+                results[target] = bench_ann(index, work, args)
+            else:
+                results[target] = bench_reference(data_path, work, args)
+
+    return {
+        "environment": environment(),
+        "config": {
+            "students": index.n_students,
+            "projects": index.n_projects,
+            "skew": args.skew if args.data is None else None,
+            "seed": args.seed,
+            "data": args.data,
+            "queries": args.queries,
+            "batch_size": args.batch_size,
+            "top_n": args.top_n,
+            "semi_active_min_similarity": args.semi_active_min_similarity,
+            "api_cache": args.api_cache,
+            "api_materialized": args.api_materialized,
+            "ann_min_rows": args.ann_min_rows,
+            "ann_probes": args.ann_probes,
+        },
+        "dataset": {"generate_seconds": generate_seconds, "load_seconds": load_seconds, **index.stats()},
+        "results": results,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    result = run(args)
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
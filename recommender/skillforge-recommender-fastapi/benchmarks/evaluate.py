@@ -0,0 +1,336 @@
+"""Offline evaluation of ranking quality and latency against past assignments.
+
+Every project with accepted or completed assignments is a query; the
+students who accepted it are its relevant results. Each `--config` (a
+scoring configuration: similarity threshold, history features, load cap,
+diversity, ANN probes) ranks every query and is scored with precision@k,
+recall@k and NDCG@k, while the latency of each `recommend` call is recorded,
+so one run tells whether a ranking change is both better and not slower.
+
+Graded relevance for NDCG is `1 + mean evaluation score / 100` of the
+student's submissions on the project (1 without evaluations); precision and
+recall count every relevant student as a hit.
+
+The replay must not see its own answers: projects are split into `--folds`
+folds by id, and a fold's projects are ranked by an index whose history
+features and assignment load are built from the other folds' events only.
+The fold's projects are scored as if they were still open.
+
+    python -m benchmarks.evaluate --data data/ai_analysis.json \\
+        --config default --config history:history_half_life_days=90 \\
+        --config diverse:diversity=0.3,max_active_assignments=2 --processes 4
+
+The first config is the baseline: every other one is reported with its
+metric and p50/p95 deltas against it. `--processes` evaluates folds in
+parallel worker processes (latencies then include contention between them).
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.dataset import load_json
+from app.history import ACCEPTED_STATUSES
+from app.recommender_index import RecommenderIndex
+
+from .bench import environment, summarize
+from .synthetic import add_dataset_arguments, dataset_from_args
+
+# Scoring parameters a --config can set, with their types and defaults.
+PARAMETERS = {
+    "semi_active_min_similarity": (float, 0.80),
+    "max_active_assignments": (int, None),
+    "diversity": (float, 0.0),
+    "ann_probes": (int, 0),
+    "ann_min_rows": (int, 1000),
+    "history_half_life_days": (float, None),
+}
+# Parameters that change the index itself rather than the query.
+INDEX_PARAMETERS = ("history_half_life_days", "ann_min_rows")
+
+Config = Tuple[str, Dict[str, Any]]
+# project id -> student id -> gain
+Relevance = Dict[int, Dict[Any, float]]
+
+
+def parse_config(text: str) -> Config:
+    """`name[:key=value,...]` -> (name, parameters with defaults filled in)."""
+    name, _, spec = text.partition(":")
+    params = {key: default for key, (_, default) in PARAMETERS.items()}
+    for item in filter(None, spec.split(",")):
+        key, sep, value = item.partition("=")
+        key = key.strip().replace("-", "_")
+        if not sep or key not in PARAMETERS:
+            raise ValueError(f"{text!r}: expected key=value with key in {', '.join(PARAMETERS)}")
+        kind = PARAMETERS[key][0]
+        params[key] = None if value.strip().lower() in ("", "none") else kind(value)
+    if not name:
+        raise ValueError(f"{text!r}: missing config name")
+    return name, params
+
+
+def relevance(entities: Dict[str, Any]) -> Relevance:
+    """Relevant students (and their gains) of every project with accepted assignments."""
+    assignments = {}
+    for a in entities.get("assignments", []) or []:
+        if str(a.get("status")) in ACCEPTED_STATUSES and a.get("project_id") is not None:
+            assignments[a.get("id")] = (int(a["project_id"]), a.get("user_id"))
+    assignment_of = {s.get("id"): s.get("assignment_id") for s in entities.get("submissions", []) or []}
+    scores: Dict[Tuple[int, Any], List[float]] = {}
+    for e in entities.get("evaluations", []) or []:
+        key = assignments.get(assignment_of.get(e.get("submission_id")))
+        if key is not None and e.get("score") is not None:
+            scores.setdefault(key, []).append(float(e["score"]))
+
+    out: Relevance = {}
+    for project_id, user_id in assignments.values():
+        evaluated = scores.get((project_id, user_id))
+        gain = 1.0 + (sum(evaluated) / len(evaluated) / 100.0 if evaluated else 0.0)
+        gains = out.setdefault(project_id, {})
+        gains[user_id] = max(gain, gains.get(user_id, 0.0))
+    return out
+
+
+def fold_of(project_id: int, folds: int) -> int:
+    return project_id % folds
+
+
+def fold_data(data: Dict[str, Any], fold: int, folds: int) -> Dict[str, Any]:
+    """`data` without the history of `fold`'s projects, with those projects reopened."""
+    entities = data.get("entities", {}) or {}
+    held_out = set()
+    assignments = []
+    for a in entities.get("assignments", []) or []:
+        if a.get("project_id") is not None and fold_of(int(a["project_id"]), folds) == fold:
+            held_out.add(a.get("id"))
+        else:
+            assignments.append(a)
+    dropped = set()
+    submissions = []
+    for s in entities.get("submissions", []) or []:
+        if s.get("assignment_id") in held_out:
+            dropped.add(s.get("id"))
+        else:
+            submissions.append(s)
+    projects = [
+        {**p, "status": "open"} if fold_of(int(p.get("id", -1)), folds) == fold else p
+        for p in entities.get("projects", []) or []
+    ]
+    return {
+        **data,
+        "entities": {
+            **entities,
+            "projects": projects,
+            "assignments": assignments,
+            "submissions": submissions,
+            "evaluations": [e for e in entities.get("evaluations", []) or [] if e.get("submission_id") not in dropped],
+        },
+    }
+
+
+def precision_at(ranked: Sequence[Any], gains: Dict[Any, float], k: int) -> float:
+    return sum(1 for sid in ranked[:k] if sid in gains) / k
+
+
+def recall_at(ranked: Sequence[Any], gains: Dict[Any, float], k: int) -> float:
+    return sum(1 for sid in ranked[:k] if sid in gains) / len(gains)
+
+
+def ndcg_at(ranked: Sequence[Any], gains: Dict[Any, float], k: int) -> float:
+    dcg = sum(gains.get(sid, 0.0) / math.log2(i + 2) for i, sid in enumerate(ranked[:k]))
+    ideal = sum(g / math.log2(i + 2) for i, g in enumerate(sorted(gains.values(), reverse=True)[:k]))
+    return dcg / ideal if ideal > 0 else 0.0
+
+
+# Worker state: set once per process (inherited on fork) by `_init_worker`.
+_state: Dict[str, Any] = {}
+
+
+def _init_worker(data: Dict[str, Any], configs: List[Config], ks: List[int], folds: int, warmup: int) -> None:
+    _state.update(data=data, configs=configs, ks=ks, folds=folds, warmup=warmup)
+
+
+def evaluate_fold(job: Tuple[int, List[int]]) -> Dict[str, Dict[str, List[float]]]:
+    """Per config: per-query metric values and latencies (s) of one fold's projects."""
+    fold, project_ids = job
+    data, configs, ks = _state["data"], _state["configs"], _state["ks"]
+    gains = relevance(data.get("entities", {}) or {})
+    replay = fold_data(data, fold, _state["folds"])
+    top_n = max(ks)
+
+    indexes: Dict[Tuple[Any, ...], RecommenderIndex] = {}
+    out: Dict[str, Dict[str, List[float]]] = {}
+    for name, params in configs:
+        key = tuple(params[p] for p in INDEX_PARAMETERS) + (params["ann_probes"] > 0,)
+        index = indexes.get(key)
+        if index is None:
+            index = RecommenderIndex.from_data(replay, params["history_half_life_days"])
+            if params["ann_probes"] > 0:
+                index = index.with_ann(params["ann_min_rows"])
+            indexes[key] = index
+
+        def query(pid: int) -> List[Dict[str, Any]]:
+            return index.recommend(
+                pid,
+                top_n,
+                params["semi_active_min_similarity"],
+                ann_probes=params["ann_probes"],
+                max_active_assignments=params["max_active_assignments"],
+                diversity=params["diversity"],
+            )
+
+        for pid in project_ids[:_state["warmup"]]:
+            query(pid)
+        values: Dict[str, List[float]] = {"latency": []}
+        for pid in project_ids:
+            started = time.perf_counter()
+            ranked = [c["student_id"] for c in query(pid)]
+            values["latency"].append(time.perf_counter() - started)
+            for k in ks:
+                values.setdefault(f"precision@{k}", []).append(precision_at(ranked, gains[pid], k))
+                values.setdefault(f"recall@{k}", []).append(recall_at(ranked, gains[pid], k))
+                values.setdefault(f"ndcg@{k}", []).append(ndcg_at(ranked, gains[pid], k))
+        out[name] = values
+    return out
+
+
+def _jobs(data: Dict[str, Any], folds: int, max_queries: Optional[int], seed: int) -> List[Tuple[int, List[int]]]:
+    entities = data.get("entities", {}) or {}
+    known = {int(p.get("id", -1)) for p in entities.get("projects", []) or []}
+    students = {s.get("id") for s in entities.get("students", []) or []}
+    queries = sorted(pid for pid, g in relevance(entities).items() if pid in known and students.intersection(g))
+    if max_queries is not None and len(queries) > max_queries:
+        rng = np.random.default_rng(seed)
+        queries = sorted(int(q) for q in rng.choice(queries, max_queries, replace=False))
+    jobs = [(fold, [pid for pid in queries if fold_of(pid, folds) == fold]) for fold in range(folds)]
+    return [job for job in jobs if job[1]]
+
+
+def _merge(parts: Iterable[Dict[str, Dict[str, List[float]]]]) -> Dict[str, Dict[str, List[float]]]:
+    merged: Dict[str, Dict[str, List[float]]] = {}
+    for part in parts:
+        for name, values in part.items():
+            target = merged.setdefault(name, {})
+            for metric, xs in values.items():
+                target.setdefault(metric, []).extend(xs)
+    return merged
+
+
+def _deltas(stats: Dict[str, Any], base: Dict[str, Any]) -> Dict[str, Any]:
+    out = {
+        metric: round(value - base["metrics"][metric], 4)
+        for metric, value in stats["metrics"].items()
+        if metric in base["metrics"]
+    }
+    for metric in ("p50_ms", "p95_ms"):
+        old, new = base["latency"].get(metric), stats["latency"].get(metric)
+        if old and new:
+            out[f"{metric}_ratio"] = round(new / old, 3)
+    return out
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Evaluate ranking quality and latency against past assignments.")
+    add_dataset_arguments(parser)
+    parser.add_argument("--data", help="Evaluate an existing export instead of a generated one")
+    parser.add_argument(
+        "--config",
+        action="append",
+        dest="configs",
+        metavar="NAME[:KEY=VALUE,...]",
+        help=f"Scoring configuration (repeatable; the first is the baseline). Keys: {', '.join(PARAMETERS)}",
+    )
+    parser.add_argument("--k", default="5,10", help="Comma-separated cutoffs for precision/recall/NDCG")
+    parser.add_argument("--folds", type=int, default=5, help="Project folds whose history is held out in turn")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes (folds are split across them)")
+    parser.add_argument("--max-queries", type=int, help="Evaluate a seeded sample of this many projects")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed queries per fold and config")
+    parser.add_argument("--out", help="Write results as JSON to this path (default: stdout only)")
+    args = parser.parse_args(argv)
+    try:
+        args.configs = [parse_config(c) for c in args.configs or ["default"]]
+    except ValueError as e:
+        parser.error(str(e))
+    names = [name for name, _ in args.configs]
+    if len(set(names)) != len(names):
+        parser.error("config names must be unique")
+    args.k = sorted({int(k) for k in args.k.split(",") if k})
+    if not args.k or args.k[0] < 1:
+        parser.error("--k needs positive cutoffs")
+    if args.folds < 1 or args.processes < 1:
+        parser.error("--folds and --processes must be >= 1")
+    return args
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    start = time.perf_counter()
+    data = load_json(args.data) if args.data else dataset_from_args(args).to_dict()
+    load_seconds = round(time.perf_counter() - start, 3)
+    jobs = _jobs(data, args.folds, args.max_queries, args.seed)
+
+    init = (data, args.configs, args.k, args.folds, args.warmup)
+    start = time.perf_counter()
+    if args.processes > 1 and len(jobs) > 1:
+        with multiprocessing.Pool(min(args.processes, len(jobs)), _init_worker, init) as pool:
+            values = _merge(pool.imap_unordered(evaluate_fold, jobs))
+    else:
+        _init_worker(*init)
+        values = _merge(evaluate_fold(job) for job in jobs)
+    eval_seconds = round(time.perf_counter() - start, 3)
+
+    results: Dict[str, Any] = {}
+    for name, params in args.configs:
+        config_values = values.get(name, {})
+        results[name] = {
+            "params": params,
+            "metrics": {
+                metric: round(float(np.mean(xs)), 4) for metric, xs in config_values.items() if metric != "latency"
+            },
+            "latency": summarize(config_values.get("latency", [])),
+        }
+
+    baseline = args.configs[0][0]
+    entities = data.get("entities", {}) or {}
+    return {
+        "environment": environment(),
+        "config": {
+            "data": args.data,
+            "seed": args.seed,
+            "k": args.k,
+            "folds": args.folds,
+            "processes": args.processes,
+            "max_queries": args.max_queries,
+            "baseline": baseline,
+        },
+        "dataset": {
+            "students": len(entities.get("students", []) or []),
+            "projects": len(entities.get("projects", []) or []),
+            "queries": sum(len(ids) for _, ids in jobs),
+            "load_seconds": load_seconds,
+            "eval_seconds": eval_seconds,
+        },
+        "results": results,
+        "vs_baseline": {
+            name: _deltas(stats, results[baseline]) for name, stats in results.items() if name != baseline
+        },
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    text = json.dumps(run(args), indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+"""Synthetic ai_analysis.json exports for benchmarks.
+
+The generated document follows the export's `schema_info`: students,
+businesses (with their projects), projects, assignments, milestones,
+submissions and evaluations, using the same value vocabularies and the
+per-activity `profile_settings` presets of the seeder. Domain popularity
+follows a Zipf law with exponent `skew` (0 = uniform) for both students and
+projects, so hot buckets can be made arbitrarily large. `profile_jitter`
+perturbs each student's score range and weight around the preset, for
+feature distributions that are continuous rather than a handful of points.
+
+Records are produced lazily and `write_dataset` streams them to disk, so
+10^6 students never have to be held in memory at once:
+
+    python -m benchmarks.synthetic --students 1000000 --projects 20000 \\
+        --skew 1.2 --out /tmp/ai_analysis_1m.json
+"""
+
+import argparse
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+DOMAINS = ["backend", "frontend", "fullstack", "mobile", "data", "devops"]
+LEVELS = ["beginner", "intermediate", "advanced"]
+LEVEL_WEIGHTS = [0.55, 0.3, 0.15]
+COMPLEXITIES = ["low", "medium", "high"]
+COMPLEXITY_WEIGHTS = [0.5, 0.28, 0.22]
+PROJECT_STATUSES = ["open", "completed"]
+PROJECT_STATUS_WEIGHTS = [0.88, 0.12]
+ASSIGNMENT_STATUSES = ["invited", "accepted", "completed", "declined"]
+SUBMISSION_STATUSES = ["approved", "submitted", "reviewed", "rejected"]
+SUBMISSION_STATUS_WEIGHTS = [0.68, 0.18, 0.1, 0.04]
+MILESTONE_TITLES = ["Planning & Requirements", "Core Implementation", "Testing & QA", "Documentation", "Deployment"]
+CRITERIA = ["code_quality", "completeness", "documentation", "best_practices"]
+
+# Same presets as the seeder, keyed by activity profile.
+PROFILE_SETTINGS = {
+    "active": {"accept_rate": 0.9, "submission_rate": 0.95, "avg_score_range": [75, 100], "weight": 0.4},
+    "semi-active": {"accept_rate": 0.6, "submission_rate": 0.7, "avg_score_range": [55, 85], "weight": 0.35},
+    "low-activity": {"accept_rate": 0.3, "submission_rate": 0.4, "avg_score_range": [30, 65], "weight": 0.25},
+}
+ACTIVITY_WEIGHTS = {"active": 0.4, "semi-active": 0.35, "low-activity": 0.25}
+
+SCHEMA_INFO = {
+    "students": ["id", "name", "email", "domain", "level", "activity_profile"],
+    "businesses": ["id", "name", "email", "projects"],
+    "projects": ["id", "title", "domain", "required_level", "complexity", "status"],
+    "assignments": ["id", "project_id", "user_id", "status", "match_score"],
+    "submissions": ["id", "assignment_id", "milestone_id", "user_id", "status"],
+    "evaluations": ["submission_id", "user_id", "score", "criteria_scores"],
+}
+
+_FIRST = ["Hassan", "Karim", "Omar", "Rana", "Mona", "Youssef", "Salma", "Nour", "Ali", "Laila", "Tarek", "Dina"]
+_LAST = ["Fawzi", "Ahmed", "Nasser", "Hassan", "Saleh", "Mansour", "Adel", "Farouk", "Zaki", "Kamal"]
+_PRODUCTS = ["Notification Service", "Blog Platform", "Inventory API", "Analytics Dashboard", "Chat App", "Payment Gateway"]
+
+
+def zipf_weights(n: int, skew: float) -> List[float]:
+    """Relative popularity of `n` ranked values; `skew` 0 is uniform."""
+    return [1.0 / (rank + 1) ** skew for rank in range(n)]
+
+
+class SyntheticDataset:
+    """Deterministic synthetic export of a given size.
+
+    Student ids start at `student_id_base` and project ids at 1, like the
+    seeded exports. `assignments_per_project` controls the size of the
+    activity history (assignments, submissions, evaluations); set it to 0 for
+    a features-only dataset.
+    """
+
+    def __init__(
+        self,
+        students: int = 1000,
+        projects: int = 100,
+        skew: float = 0.0,
+        seed: int = 42,
+        domains: Sequence[str] = DOMAINS,
+        businesses: Optional[int] = None,
+        assignments_per_project: float = 3.0,
+        student_id_base: int = 1000,
+        profile_jitter: float = 0.0,
+    ):
+        if students < 0 or projects < 0:
+            raise ValueError("students and projects must be >= 0")
+        self.students = students
+        self.projects = projects
+        self.skew = skew
+        self.seed = seed
+        self.domains = list(domains)
+        self.businesses = businesses if businesses is not None else max(1, projects // 3)
+        self.assignments_per_project = assignments_per_project
+        self.student_id_base = student_id_base
+        self.profile_jitter = profile_jitter
+        self.domain_weights = zipf_weights(len(self.domains), skew)
+        self.generated_at = datetime(2025, 12, 27, 20, 55, 5, tzinfo=timezone.utc)
+
+    def _rng(self, stream: str) -> random.Random:
+        # Independent, reproducible stream per section.
+        return random.Random(f"{self.seed}:{stream}")
+
+    def student_ids(self) -> range:
+        return range(self.student_id_base, self.student_id_base + self.students)
+
+    def project_ids(self) -> range:
+        return range(1, self.projects + 1)
+
+    def iter_students(self) -> Iterator[Dict[str, Any]]:
+        rng = self._rng("students")
+        activities = list(ACTIVITY_WEIGHTS)
+        activity_weights = list(ACTIVITY_WEIGHTS.values())
+        for student_id in self.student_ids():
+            activity = rng.choices(activities, activity_weights)[0]
+            yield {
+                "id": student_id,
+                "name": f"{rng.choice(_FIRST)} {rng.choice(_LAST)}",
+                "email": f"student_{student_id}@skillforge.test",
+                "domain": rng.choices(self.domains, self.domain_weights)[0],
+                "level": rng.choices(LEVELS, LEVEL_WEIGHTS)[0],
+                "activity_profile": activity,
+                "profile_settings": self._profile(rng, activity),
+            }
+
+    def _profile(self, rng: random.Random, activity: str) -> Dict[str, Any]:
+        settings = dict(PROFILE_SETTINGS[activity])
+        if self.profile_jitter > 0:
+            shift = round(rng.uniform(-20, 20) * self.profile_jitter)
+            low, high = settings["avg_score_range"]
+            settings["avg_score_range"] = [max(0, low + shift), min(100, high + shift)]
+            settings["weight"] = round(settings["weight"] * (1 + rng.uniform(-1, 1) * self.profile_jitter), 4)
+        return settings
+
+    def _owner(self, project_id: int) -> int:
+        return self.student_id_base + self.students + (project_id - 1) % self.businesses
+
+    def _milestone_ids(self, project_id: int, count: int) -> List[int]:
+        first = (project_id - 1) * len(MILESTONE_TITLES) + 1
+        return list(range(first, first + count))
+
+    def iter_projects(self) -> Iterator[Dict[str, Any]]:
+        rng = self._rng("projects")
+        for project_id in self.project_ids():
+            milestones = rng.randint(3, len(MILESTONE_TITLES))
+            yield {
+                "id": project_id,
+                "title": f"{rng.choice(_PRODUCTS)} v{rng.randint(1, 9)}",
+                "domain": rng.choices(self.domains, self.domain_weights)[0],
+                "required_level": rng.choices(LEVELS, LEVEL_WEIGHTS)[0],
+                "complexity": rng.choices(COMPLEXITIES, COMPLEXITY_WEIGHTS)[0],
+                "milestones_count": milestones,
+                "status": rng.choices(PROJECT_STATUSES, PROJECT_STATUS_WEIGHTS)[0],
+                "owner_id": self._owner(project_id),
+                "milestone_ids": self._milestone_ids(project_id, milestones),
+            }
+
+    def iter_businesses(self) -> Iterator[Dict[str, Any]]:
+        rng = self._rng("businesses")
+        owned: Dict[int, List[Dict[str, Any]]] = {}
+        for project in self.iter_projects():
+            summary = {k: project[k] for k in ("id", "title", "domain", "required_level", "complexity", "milestones_count", "status")}
+            owned.setdefault(project["owner_id"], []).append(summary)
+        for i in range(self.businesses):
+            business_id = self.student_id_base + self.students + i
+            yield {
+                "id": business_id,
+                "name": f"{rng.choice(_PRODUCTS).split()[0]} Works {i}",
+                "email": f"business_{business_id}@company.test",
+                "projects": owned.get(business_id, []),
+            }
+
+    def iter_milestones(self) -> Iterator[Dict[str, Any]]:
+        for project in self.iter_projects():
+            for order, milestone_id in enumerate(project["milestone_ids"], start=1):
+                yield {
+                    "id": milestone_id,
+                    "project_id": project["id"],
+                    "title": MILESTONE_TITLES[order - 1],
+                    "order_index": order,
+                }
+
+    def iter_history(self) -> Iterator[Any]:
+        """Yield `(section, record)` for assignments, submissions and evaluations."""
+        if not self.students or not self.projects or self.assignments_per_project <= 0:
+            return
+        rng = self._rng("history")
+        profiles = list(ACTIVITY_WEIGHTS)
+        # One byte per student keeps history consistent with profiles at 10^6 students.
+        activities = bytearray(profiles.index(s["activity_profile"]) for s in self.iter_students())
+        total = int(self.projects * self.assignments_per_project)
+        submission_id = 0
+        for assignment_id in range(1, total + 1):
+            project_id = rng.randint(1, self.projects)
+            offset = rng.randrange(self.students)
+            user_id = self.student_id_base + offset
+            activity = profiles[activities[offset]]
+            settings = PROFILE_SETTINGS[activity]
+            if rng.random() >= settings["accept_rate"]:
+                status = rng.choices(["invited", "declined"], [0.95, 0.05])[0]
+            else:
+                status = rng.choices(["accepted", "completed"], [0.6, 0.4])[0]
+            yield "assignments", {
+                "id": assignment_id,
+                "project_id": project_id,
+                "user_id": user_id,
+                "status": status,
+                "match_score": rng.randint(60, 100),
+                "activity_profile": activity,
+            }
+            if status not in ("accepted", "completed"):
+                continue
+            for milestone_id in self._milestone_ids(project_id, rng.randint(1, 3)):
+                if rng.random() >= settings["submission_rate"]:
+                    continue
+                submission_id += 1
+                yield "submissions", {
+                    "id": submission_id,
+                    "assignment_id": assignment_id,
+                    "milestone_id": milestone_id,
+                    "user_id": user_id,
+                    "status": rng.choices(SUBMISSION_STATUSES, SUBMISSION_STATUS_WEIGHTS)[0],
+                }
+                low, high = settings["avg_score_range"]
+                score = rng.randint(low, high)
+                yield "evaluations", {
+                    "submission_id": submission_id,
+                    "user_id": user_id,
+                    "milestone_id": milestone_id,
+                    "score": score,
+                    "feedback": "Synthetic evaluation.",
+                    "criteria_scores": {c: max(0, min(100, score + rng.randint(-8, 8))) for c in CRITERIA},
+                    "evaluated_at": (self.generated_at - timedelta(minutes=submission_id)).isoformat(),
+                }
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            "generated_at": self.generated_at.isoformat(),
+            "generator": "benchmarks.synthetic",
+            "version": "1.0.0",
+            "purpose": "Recommender benchmarks",
+            "params": {
+                "students": self.students,
+                "projects": self.projects,
+                "skew": self.skew,
+                "seed": self.seed,
+                "domains": self.domains,
+                "assignments_per_project": self.assignments_per_project,
+                "profile_jitter": self.profile_jitter,
+            },
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The whole export in memory; meant for small sizes and tests."""
+        history: Dict[str, List[Dict[str, Any]]] = {"assignments": [], "submissions": [], "evaluations": []}
+        for section, record in self.iter_history():
+            history[section].append(record)
+        return {
+            "metadata": self.metadata(),
+            "entities": {
+                "students": list(self.iter_students()),
+                "businesses": list(self.iter_businesses()),
+                "projects": list(self.iter_projects()),
+                "assignments": history["assignments"],
+                "milestones": list(self.iter_milestones()),
+                "submissions": history["submissions"],
+                "evaluations": history["evaluations"],
+            },
+            "analysis": {},
+            "schema_info": SCHEMA_INFO,
+        }
+
+
+def _write_array(f, records: Iterator[Dict[str, Any]]) -> None:
+    f.write("[")
+    for i, record in enumerate(records):
+        if i:
+            f.write(",")
+        f.write("\n")
+        f.write(json.dumps(record, ensure_ascii=False))
+    f.write("\n]")
+
+
+def write_dataset(dataset: SyntheticDataset, out_path: str) -> None:
+    """Stream `dataset` to `out_path` as an ai_analysis.json-shaped document."""
+    history: Dict[str, List[Dict[str, Any]]] = {"assignments": [], "submissions": [], "evaluations": []}
+    for section, record in dataset.iter_history():
+        history[section].append(record)
+    with open(out_path, "w", encoding="utf-8") as f:
+        f.write('{"metadata": ')
+        f.write(json.dumps(dataset.metadata()))
+        f.write(', "entities": {"students": ')
+        _write_array(f, dataset.iter_students())
+        f.write(', "businesses": ')
+        _write_array(f, dataset.iter_businesses())
+        f.write(', "projects": ')
+        _write_array(f, dataset.iter_projects())
+        f.write(', "assignments": ')
+        _write_array(f, iter(history["assignments"]))
+        f.write(', "milestones": ')
+        _write_array(f, dataset.iter_milestones())
+        f.write(', "submissions": ')
+        _write_array(f, iter(history["submissions"]))
+        f.write(', "evaluations": ')
+        _write_array(f, iter(history["evaluations"]))
+        f.write('}, "analysis": {}, "schema_info": ')
+        f.write(json.dumps(SCHEMA_INFO))
+        f.write("}\n")
+
+
+def add_dataset_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--students", type=int, default=10_000)
+    parser.add_argument("--projects", type=int, default=1_000)
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent of domain popularity (0 = uniform)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--domains", default=",".join(DOMAINS), help="Comma-separated domain vocabulary")
+    parser.add_argument("--assignments-per-project", type=float, default=3.0)
+    parser.add_argument("--profile-jitter", type=float, default=0.0, help="Spread of student profiles around the presets (0-1)")
+
+
+def dataset_from_args(args: argparse.Namespace) -> SyntheticDataset:
+    return SyntheticDataset(
+        students=args.students,
+        projects=args.projects,
+        skew=args.skew,
+        seed=args.seed,
+        domains=[d for d in args.domains.split(",") if d],
+        assignments_per_project=args.assignments_per_project,
+        profile_jitter=args.profile_jitter,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic ai_analysis.json export.")
+    add_dataset_arguments(parser)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+    write_dataset(dataset_from_args(args), args.out)
+
+
+if __name__ == "__main__":
+    main()
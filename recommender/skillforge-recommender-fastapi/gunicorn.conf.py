@@ -0,0 +1,31 @@
+"""Multi-process serving: gunicorn -c gunicorn.conf.py app.main:app
+
+Every worker maps the same SNAPSHOT_PATH read-only, so the feature store is
+held once in the page cache however many workers run; incremental changes
+reach all of them through the shared journal (SHARED_JOURNAL, app.journal).
+"""
+
+import logging
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Workers load the snapshot themselves: a mapped file is shared anyway, and
+# reloads happen per worker after fork.
+preload_app = False
+raw_env = ["SHARED_JOURNAL=1"]
+
+
+def on_starting(server):
+    """Compile SNAPSHOT_PATH once in the master when DATA_PATH is newer, instead of in every worker."""
+    data_path = os.getenv("DATA_PATH")
+    snapshot_path = os.getenv("SNAPSHOT_PATH")
+    if not data_path or not snapshot_path or not os.path.exists(data_path):
+        return
+    if os.path.exists(snapshot_path) and os.path.getmtime(snapshot_path) >= os.path.getmtime(data_path):
+        return
+    from app.snapshot import compile_snapshot
+
+    summary = compile_snapshot(data_path, snapshot_path)
+    logging.getLogger("gunicorn.error").info("Compiled %s: %s", snapshot_path, summary)
@@ -0,0 +1,73 @@
+import pathlib
+import sys
+
+import numpy as np
+
+# Add the service root to path so `app` is importable
+here = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+
+from app.ann import IVFPartition, unit_vectors
+from app.recommender_index import RecommenderIndex
+from benchmarks.bench import recall_at_n
+from benchmarks.synthetic import SyntheticDataset
+
+
+def jittered_data(students=3000, projects=60):
+    return SyntheticDataset(students, projects, skew=0.5, seed=9, assignments_per_project=0, profile_jitter=1.0).to_dict()
+
+
+def test_probing_every_list_is_exact():
+    data = jittered_data()
+    exact = RecommenderIndex.from_data(data)
+    approx = exact.with_ann(min_rows=50)
+    assert approx.ann and not exact.ann
+    for project in data["entities"]["projects"]:
+        expected = exact.recommend(project["id"], 10, 0.8)
+        assert approx.recommend(project["id"], 10, 0.8, ann_probes=1024) == expected
+        assert approx.recommend(project["id"], 10, 0.8) == expected
+
+
+def test_few_probes_scan_less_and_keep_high_recall():
+    data = jittered_data()
+    index = RecommenderIndex.from_data(data).with_ann(min_rows=50)
+    recalls = []
+    for project in data["entities"]["projects"]:
+        if project["status"] != "open":
+            continue
+        group = index.project_group(project)
+        if group in index.ann:
+            assert index.approximate_rows(project, 1, 10).size < index.eligible_rows(project).size
+        recalls.append(recall_at_n(index.recommend(project["id"], 10, 0.8), index.recommend(project["id"], 10, 0.8, 2)))
+    assert np.mean(recalls) >= 0.9
+
+
+def test_identical_vectors_share_a_list():
+    rows = np.arange(10, dtype=np.int64)
+    features = np.repeat(np.array([[0.0, 1.0, 0.8, 0.4], [0.0, 0.5, 0.7, 0.35]], dtype=np.float32), 5, axis=0)
+    ivf = IVFPartition.build(rows, unit_vectors(features, np.sqrt(1 + (features**2).sum(axis=1)).astype(np.float32)))
+    assert sorted(r.tolist() for r in ivf.lists) == [[0, 1, 2, 3, 4], [5, 6, 7, 8, 9]]
+
+
+def test_partitions_follow_incremental_updates():
+    data = jittered_data(students=1500, projects=20)
+    index = RecommenderIndex.from_data(data).with_ann(min_rows=50)
+    project = next(p for p in data["entities"]["projects"] if p["status"] == "open" and index.project_group(p) in index.ann)
+    level = index.project_group(project)[1]
+    star = {
+        "id": 5,
+        "name": "New",
+        "domain": project["domain"],
+        "level": level,
+        "activity_profile": "active",
+        "profile_settings": {"avg_score_range": [90, 100], "weight": 1.0},
+    }
+    updated = index.upsert_student(star)
+    ivf = updated.ann[index.project_group(project)]
+    assert len(ivf) == len(index.ann[index.project_group(project)]) + 1
+    ids = [c["student_id"] for c in updated.recommend(project["id"], 50, 0.8, ann_probes=1024)]
+    assert 5 in ids
+
+    removed = updated.delete_student(5)
+    assert len(removed.ann[index.project_group(project)]) == len(index.ann[index.project_group(project)])
+    assert 5 not in [c["student_id"] for c in removed.recommend(project["id"], 50, 0.8, ann_probes=1024)]
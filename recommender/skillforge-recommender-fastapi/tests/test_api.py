@@ -0,0 +1,190 @@
+import os
+import pathlib
+import sys
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Add the service root to path so `app` is importable
+here = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+os.environ.setdefault("DATA_PATH", str(here / "data" / "ai_analysis.json"))
+
+from app import main as app_module
+
+
+@pytest.fixture
+def client():
+    with TestClient(app_module.app) as c:
+        yield c
+
+
+def test_health_reports_snapshot(client):
+    body = client.get("/health").json()
+    assert body["status"] == "ok"
+    assert body["dataset"]["version"] >= 1
+    assert body["dataset"]["students"] > 0
+
+
+def test_candidates_unknown_project_is_404(client):
+    resp = client.get("/projects/999999/candidates")
+    assert resp.status_code == 404
+
+
+def test_batch_returns_per_project_results_and_errors(client):
+    single = client.get("/projects/13/candidates", params={"top_n": 3}).json()
+    resp = client.post(
+        "/projects/candidates:batch",
+        json={"projects": [{"project_id": 13, "top_n": 3}, {"project_id": 999999}]},
+    )
+    assert resp.status_code == 200
+    ok, missing = resp.json()["results"]
+    assert ok["candidates"] == single["candidates"]
+    assert ok["error"] is None
+    assert missing["candidates"] is None
+    assert "not found" in missing["error"]
+
+
+def test_student_projects(client):
+    resp = client.get("/students/17/projects", params={"top_n": 5})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["student_id"] == 17
+    assert len(body["projects"]) <= 5
+    assert client.get("/students/999999/projects").status_code == 404
+
+
+def test_candidates_are_cached_per_snapshot_and_sliced(client):
+    cache = app_module.candidates_cache
+    cache.clear()
+    before = cache.stats()
+    # Default parameters are served by the materialized table; others go through the cache.
+    params = {"semi_active_min_similarity": 0.79}
+    full = client.get("/projects/13/candidates", params={**params, "top_n": 50}).json()["candidates"]
+    small = client.get("/projects/13/candidates", params={**params, "top_n": 1}).json()["candidates"]
+    assert small == full[:1]
+    stats = client.get("/cache/stats").json()
+    assert stats["misses"] == before["misses"] + 1
+    assert stats["hits"] == before["hits"] + 1
+
+
+def test_candidates_accept_ann_probes(client):
+    exact = client.get("/projects/13/candidates").json()
+    assert exact["ann_probes"] == 0
+    # Without IVF partitions (ANN_MIN_ROWS unset) probing falls back to the exact scan.
+    approx = client.get("/projects/13/candidates", params={"ann_probes": 4}).json()
+    assert approx["ann_probes"] == 4
+    assert approx["candidates"] == exact["candidates"]
+    assert client.get("/projects/13/candidates", params={"ann_probes": -1}).status_code == 422
+
+
+def test_writes_require_admin_token(client, monkeypatch):
+    monkeypatch.delenv("RECOMMENDER_ADMIN_TOKEN", raising=False)
+    resp = client.put("/students/5000", json={"domain": "backend", "level": "beginner"})
+    assert resp.status_code == 403
+
+
+def test_student_upsert_and_delete_are_visible_immediately(client, monkeypatch):
+    monkeypatch.setenv("RECOMMENDER_ADMIN_TOKEN", "secret")
+    headers = {"X-Admin-Token": "secret"}
+    body = {
+        "name": "New Student",
+        "domain": "frontend",
+        "level": "intermediate",
+        "activity_profile": "active",
+        "profile_settings": {"avg_score_range": [90, 100], "weight": 1.0},
+    }
+    resp = client.put("/students/5000", json=body, headers=headers)
+    assert resp.status_code == 200
+    projects = client.get("/students/5000/projects").json()["projects"]
+    assert projects
+    candidates = client.get(f"/projects/{projects[0]['project_id']}/candidates", params={"top_n": 50}).json()
+    assert 5000 in [c["student_id"] for c in candidates["candidates"]]
+
+    assert client.delete("/students/5000", headers=headers).status_code == 200
+    assert client.get("/students/5000/projects").status_code == 404
+    assert client.delete("/students/5000", headers=headers).status_code == 404
+
+
+def test_history_events_need_history_features(client, monkeypatch):
+    monkeypatch.setenv("RECOMMENDER_ADMIN_TOKEN", "secret")
+    resp = client.post(
+        "/history/evaluations",
+        json={"submission_id": 1, "user_id": 17, "score": 80},
+        headers={"X-Admin-Token": "secret"},
+    )
+    assert resp.status_code == 409
+
+
+def test_assignment_events_feed_the_load_cap(client, monkeypatch):
+    monkeypatch.setenv("RECOMMENDER_ADMIN_TOKEN", "secret")
+    top = client.get("/projects/13/candidates", params={"top_n": 1}).json()["candidates"][0]["student_id"]
+    for aid in (900_001, 900_002):
+        resp = client.post(
+            "/history/assignments",
+            json={"id": aid, "project_id": 13, "user_id": top, "status": "accepted"},
+            headers={"X-Admin-Token": "secret"},
+        )
+        assert resp.status_code == 200
+    capped = client.get("/projects/13/candidates", params={"top_n": 50, "max_active_assignments": 1}).json()
+    assert capped["max_active_assignments"] == 1
+    assert top not in [c["student_id"] for c in capped["candidates"]]
+    for aid in (900_001, 900_002):
+        client.post(
+            "/history/assignments",
+            json={"id": aid, "project_id": 13, "user_id": top, "status": "completed"},
+            headers={"X-Admin-Token": "secret"},
+        )
+
+
+def test_metrics_expose_stages_statuses_and_dataset(client):
+    app_module.candidates_cache.clear()
+    assert client.get("/projects/13/candidates", params={"semi_active_min_similarity": 0.81}).status_code == 200
+    client.get("/projects/999999/candidates")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = resp.text
+    for stage in ("load", "eligibility", "vectorize", "score", "rank"):
+        assert f'recommender_candidates_stage_seconds_count{{stage="{stage}"}}' in body
+    assert 'route="/projects/{project_id}/candidates",method="GET",status="404"}' in body
+    assert "recommender_dataset_students " in body
+    assert "recommender_cache_hits_total " in body
+
+
+def test_request_ids_are_echoed_or_generated(client):
+    resp = client.get("/health", headers={"X-Request-ID": "laravel-42"})
+    assert resp.headers["x-request-id"] == "laravel-42"
+    assert len(client.get("/health").headers["x-request-id"]) == 32
+
+
+def test_full_executor_answers_503(client, monkeypatch):
+    from app.executor import BoundedExecutor
+
+    executor = BoundedExecutor(workers=1, max_queue=0)
+    monkeypatch.setattr(app_module, "executor", executor)
+    monkeypatch.setattr(app_module, "INLINE_MAX_ROWS", -1)
+    app_module.candidates_cache.clear()
+    release = threading.Event()
+    blocker = executor.submit(release.wait)
+    try:
+        resp = client.get("/projects/13/candidates", params={"semi_active_min_similarity": 0.82})
+        assert resp.status_code == 503
+        assert resp.headers["retry-after"] == "1"
+        assert client.post("/projects/candidates:batch", json={"projects": [{"project_id": 13}]}).status_code == 503
+        # Lookups that need no executor still answer.
+        assert client.get("/health").status_code == 200
+    finally:
+        release.set()
+        blocker.result(timeout=5)
+    assert client.get("/projects/13/candidates", params={"semi_active_min_similarity": 0.82}).status_code == 200
+
+
+def test_default_candidates_come_from_the_materialized_table(client):
+    snap = app_module.store.current()
+    app_module.materializer.refresh(snap.version, snap.index)
+    hits = app_module.materializer.hits
+    body = client.get("/projects/13/candidates", params={"top_n": 5}).json()
+    assert app_module.materializer.hits == hits + 1
+    assert body["candidates"] == snap.index.recommend(13, 5, 0.80)
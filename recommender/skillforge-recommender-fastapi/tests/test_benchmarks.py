@@ -0,0 +1,118 @@
+import collections
+import json
+import pathlib
+import sys
+
+import pytest
+
+# Add the service root to path so `app` is importable
+here = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+
+from app.recommender_cosine import recommend_students
+from app.recommender_index import RecommenderIndex
+from benchmarks import bench, evaluate
+from benchmarks.synthetic import SyntheticDataset, write_dataset
+from test_recommender_parity import sample_data
+
+
+def test_synthetic_export_follows_schema_info():
+    schema = sample_data()["schema_info"]
+    data = SyntheticDataset(students=200, projects=30, seed=3).to_dict()
+    for section, fields in schema.items():
+        records = data["entities"][section]
+        assert records, section
+        for record in records:
+            assert set(fields) <= set(record), (section, record)
+
+
+def test_synthetic_export_is_deterministic_and_streams_identically(tmp_path):
+    dataset = SyntheticDataset(students=150, projects=20, skew=1.0, seed=11)
+    path = tmp_path / "synthetic.json"
+    write_dataset(dataset, str(path))
+    assert json.loads(path.read_text(encoding="utf-8")) == SyntheticDataset(students=150, projects=20, skew=1.0, seed=11).to_dict()
+
+
+def test_domain_skew():
+    domains = lambda skew: collections.Counter(
+        s["domain"] for s in SyntheticDataset(students=3000, projects=0, skew=skew).iter_students()
+    )
+    uniform, skewed = domains(0.0), domains(2.0)
+    assert max(uniform.values()) < 2 * min(uniform.values())
+    assert skewed.most_common(1)[0][1] > 0.5 * 3000
+
+
+def test_index_matches_reference_on_synthetic_export():
+    data = SyntheticDataset(students=400, projects=25, skew=0.5, seed=5).to_dict()
+    index = RecommenderIndex.from_data(data)
+    for project in data["entities"]["projects"]:
+        assert index.recommend(project["id"], 10, 0.8) == recommend_students(data, project["id"], 10, 0.8)
+
+
+def test_bench_writes_results_and_flags_regressions(tmp_path):
+    out = tmp_path / "bench.json"
+    argv = ["--students", "300", "--projects", "20", "--queries", "10", "--batch-size", "5", "--warmup", "2"]
+    assert bench.main(argv + ["--targets", "index,reference", "--out", str(out)]) == 0
+    result = json.loads(out.read_text(encoding="utf-8"))
+    assert result["config"]["students"] == 300
+    assert set(result["results"]["index"]) == {"single", "batch", "reverse"}
+    assert result["results"]["index"]["batch"]["items_per_call"] == 5
+    for stats in result["results"]["index"].values():
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+
+    argv_ann = ["--profile-jitter", "1", "--targets", "ann", "--ann-min-rows", "20", "--ann-probes", "1,64"]
+    assert bench.main(argv + argv_ann + ["--out", str(tmp_path / "ann.json")]) == 0
+    ann = json.loads((tmp_path / "ann.json").read_text(encoding="utf-8"))["results"]["ann"]
+    assert ann["build"]["partitions"] > 0
+    assert 0.0 <= ann["probes_1"]["recall"] <= ann["probes_64"]["recall"] == 1.0
+
+    baseline = json.loads(json.dumps(result))
+    baseline["results"]["index"]["single"]["p50_ms"] = result["results"]["index"]["single"]["p50_ms"] / 10
+    regressions = bench.compare(result, baseline, 0.2)
+    assert len(regressions) == 1 and regressions[0].startswith("index.single.p50_ms")
+    assert bench.compare(result, result, 0.2) == []
+
+
+def test_ranking_metrics():
+    gains = {1: 2.0, 2: 1.0}
+    assert evaluate.precision_at([1, 3, 2], gains, 2) == 0.5
+    assert evaluate.recall_at([1, 3, 2], gains, 3) == 1.0
+    assert evaluate.ndcg_at([1, 2], gains, 2) == 1.0
+    assert 0.0 < evaluate.ndcg_at([2, 1], gains, 2) < 1.0
+    assert evaluate.ndcg_at([3, 4], gains, 2) == 0.0
+
+
+def test_replay_holds_out_the_evaluated_fold():
+    entities = SyntheticDataset(students=200, projects=20, seed=2).to_dict()["entities"]
+    gains = evaluate.relevance(entities)
+    assert gains and all(1.0 <= g <= 2.0 for project in gains.values() for g in project.values())
+
+    replay = evaluate.fold_data({"entities": entities}, 1, 3)["entities"]
+    assert all(a["project_id"] % 3 != 1 for a in replay["assignments"])
+    assert len(replay["submissions"]) < len(entities["submissions"])
+    assert {p["status"] for p in replay["projects"] if p["id"] % 3 == 1} == {"open"}
+
+
+def test_evaluate_configs_in_parallel(tmp_path):
+    argv = ["--students", "400", "--projects", "30", "--profile-jitter", "1", "--folds", "3", "--k", "3,5"]
+    argv += ["--config", "default", "--config", "history:history_half_life_days=90,diversity=0.3"]
+    out = tmp_path / "eval.json"
+    assert evaluate.main(argv + ["--out", str(out)]) == 0
+    serial = json.loads(out.read_text(encoding="utf-8"))
+    assert serial["dataset"]["queries"] > 0
+    assert serial["results"]["history"]["params"]["diversity"] == 0.3
+    assert set(serial["results"]["default"]["metrics"]) == {
+        f"{m}@{k}" for m in ("precision", "recall", "ndcg") for k in (3, 5)
+    }
+    assert serial["results"]["default"]["latency"]["calls"] == serial["dataset"]["queries"]
+    assert set(serial["vs_baseline"]) == {"history"}
+
+    assert evaluate.main(argv + ["--processes", "3", "--out", str(out)]) == 0
+    parallel = json.loads(out.read_text(encoding="utf-8"))
+    for name in ("default", "history"):
+        assert parallel["results"][name]["metrics"] == serial["results"][name]["metrics"]
+
+
+def test_evaluate_rejects_unknown_parameters():
+    with pytest.raises(ValueError):
+        evaluate.parse_config("x:top_k=3")
@@ -0,0 +1,40 @@
+import pathlib
+import sys
+
+# Add the service root to path so `app` is importable
+here = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+
+from app.cache import ResultCache
+
+
+def test_lru_eviction():
+    cache = ResultCache(max_entries=2, ttl_seconds=60)
+    cache.put(1, "a", 1)
+    cache.put(1, "b", 2)
+    assert cache.get(1, "a") == 1
+    cache.put(1, "c", 3)
+    assert cache.get(1, "b") is None
+    assert cache.get(1, "a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_new_version_invalidates_everything():
+    cache = ResultCache(max_entries=8, ttl_seconds=60)
+    cache.put(1, "a", 1)
+    assert cache.get(2, "a") is None
+    assert cache.stats()["size"] == 0
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_ttl_expiry():
+    cache = ResultCache(max_entries=8, ttl_seconds=0)
+    cache.put(1, "a", 1)
+    assert cache.get(1, "a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_disabled_cache_never_stores():
+    cache = ResultCache(max_entries=0)
+    cache.put(1, "a", 1)
+    assert cache.get(1, "a") is None
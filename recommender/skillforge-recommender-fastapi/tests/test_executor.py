@@ -0,0 +1,51 @@
+import asyncio
+import contextvars
+import pathlib
+import sys
+import threading
+import time
+
+import pytest
+
+# Add the service root to path so `app` is importable
+here = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+
+from app.executor import BoundedExecutor, Overloaded
+
+
+def test_full_executor_rejects_at_once():
+    executor = BoundedExecutor(workers=1, max_queue=1)
+    release = threading.Event()
+    running = executor.submit(release.wait)
+    queued = executor.submit(lambda: "queued")
+    with pytest.raises(Overloaded):
+        executor.submit(lambda: "rejected")
+    release.set()
+    assert running.result(timeout=5) and queued.result(timeout=5) == "queued"
+    stats = executor.stats()
+    assert (stats["rejected"], stats["completed"], stats["running"], stats["queued"]) == (1, 2, 0, 0)
+
+
+def test_stale_jobs_are_dropped_before_they_start():
+    executor = BoundedExecutor(workers=1, max_queue=4, queue_timeout=0.05)
+    release = threading.Event()
+    executor.submit(release.wait)
+    stale = executor.submit(lambda: "too late")
+    time.sleep(0.1)
+    release.set()
+    with pytest.raises(Overloaded):
+        stale.result(timeout=5)
+    assert executor.stats()["timed_out"] == 1
+    assert executor.submit(lambda: "fresh").result(timeout=5) == "fresh"
+
+
+def test_run_carries_context_variables():
+    var = contextvars.ContextVar("var", default=None)
+    executor = BoundedExecutor(workers=2)
+
+    async def main():
+        var.set("request-1")
+        return await executor.run(var.get)
+
+    assert asyncio.run(main()) == "request-1"
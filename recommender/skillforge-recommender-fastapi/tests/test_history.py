@@ -0,0 +1,131 @@
+import pathlib
+import sys
+
+import pytest
+
+# Add the service root to path so `app` is importable
+here = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+
+from app.dataset import load_index
+from app.history import HISTORY_SECTIONS, HistoryStore
+from app.recommender_index import RecommenderIndex
+from benchmarks.synthetic import SyntheticDataset, write_dataset
+from test_recommender_parity import sample_data
+
+
+def history_events(entities):
+    return [(section, record) for section in HISTORY_SECTIONS for record in entities.get(section, [])]
+
+
+def similarities(index, project_id):
+    return {c["student_id"]: c["similarity"] for c in index.recommend(project_id, 10_000, 0.0)}
+
+
+def test_aggregates_match_a_direct_count():
+    entities = sample_data()["entities"]
+    store = HistoryStore.from_entities(entities)
+    student_id = entities["students"][0]["id"]
+    mine = [a for a in entities["assignments"] if a["user_id"] == student_id]
+    evaluations = [e for e in entities["evaluations"] if e["user_id"] == student_id]
+    h = store.get(student_id)
+    assert h.assignments == len(mine)
+    assert h.accepted == sum(a["status"] in ("accepted", "completed") for a in mine)
+    assert h.evaluations == len(evaluations)
+    assert h.score_sum == pytest.approx(sum(e["score"] for e in evaluations))
+
+
+def test_event_by_event_updates_match_a_bulk_load():
+    entities = SyntheticDataset(students=200, projects=30, seed=4, assignments_per_project=6).to_dict()["entities"]
+    bulk = HistoryStore.from_entities(entities)
+    incremental = HistoryStore().freeze()
+    # Newest evaluations first, to exercise out-of-order decay.
+    events = history_events(entities)
+    events = [e for e in events if e[0] != "evaluations"] + [e for e in reversed(events) if e[0] == "evaluations"]
+    for section, record in events:
+        incremental, _ = incremental.record(section, record)
+    for s in entities["students"]:
+        assert incremental.features(s["id"], 0.7) == pytest.approx(bulk.features(s["id"], 0.7))
+    assert len(HistoryStore().freeze()) == 0
+
+
+def test_updates_replace_earlier_state():
+    store = HistoryStore().freeze()
+    store, _ = store.record("assignments", {"id": 1, "user_id": 7, "status": "invited"})
+    store, _ = store.record("submissions", {"id": 1, "assignment_id": 1, "user_id": 7})
+    assert (store.get(7).accepted, store.get(7).submitted) == (0, 0)
+    store, _ = store.record("assignments", {"id": 1, "user_id": 7, "status": "accepted"})
+    assert (store.get(7).assignments, store.get(7).accepted, store.get(7).submitted) == (1, 1, 1)
+
+    before = store
+    store, _ = store.record("evaluations", {"submission_id": 1, "user_id": 7, "score": 40, "evaluated_at": "2025-01-01T00:00:00+00:00"})
+    store, _ = store.record("evaluations", {"submission_id": 1, "user_id": 7, "score": 90, "evaluated_at": "2025-01-02T00:00:00+00:00"})
+    h = store.get(7)
+    assert (h.evaluations, h.score_sum) == (1, 90)
+    assert h.decayed_sum / h.decayed_weight == pytest.approx(90)
+    assert before.get(7).evaluations == 0
+
+
+def test_recorded_events_match_a_rebuild_with_the_event():
+    data = sample_data()
+    index = RecommenderIndex.from_data(data, history_half_life_days=90)
+    student = data["entities"]["students"][3]
+    event = {
+        "submission_id": 10_001,
+        "user_id": student["id"],
+        "score": 12,
+        "criteria_scores": {"code_quality": 10, "completeness": 14},
+        "evaluated_at": "2025-12-28T00:00:00+00:00",
+    }
+    updated = index.record_history("evaluations", event)
+    data["entities"]["evaluations"] = data["entities"]["evaluations"] + [event]
+    rebuilt = RecommenderIndex.from_data(data, history_half_life_days=90)
+    for project in data["entities"]["projects"]:
+        assert similarities(updated, project["id"]) == similarities(rebuilt, project["id"])
+    assert updated.history.get(student["id"]).evaluations == index.history.get(student["id"]).evaluations + 1
+
+
+def test_moving_an_assignment_updates_both_students():
+    data = sample_data()
+    entities = data["entities"]
+    index = RecommenderIndex.from_data(data, history_half_life_days=90)
+    assignment = next(a for a in entities["assignments"] if a["status"] in ("accepted", "completed"))
+    old_owner = assignment["user_id"]
+    new_owner = next(s["id"] for s in entities["students"] if s["id"] != old_owner)
+    moved = dict(assignment, user_id=new_owner)
+
+    updated = index.record_history("assignments", moved)
+    entities["assignments"] = [moved if a is assignment else a for a in entities["assignments"]]
+    rebuilt = RecommenderIndex.from_data(data, history_half_life_days=90)
+    assert updated.history.get(old_owner) == rebuilt.history.get(old_owner)
+    assert updated.history.get(new_owner) == rebuilt.history.get(new_owner)
+    for student_id in (old_owner, new_owner):
+        row, rebuilt_row = updated.student_rows.get(student_id), rebuilt.student_rows.get(student_id)
+        assert updated.features[row].tolist() == rebuilt.features[rebuilt_row].tolist()
+    for project in entities["projects"]:
+        assert similarities(updated, project["id"]) == similarities(rebuilt, project["id"])
+
+
+def test_history_changes_scores_but_not_eligibility():
+    data = sample_data()
+    plain = RecommenderIndex.from_data(data)
+    rich = RecommenderIndex.from_data(data, history_half_life_days=90)
+    assert plain.history is None
+    changed = False
+    for project in data["entities"]["projects"]:
+        a, b = similarities(plain, project["id"]), similarities(rich, project["id"])
+        assert a.keys() == b.keys()
+        changed = changed or a != b
+    assert changed
+    with pytest.raises(RuntimeError):
+        plain.record_history("evaluations", {"user_id": 17, "score": 50})
+
+
+def test_streamed_history_matches_parsed_history(tmp_path):
+    dataset = SyntheticDataset(students=300, projects=25, seed=8, assignments_per_project=5)
+    path = tmp_path / "export.json"
+    write_dataset(dataset, str(path))
+    streamed = load_index(str(path), stream_min_bytes=0, history_half_life_days=30)
+    parsed = RecommenderIndex.from_data(dataset.to_dict(), history_half_life_days=30)
+    for project_id in dataset.project_ids():
+        assert streamed.recommend(project_id, 20, 0.8) == parsed.recommend(project_id, 20, 0.8)
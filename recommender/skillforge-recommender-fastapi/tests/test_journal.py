@@ -0,0 +1,91 @@
+import json
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+# Add the service root to path so `app` is importable
+here = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+
+from app.dataset import DatasetStore
+from app.journal import ChangeJournal, journal_path
+from app.snapshot import write_snapshot
+from test_recommender_parity import synthetic_data
+
+
+def publish(path, data):
+    write_snapshot(data["entities"]["students"], data["entities"]["projects"], str(path))
+
+
+def worker(path):
+    return DatasetStore(str(path), check_interval=0, journal=ChangeJournal(journal_path(str(path))))
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    data = synthetic_data(students=60, projects=8)
+    path = tmp_path / "recommender.snap"
+    publish(path, data)
+    return path, data
+
+
+def test_changes_reach_every_worker(dataset):
+    path, data = dataset
+    a, b = worker(path), worker(path)
+    a.reload()
+    b.reload()
+    student = dict(data["entities"]["students"][0], id=999_001, activity_profile="active")
+    a.apply("upsert_student", student)
+    b.apply("delete_project", data["entities"]["projects"][0]["id"])
+
+    ia, ib = a.current().index, b.current().index
+    assert ia.stats() == ib.stats()
+    assert ia.student_rows.get(999_001) is not None
+    for project in data["entities"]["projects"][1:]:
+        assert ia.recommend(project["id"], 50, 0.5) == ib.recommend(project["id"], 50, 0.5)
+
+    # A worker started later replays the journal on load.
+    late = worker(path).current()
+    assert late.changes == 2 and late.index.stats() == ia.stats()
+
+
+def test_rejected_change_is_not_journaled(dataset):
+    path, _ = dataset
+    a = worker(path)
+    with pytest.raises(ValueError):
+        a.apply("delete_student", 123_456_789)
+    with pytest.raises(ValueError):
+        a.apply("reload")
+    assert worker(path).current().changes == 0
+
+
+def test_publish_starts_a_new_journal(dataset):
+    path, data = dataset
+    a, b = worker(path), worker(path)
+    a.apply("upsert_student", dict(data["entities"]["students"][0], id=999_002))
+    assert b.current().changes == 1
+
+    publish(path, data)
+    assert a.current().changes == 0 and b.current().changes == 0
+    b.apply("delete_student", data["entities"]["students"][1]["id"])
+    assert a.current().index.student_rows.get(999_002) is None
+    assert a.current().index.stats()["students"] == len(data["entities"]["students"]) - 1
+    first = json.loads(pathlib.Path(journal_path(str(path))).read_text().splitlines()[0])
+    assert first["segment"] == a.current().segment
+
+
+def test_changes_from_another_process(dataset):
+    path, data = dataset
+    a = worker(path)
+    a.reload()
+    student = dict(data["entities"]["students"][0], id=999_003)
+    script = (
+        "import json, sys; sys.path.insert(0, sys.argv[1]);"
+        "from app.dataset import DatasetStore; from app.journal import ChangeJournal, journal_path;"
+        "store = DatasetStore(sys.argv[2], journal=ChangeJournal(journal_path(sys.argv[2])));"
+        "store.apply('upsert_student', json.loads(sys.argv[3]))"
+    )
+    subprocess.run([sys.executable, "-c", script, str(here), str(path), json.dumps(student)], check=True)
+    assert a.current().index.student_rows.get(999_003) is not None
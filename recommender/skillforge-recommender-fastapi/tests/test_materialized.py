@@ -0,0 +1,59 @@
+import pathlib
+import sys
+
+# Add the service root to path so `app` is importable
+here = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+
+from app.materialized import Materializer
+from app.recommender_index import RecommenderIndex
+from test_recommender_parity import synthetic_data
+
+
+def assert_matches_live(materializer, version, index, projects, **kwargs):
+    for project in projects:
+        live = index.recommend(project["id"], 50, 0.80, **kwargs)
+        served = materializer.lookup(version, project["id"], 50)
+        if str(project.get("status")) == "open" and project["id"] in index.project_rows:
+            assert served == live
+            assert materializer.lookup(version, project["id"], 3) == live[:3]
+        else:
+            assert served is None
+
+
+def test_table_matches_live_scoring_across_changes():
+    data = synthetic_data()
+    projects = data["entities"]["projects"]
+    index = RecommenderIndex.from_data(data)
+    materializer = Materializer()
+    table = materializer.refresh(1, index)
+    assert_matches_live(materializer, 1, index, projects)
+    assert materializer.groups_reused == 0 and materializer.groups_scored == len(table.groups)
+
+    # One student change rescores only its (domain, level) group.
+    student = dict(data["entities"]["students"][0], id=777_001, activity_profile="active")
+    index = index.upsert_student(student)
+    materializer.refresh(2, index)
+    assert materializer.groups_scored == len(table.groups) + 1
+    assert_matches_live(materializer, 2, index, projects)
+
+    closed = next(p for p in projects if p["status"] == "open")
+    index = index.upsert_project(dict(closed, status="closed"))
+    materializer.refresh(3, index)
+    projects = [dict(closed, status="closed") if p is closed else p for p in projects]
+    assert_matches_live(materializer, 3, index, projects)
+    assert materializer.lookup(2, projects[0]["id"], 50) is None
+
+
+def test_table_applies_the_default_load_cap():
+    data = synthetic_data(students=300, projects=20)
+    index = RecommenderIndex.from_data(data)
+    project = next(p for p in data["entities"]["projects"] if index.recommend(p["id"]))
+    busy = index.recommend(project["id"], 1)[0]["student_id"]
+    materializer = Materializer(max_active_assignments=0)
+    materializer.refresh(1, index)
+    index = index.record_history("assignments", {"id": 1, "user_id": busy, "status": "accepted"})
+    materializer.refresh(2, index)
+    assert_matches_live(materializer, 2, index, data["entities"]["projects"], max_active_assignments=0)
+    assert busy not in [c["student_id"] for c in materializer.lookup(2, project["id"], 50)]
+    assert not materializer.serves(0.80, 0, None, 0.0)
@@ -0,0 +1,78 @@
+import json
+import logging
+import pathlib
+import sys
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Add the service root to path so `app` is importable
+here = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+
+from app.metrics import Registry, RequestMetrics, current_request_id, record_stages
+from app.recommender_index import RecommenderIndex
+from test_recommender_parity import synthetic_data
+
+
+def test_render_uses_the_prometheus_text_format():
+    registry = Registry()
+    requests = registry.counter("app_requests", "Requests.", ("status",))
+    latency = registry.histogram("app_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    registry.collector(lambda: [("app_items", "gauge", "Items.", [("", {}, 3)])])
+    requests.inc("200")
+    requests.inc("200")
+    latency.observe(0.05, '/a"b')
+    latency.observe(0.5, '/a"b')
+    latency.observe(5.0, '/a"b')
+
+    lines = registry.render().splitlines()
+    assert "# TYPE app_requests counter" in lines
+    assert 'app_requests_total{status="200"} 2' in lines
+    assert 'app_seconds_bucket{route="/a\\"b",le="0.1"} 1' in lines
+    assert 'app_seconds_bucket{route="/a\\"b",le="1"} 2' in lines
+    assert 'app_seconds_bucket{route="/a\\"b",le="+Inf"} 3' in lines
+    assert 'app_seconds_count{route="/a\\"b"} 3' in lines
+    assert 'app_seconds_sum{route="/a\\"b"} 5.55' in lines
+    assert "app_items 3" in lines
+
+
+def test_broken_collector_does_not_break_the_scrape():
+    registry = Registry()
+    registry.counter("ok", "Fine.").inc()
+    registry.collector(lambda: 1 / 0)
+    assert "ok_total 1" in registry.render()
+
+
+def test_recommend_reports_stage_timings():
+    data = synthetic_data()
+    index = RecommenderIndex.from_data(data)
+    project = next(p for p in data["entities"]["projects"] if index.recommend(p["id"]))
+    timings = {}
+    assert index.recommend(project["id"], timings=timings) == index.recommend(project["id"])
+    assert set(timings) == {"eligibility", "vectorize", "score", "rank"}
+    assert all(v >= 0 for v in timings.values())
+
+
+def test_slow_requests_are_logged_with_their_id_and_stages(caplog):
+    registry = Registry()
+    stages = registry.histogram("stages", "Stages.", ("stage",))
+    app = FastAPI()
+    app.add_middleware(
+        RequestMetrics,
+        requests=registry.counter("requests", "Requests.", ("route", "method", "status")),
+        latency=registry.histogram("latency", "Latency.", ("route", "method")),
+        slow_seconds=0.0,
+    )
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        record_stages(stages, {"score": 0.25})
+        return {"request_id": current_request_id()}
+
+    with caplog.at_level(logging.WARNING, logger="recommender.requests"):
+        resp = TestClient(app).get("/items/7", headers={"X-Request-ID": "abc"})
+    assert resp.json() == {"request_id": "abc"}
+    entry = json.loads(caplog.records[-1].getMessage())
+    assert entry["request_id"] == "abc" and entry["route"] == "/items/{item_id}"
+    assert entry["stages_ms"] == {"score": 250.0}
@@ -0,0 +1,160 @@
+import json
+import pathlib
+import random
+import sys
+
+import pytest
+
+# Add the service root to path so `app` is importable
+here = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+
+from app.recommender_cosine import recommend_students
+from app.recommender_index import RecommenderIndex
+
+
+DOMAINS = ["backend", "frontend", "fullstack"]
+LEVELS = ["beginner", "intermediate", "advanced"]
+ACTIVITIES = ["low-activity", "semi-active", "active"]
+COMPLEXITIES = ["low", "medium", "high"]
+
+
+def sample_data():
+    with open(here / "data" / "ai_analysis.json", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def synthetic_data(students=600, projects=40, seed=7):
+    rng = random.Random(seed)
+    # Few distinct profile values so rounded similarities tie often.
+    ranges = [[50, 75], [60, 90], [75, 100]]
+    weights = [0.2, 0.4, 0.4, 0.8]
+    return {
+        "entities": {
+            "students": [
+                {
+                    "id": 1000 + i,
+                    "name": f"Student {i}",
+                    "domain": rng.choice(DOMAINS),
+                    "level": rng.choice(LEVELS),
+                    "activity_profile": rng.choice(ACTIVITIES),
+                    "profile_settings": {"avg_score_range": rng.choice(ranges), "weight": rng.choice(weights)},
+                }
+                for i in range(students)
+            ],
+            "projects": [
+                {
+                    "id": i + 1,
+                    "domain": rng.choice(DOMAINS),
+                    "required_level": rng.choice(LEVELS),
+                    "complexity": rng.choice(COMPLEXITIES),
+                    "status": "open" if rng.random() < 0.8 else "closed",
+                }
+                for i in range(projects)
+            ],
+        }
+    }
+
+
+def jittered_data(students=4000, projects=30, seed=11):
+    """Continuous profiles, like the benchmark's `profile_jitter`: float32 alone misrounds some of them."""
+    data = synthetic_data(students, projects, seed)
+    rng = random.Random(seed)
+    for s in data["entities"]["students"]:
+        low = rng.randint(30, 80)
+        s["profile_settings"] = {"avg_score_range": [low, low + rng.randint(5, 20)], "weight": round(rng.uniform(0.1, 0.9), 4)}
+    return data
+
+
+@pytest.mark.parametrize("data", [sample_data(), synthetic_data()], ids=["sample", "synthetic"])
+def test_index_matches_reference_recommender(data):
+    index = RecommenderIndex.from_data(data)
+    for project in data["entities"]["projects"]:
+        for top_n in (1, 3, 7, 50):
+            for threshold in (0.0, 0.8, 0.95):
+                expected = recommend_students(data, project["id"], top_n, threshold)
+                assert index.recommend(project["id"], top_n, threshold) == expected
+
+
+def test_index_matches_reference_on_continuous_profiles():
+    data = jittered_data()
+    everyone = len(data["entities"]["students"])
+    index = RecommenderIndex.from_data(data)
+    for project in data["entities"]["projects"]:
+        for top_n in (7, everyone):
+            for threshold in (0.0, 0.8):
+                expected = recommend_students(data, project["id"], top_n, threshold)
+                assert index.recommend(project["id"], top_n, threshold) == expected
+
+
+def test_unknown_project_raises_value_error():
+    index = RecommenderIndex.from_data(sample_data())
+    with pytest.raises(ValueError):
+        index.recommend(999999)
+
+
+def test_empty_dataset():
+    index = RecommenderIndex.from_data({"entities": {"students": [], "projects": [{"id": 1, "status": "open"}]}})
+    assert index.recommend(1) == []
+
+
+def test_batch_matches_single_queries():
+    data = synthetic_data()
+    index = RecommenderIndex.from_data(data)
+    queries = [(p["id"], 1 + p["id"] % 10, 0.8) for p in data["entities"]["projects"]] + [(424242, 7, 0.8)]
+    answers = index.recommend_many(queries)
+    for (project_id, top_n, threshold), answer in zip(queries[:-1], answers):
+        assert answer == {"candidates": index.recommend(project_id, top_n, threshold)}
+    assert "not found" in answers[-1]["error"]
+
+
+def test_reverse_query_agrees_with_forward_query():
+    data = synthetic_data()
+    index = RecommenderIndex.from_data(data)
+    everyone = len(data["entities"]["students"])
+    for student in data["entities"]["students"][:120]:
+        matches = index.recommend_projects(student["id"], top_n=50, semi_active_min_similarity=0.8)
+        expected = {}
+        for project in data["entities"]["projects"]:
+            for c in recommend_students(data, project["id"], everyone, 0.8):
+                if c["student_id"] == student["id"]:
+                    expected[project["id"]] = c["similarity"]
+        assert {m["project_id"]: m["similarity"] for m in matches} == expected
+        sims = [m["similarity"] for m in matches]
+        assert sims == sorted(sims, reverse=True)
+
+
+def test_incremental_changes_match_a_full_rebuild():
+    data = synthetic_data(students=300, projects=30)
+    students = data["entities"]["students"]
+    projects = data["entities"]["projects"]
+    index = RecommenderIndex.from_data(data)
+    before = index
+
+    # New student in a brand new domain, an updated student, a deleted student.
+    added = dict(students[0], id=99999, domain="mobile")
+    updated = dict(students[5], activity_profile="active", level="advanced")
+    index = index.upsert_student(added).upsert_student(updated).delete_student(students[9]["id"])
+    # Close one project, reopen another with a new level, add a mobile project.
+    closed = dict(projects[0], status="closed")
+    reopened = dict(projects[1], status="open", required_level="advanced")
+    mobile = {"id": 777, "domain": "mobile", "required_level": students[0]["level"], "complexity": "low", "status": "open"}
+    index = index.upsert_project(closed).upsert_project(reopened).upsert_project(mobile)
+
+    # Changed records move to the end, which only matters for tie order.
+    new_students = [s for s in students if s["id"] not in (students[5]["id"], students[9]["id"])] + [added, updated]
+    new_projects = projects[2:] + [closed, reopened, mobile]
+    rebuilt = RecommenderIndex(new_students, new_projects)
+    for project in new_projects:
+        assert index.recommend(project["id"], 50, 0.5) == rebuilt.recommend(project["id"], 50, 0.5)
+    for student in new_students:
+        assert index.recommend_projects(student["id"], 50, 0.5) == rebuilt.recommend_projects(student["id"], 50, 0.5)
+    assert "mobile" in index.domain_vocab
+    assert index.stats()["students"] == len(new_students)
+
+    # The index the changes started from is untouched.
+    fresh = RecommenderIndex.from_data(data)
+    for project in projects:
+        assert before.recommend(project["id"], 50, 0.5) == fresh.recommend(project["id"], 50, 0.5)
+    with pytest.raises(ValueError):
+        index.delete_student(students[9]["id"])
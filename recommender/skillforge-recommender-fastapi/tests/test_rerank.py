@@ -0,0 +1,108 @@
+import collections
+import pathlib
+import sys
+
+import pytest
+
+# Add the service root to path so `app` is importable
+here = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+
+from app.dataset import load_index
+from app.load import AssignmentLoad
+from app.recommender_index import DIVERSITY_POOL, RecommenderIndex
+from app.snapshot import load_snapshot, write_snapshot
+from benchmarks.synthetic import SyntheticDataset, write_dataset
+from test_recommender_parity import sample_data, synthetic_data
+
+
+def ids(candidates):
+    return [c["student_id"] for c in candidates]
+
+
+def test_load_counts_follow_status_changes():
+    load = AssignmentLoad.from_entities({"assignments": [
+        {"id": 1, "user_id": 10, "status": "accepted"},
+        {"id": 2, "user_id": 10, "status": "accepted"},
+        {"id": 3, "user_id": 11, "status": "invited"},
+    ]})
+    assert (load.count(10), load.count(11)) == (2, 0)
+    after = load.record({"id": 1, "user_id": 10, "status": "completed"})
+    after = after.record({"id": 3, "user_id": 11, "status": "accepted"})
+    after = after.record({"id": 2, "user_id": 11, "status": "accepted"})
+    assert (after.count(10), after.count(11)) == (0, 2)
+    assert list(after.over(1)) == [11]
+    # The original is untouched.
+    assert (load.count(10), load.count(11)) == (2, 0)
+
+
+def test_load_cap_drops_overloaded_students():
+    data = synthetic_data()
+    index = RecommenderIndex.from_data(data)
+    project = next(p for p in data["entities"]["projects"] if index.recommend(p["id"], 10))
+    busy = ids(index.recommend(project["id"], 3))
+    for n, sid in enumerate(busy):
+        for k in range(n + 1):
+            index = index.record_history("assignments", {"id": 100 * n + k, "user_id": sid, "status": "accepted"})
+
+    full = ids(index.recommend(project["id"], 50))
+    capped = ids(index.recommend(project["id"], 10, max_active_assignments=1))
+    assert capped == [sid for sid in full if sid not in busy[1:]][:10]
+    assert ids(index.recommend(project["id"], 10, max_active_assignments=0)) == [
+        sid for sid in full if sid not in busy
+    ][:10]
+
+
+def test_zero_diversity_keeps_the_ranking():
+    data = synthetic_data()
+    index = RecommenderIndex.from_data(data)
+    for project in data["entities"]["projects"]:
+        assert index.recommend(project["id"], 20, diversity=0.0) == index.recommend(project["id"], 20)
+
+
+def test_diversity_spreads_near_duplicates():
+    base = {"domain": "backend", "level": "advanced", "activity_profile": "active"}
+    students = [
+        dict(base, id=i, profile_settings={"avg_score_range": [90, 100], "weight": 0.8}) for i in range(5)
+    ] + [dict(base, id=99, profile_settings={"avg_score_range": [60, 70], "weight": 0.4})]
+    project = {"id": 1, "domain": "backend", "required_level": "advanced", "complexity": "high", "status": "open"}
+    index = RecommenderIndex(students, [project])
+
+    plain = ids(index.recommend(1, 3))
+    diverse = ids(index.recommend(1, 3, diversity=0.5))
+    assert 99 not in plain
+    assert diverse[0] == plain[0] and 99 in diverse
+
+
+def test_diverse_ranking_is_prefix_stable():
+    data = SyntheticDataset(students=3000, projects=20, seed=3, profile_jitter=1.0).to_dict()
+    index = RecommenderIndex.from_data(data)
+    for project in data["entities"]["projects"]:
+        top = index.recommend(project["id"], 50, diversity=0.3)
+        assert index.recommend(project["id"], 7, diversity=0.3) == top[:7]
+        pool = ids(index.recommend(project["id"], DIVERSITY_POOL))
+        assert set(ids(top)) <= set(pool)
+        assert len(set(ids(top))) == len(top)
+
+
+@pytest.mark.parametrize("stream", [False, True], ids=["snapshot", "streamed"])
+def test_columnar_loads_keep_active_assignments(tmp_path, stream):
+    data = SyntheticDataset(students=300, projects=40, seed=5, assignments_per_project=6).to_dict()
+    entities = data["entities"]
+    expected = collections.Counter(a["user_id"] for a in entities["assignments"] if a["status"] == "accepted")
+    if stream:
+        path = tmp_path / "export.json"
+        write_dataset(SyntheticDataset(students=300, projects=40, seed=5, assignments_per_project=6), str(path))
+        index = load_index(str(path), stream_min_bytes=0)
+    else:
+        path = tmp_path / "recommender.snap"
+        write_snapshot(entities["students"], entities["projects"], str(path), assignments=entities["assignments"])
+        index = load_snapshot(str(path))
+    assert expected and {sid: index.load.count(sid) for sid in expected} == dict(expected)
+    assert dict(index.load.counts.items()) == dict(RecommenderIndex.from_data(data).load.counts.items())
+
+
+def test_sample_export_counts_accepted_assignments():
+    index = RecommenderIndex.from_data(sample_data())
+    accepted = [a for a in sample_data()["entities"]["assignments"] if a["status"] == "accepted"]
+    assert sum(index.load.counts.values()) == len(accepted)
@@ -0,0 +1,110 @@
+import pathlib
+import sys
+
+import pytest
+
+# Add the service root to path so `app` is importable
+here = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+
+from app.dataset import DatasetStore
+from app.recommender_index import RecommenderIndex
+from app.snapshot import (
+    ColumnBuilder,
+    compile_snapshot,
+    index_from_arrays,
+    is_snapshot,
+    load_snapshot,
+    write_snapshot,
+)
+from test_recommender_parity import sample_data, synthetic_data
+
+
+@pytest.mark.parametrize("data", [sample_data(), synthetic_data()], ids=["sample", "synthetic"])
+def test_snapshot_index_matches_json_index(tmp_path, data):
+    path = tmp_path / "recommender.snap"
+    write_snapshot(data["entities"]["students"], data["entities"]["projects"], str(path))
+    assert is_snapshot(str(path))
+
+    from_json = RecommenderIndex.from_data(data)
+    from_snap = load_snapshot(str(path))
+    assert from_snap.stats() == from_json.stats()
+    for project in data["entities"]["projects"]:
+        assert from_snap.recommend(project["id"], 50, 0.5) == from_json.recommend(project["id"], 50, 0.5)
+    for student in data["entities"]["students"]:
+        assert from_snap.recommend_projects(student["id"], 50, 0.5) == from_json.recommend_projects(
+            student["id"], 50, 0.5
+        )
+
+
+def test_snapshot_index_accepts_incremental_changes(tmp_path):
+    data = synthetic_data(students=50, projects=10)
+    path = tmp_path / "recommender.snap"
+    write_snapshot(data["entities"]["students"], data["entities"]["projects"], str(path))
+    index = load_snapshot(str(path))
+    student = dict(data["entities"]["students"][0], name=None, activity_profile="active")
+    index = index.upsert_student(student)
+    assert index.student_names[index.student_rows.get(student["id"])] is None
+    assert index.delete_student(student["id"]).stats()["students"] == 49
+
+
+def test_store_prefers_snapshot_and_falls_back_to_json(tmp_path):
+    json_path = here / "data" / "ai_analysis.json"
+    snap_path = tmp_path / "recommender.snap"
+    store = DatasetStore(str(snap_path), check_interval=0, fallback_path=str(json_path))
+    assert store.current().path == str(json_path)
+
+    compile_snapshot(str(json_path), str(snap_path))
+    snap = store.current()
+    assert snap.path == str(snap_path)
+    assert snap.index.stats() == RecommenderIndex.from_data(sample_data()).stats()
+
+
+def test_snapshot_rejects_non_integer_ids(tmp_path):
+    with pytest.raises(ValueError):
+        write_snapshot([{"id": "s-1"}], [], str(tmp_path / "bad.snap"))
+
+
+def test_snapshot_row_groups_are_mapped_not_rebuilt(tmp_path):
+    data = synthetic_data(students=200, projects=10)
+    path = tmp_path / "recommender.snap"
+    write_snapshot(data["entities"]["students"], data["entities"]["projects"], str(path))
+    index = load_snapshot(str(path))
+    groups = list(index.buckets.values()) + list(index._eligible.values())
+    assert groups and not any(rows.flags.owndata for rows in groups)
+
+    # Format 1 files have no row groups; they are rebuilt with the same result.
+    builder = ColumnBuilder()
+    for s in data["entities"]["students"]:
+        builder.add_student(s)
+    for p in data["entities"]["projects"]:
+        builder.add_project(p)
+    arrays = builder.arrays()
+    for name in ("bucket_rows", "bucket_bounds", "eligible_rows", "eligible_bounds"):
+        del arrays[name]
+    rebuilt = index_from_arrays(arrays, builder.header())
+    for project in data["entities"]["projects"]:
+        assert rebuilt.recommend(project["id"], 50, 0.5) == index.recommend(project["id"], 50, 0.5)
+
+
+def test_incremental_changes_leave_the_mapped_arrays_shared(tmp_path):
+    data = synthetic_data(students=200, projects=10)
+    path = tmp_path / "recommender.snap"
+    write_snapshot(data["entities"]["students"], data["entities"]["projects"], str(path))
+    mapped = load_snapshot(str(path))
+    index = mapped
+    for s in data["entities"]["students"][:5]:
+        index = index.upsert_student(dict(s, level="advanced", activity_profile="active"))
+
+    for name in ("features", "norms", "activity_codes", "exact_features"):
+        column = getattr(index, name)
+        assert column.base is getattr(mapped, name).base
+        assert not column.base.flags.owndata and not column.base.flags.writeable
+        assert column.tail.shape[0] < 200
+    rebuilt = RecommenderIndex(
+        data["entities"]["students"][5:]
+        + [dict(s, level="advanced", activity_profile="active") for s in data["entities"]["students"][:5]],
+        data["entities"]["projects"],
+    )
+    for project in data["entities"]["projects"]:
+        assert index.recommend(project["id"], 50, 0.5) == rebuilt.recommend(project["id"], 50, 0.5)
@@ -0,0 +1,52 @@
+import json
+import pathlib
+import sys
+
+import pytest
+
+# Add the service root to path so `app` is importable
+here = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+
+from app.dataset import load_index
+from app.recommender_index import RecommenderIndex
+from app.stream_json import iter_entities
+from test_recommender_parity import sample_data
+
+
+DATA_PATH = here / "data" / "ai_analysis.json"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1024, 1 << 16])
+def test_streams_only_requested_sections(chunk_size):
+    data = sample_data()
+    seen = {"students": [], "projects": []}
+    for section, item in iter_entities(str(DATA_PATH), chunk_size=chunk_size):
+        seen[section].append(item)
+    assert seen["students"] == data["entities"]["students"]
+    assert seen["projects"] == data["entities"]["projects"]
+
+
+def test_skips_strings_and_nesting_that_look_like_structure(tmp_path):
+    doc = {
+        "analysis": {"note": 'a"]}[{ \\ ', "nested": [1, -2.5e3, {"x": None, "y": [True, False]}]},
+        "entities": {
+            "assignments": [{"weird": "]},"}],
+            "students": [{"id": 1, "name": "Ré\"mi", "score": -12.75e-1}],
+            "projects": [],
+            "evaluations": 3,
+        },
+    }
+    path = tmp_path / "tricky.json"
+    path.write_text(json.dumps(doc, ensure_ascii=False, indent=2), encoding="utf-8")
+    for chunk_size in range(1, 24):
+        assert list(iter_entities(str(path), chunk_size=chunk_size)) == [("students", doc["entities"]["students"][0])]
+
+
+def test_streamed_index_matches_json_index():
+    data = sample_data()
+    streamed = load_index(str(DATA_PATH), stream_min_bytes=0)
+    parsed = RecommenderIndex.from_data(data)
+    assert streamed.stats() == parsed.stats()
+    for project in data["entities"]["projects"]:
+        assert streamed.recommend(project["id"], 50, 0.5) == parsed.recommend(project["id"], 50, 0.5)